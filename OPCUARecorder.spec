@@ -6,7 +6,7 @@ block_cipher = None
 
 a = Analysis(
     ['src\\opc_recorder.py'],
-    pathex=[],
+    pathex=['.'],
     binaries=[],
     datas=[],
     hiddenimports=[],
@@ -0,0 +1,443 @@
+import math
+import queue
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from opcua import ua
+
+# Upper bound on NodesToRead per Read request. Most servers advertise a
+# MaxNodesPerRead in the low thousands, so larger selections are split.
+MAX_NODES_PER_READ = 1000
+# Raw values asked per node by one HistoryRead; older values beyond it are left out
+MAX_HISTORY_VALUES = 10000
+
+# Sleeping is only precise to a few milliseconds on some platforms (about
+# 15 ms on Windows), so the last stretch before a deadline is spent yielding.
+SPIN_THRESHOLD = 0.002
+
+# Overruns are reported at most once per this many seconds per periodic job
+OVERRUN_REPORT_SECONDS = 10.0
+
+# One scheduled sample: the wall-clock time (epoch seconds) of its slot, how
+# late it started, and how many slots were skipped before it, with the
+# wall-clock times of the first and last of them (None when none were).
+SampleTick = namedtuple("SampleTick", [
+    "slot_time", "lateness", "skipped", "first_skipped", "last_skipped"
+])
+
+# Per-variable columns recorded next to the value. Timestamps are stored as
+# int64 epoch nanoseconds (0 when the server sent none) and the status as the
+# raw 32-bit StatusCode; both are only turned into text for display/export.
+SOURCE_TIME_SUFFIX = "#source_time"
+SERVER_TIME_SUFFIX = "#server_time"
+STATUS_SUFFIX = "#status"
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+@lru_cache(maxsize=None)
+def parse_node_id(node_id):
+    """Parse a NodeId string once and reuse the result on every tick."""
+    return ua.NodeId.from_string(node_id)
+
+
+def read_data_values(client, node_ids, attribute=ua.AttributeIds.Value,
+                     chunk_size=MAX_NODES_PER_READ):
+    """Read one attribute of many nodes in as few Read requests as possible.
+
+    Returns one entry per node: the DataValue, or the exception raised by
+    the Read request that covered it.
+    """
+    return read_node_attributes(
+        client, [(node_id, attribute) for node_id in node_ids], chunk_size)
+
+
+def read_node_attributes(client, reads, chunk_size=MAX_NODES_PER_READ):
+    """Read (node_id, attribute) pairs in as few Read requests as possible.
+
+    Returns one entry per pair, like read_data_values.
+    """
+    results = []
+    for start in range(0, len(reads), chunk_size):
+        chunk = reads[start:start + chunk_size]
+        params = ua.ReadParameters()
+        # The default returns only source timestamps; both are recorded
+        params.TimestampsToReturn = ua.TimestampsToReturn.Both
+        for node_id, attribute in chunk:
+            read_id = ua.ReadValueId()
+            read_id.NodeId = parse_node_id(node_id) if isinstance(node_id, str) else node_id
+            read_id.AttributeId = attribute
+            params.NodesToRead.append(read_id)
+        try:
+            results.extend(client.uaclient.read(params))
+        except Exception as e:
+            results.extend([e] * len(chunk))
+    return results
+
+
+def read_values(client, node_ids, attribute=ua.AttributeIds.Value,
+                chunk_size=MAX_NODES_PER_READ):
+    """Read the Value (or another attribute) of many nodes in bulk.
+
+    Returns one entry per node: the value, or the exception that
+    Node.get_value() would have raised for it.
+    """
+    return values_from_data_values(
+        read_data_values(client, node_ids, attribute, chunk_size))
+
+
+def values_from_data_values(results):
+    """Unwrap DataValues, turning bad status codes into exceptions."""
+    values = []
+    for result in results:
+        if isinstance(result, Exception):
+            values.append(result)
+            continue
+        try:
+            result.StatusCode.check()
+            values.append(result.Value.Value)
+        except Exception as e:
+            values.append(e)
+    return values
+
+
+def datetime_to_ns(dt):
+    """Convert a naive UTC datetime from a DataValue to epoch nanoseconds."""
+    if dt is None:
+        return 0
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    delta = dt - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000000 + delta.microseconds * 1000
+
+
+def format_timestamp_ns(ns):
+    """Format epoch nanoseconds as local time with millisecond precision."""
+    if not ns:
+        return ""
+    return datetime.fromtimestamp(ns / 1e9).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+
+def format_status(code):
+    """Format a raw StatusCode as its symbolic name."""
+    if code is None or code == "":
+        return ""
+    try:
+        return ua.StatusCode(code).name
+    except Exception:
+        return f"0x{code:08X}"
+
+
+def sample_from_data_value(result):
+    """Split a read result into (value, source_ns, server_ns, status).
+
+    The value is the exception Node.get_value() would have raised when the
+    status is not good; a failed request reports BadCommunicationError.
+    """
+    if isinstance(result, Exception):
+        return result, 0, 0, getattr(result, "code", ua.StatusCodes.BadCommunicationError)
+    value = result.Value.Value if result.Value is not None else None
+    try:
+        result.StatusCode.check()
+    except Exception as e:
+        value = e
+    return (value, datetime_to_ns(result.SourceTimestamp),
+            datetime_to_ns(result.ServerTimestamp), result.StatusCode.value)
+
+
+def request_error(results):
+    """The exception of a bulk read whose every request failed, else None.
+
+    A node with a bad status still has a DataValue; only a lost connection
+    (or a refused request) leaves nothing but exceptions.
+    """
+    if results and all(isinstance(result, Exception) for result in results):
+        return results[0]
+    return None
+
+
+def ns_to_datetime(ns):
+    """Convert epoch nanoseconds to the naive UTC datetime OPC UA requests use."""
+    return _EPOCH + timedelta(microseconds=ns // 1000)
+
+
+def history_read_parameters(ua_module, node_ids, start_ns, end_ns, max_values=MAX_HISTORY_VALUES):
+    """HistoryReadParameters of the raw values of nodes between two epoch ns times."""
+    details = ua_module.ReadRawModifiedDetails()
+    details.IsReadModified = False
+    details.StartTime = ns_to_datetime(start_ns)
+    details.EndTime = ns_to_datetime(end_ns)
+    details.NumValuesPerNode = max_values
+    details.ReturnBounds = False
+    params = ua_module.HistoryReadParameters()
+    params.HistoryReadDetails = details
+    params.TimestampsToReturn = ua_module.TimestampsToReturn.Both
+    # Values beyond max_values aren't fetched, so no continuation point is kept
+    params.ReleaseContinuationPoints = False
+    for node_id in node_ids:
+        read_id = ua_module.HistoryReadValueId()
+        read_id.NodeId = ua_module.NodeId.from_string(node_id)
+        params.NodesToRead.append(read_id)
+    return params
+
+
+def history_values(results):
+    """The DataValues of each HistoryRead result, or the exception of a bad one."""
+    histories = []
+    for result in results:
+        if isinstance(result, Exception):
+            histories.append(result)
+            continue
+        try:
+            result.StatusCode.check()
+            histories.append(list(result.HistoryData.DataValues or []))
+        except Exception as e:
+            histories.append(e)
+    return histories
+
+
+def read_raw_history(client, node_ids, start_ns, end_ns, chunk_size=MAX_NODES_PER_READ):
+    """Read the values the server historized for many nodes between two epoch ns times.
+
+    Returns one entry per node: its list of DataValues, or the exception
+    for a node (or server) without history.
+    """
+    histories = []
+    for start in range(0, len(node_ids), chunk_size):
+        chunk = node_ids[start:start + chunk_size]
+        try:
+            results = client.uaclient.history_read(
+                history_read_parameters(ua, chunk, start_ns, end_ns))
+        except Exception as e:
+            results = [e] * len(chunk)
+        histories.extend(history_values(results))
+    return histories
+
+
+class DataChangeCollector:
+    """Subscription handler that queues data changes for the GUI thread.
+
+    python-opcua delivers notifications on its own thread, so nothing here
+    touches widgets; each change is put on `out_queue` as a
+    (label, sample) tuple, see sample_from_data_value.
+    """
+
+    def __init__(self, labels_by_node_id, out_queue):
+        self.labels_by_node_id = labels_by_node_id
+        self.out_queue = out_queue
+
+    def datachange_notification(self, node, val, data):
+        label = self.labels_by_node_id.get(node.nodeid.to_string())
+        if label is None:
+            return
+        self.out_queue.put((label, sample_from_data_value(data.monitored_item.Value)))
+
+    def status_change_notification(self, status):
+        print(f"Subscription status changed: {status}")
+
+
+def create_data_change_subscription(client, node_ids, handler, publishing_interval,
+                                    sampling_interval=-1, queue_size=1):
+    """Create a subscription with one MonitoredItem per node.
+
+    A negative sampling interval makes the server sample at the publishing
+    interval. Returns the subscription and, per node, either the monitored
+    item handle or the bad StatusCode the server returned for it.
+    """
+    subscription = client.create_subscription(publishing_interval, handler)
+    requests = []
+    # Client handles only need to be unique within the new subscription
+    for client_handle, node_id in enumerate(node_ids, 1):
+        item = ua.ReadValueId()
+        item.NodeId = parse_node_id(node_id) if isinstance(node_id, str) else node_id
+        item.AttributeId = ua.AttributeIds.Value
+        parameters = ua.MonitoringParameters()
+        parameters.ClientHandle = client_handle
+        parameters.SamplingInterval = (
+            sampling_interval if sampling_interval >= 0 else publishing_interval)
+        parameters.QueueSize = queue_size
+        parameters.DiscardOldest = True
+        request = ua.MonitoredItemCreateRequest()
+        request.ItemToMonitor = item
+        request.MonitoringMode = ua.MonitoringMode.Reporting
+        request.RequestedParameters = parameters
+        requests.append(request)
+    results = subscription.create_monitored_items(requests) if requests else []
+    return subscription, results
+
+
+class DeadlineScheduler:
+    """Schedules periodic samples on absolute, wall-clock aligned slots.
+
+    Slots sit on the grid of multiples of the interval since the epoch, so a
+    10 ms interval samples at ...000, ...010, ...020 ms. Deadlines are kept
+    on the monotonic clock, which keeps the period from drifting by the time
+    each sample takes. A sample that starts after later slots have begun
+    is an overrun: those slots are reported as skipped instead of being
+    silently absorbed into a longer period.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        # Fixed at start so a wall-clock adjustment can't shift the grid
+        self._wall_offset = time.time() - time.monotonic()
+        first_slot = math.ceil(time.time() / interval) * interval
+        self.next_deadline = first_slot - self._wall_offset
+        self.samples = 0
+        self.skipped = 0
+        self.max_lateness = 0.0
+        self._reported_at = -OVERRUN_REPORT_SECONDS  # time.monotonic() of the last overrun report
+        self._unreported = 0  # Slots skipped since then
+
+    def time_remaining(self, now=None):
+        """Seconds until the next slot begins (negative when it is overdue)."""
+        now = time.monotonic() if now is None else now
+        return self.next_deadline - now
+
+    def next_tick(self, now=None):
+        """Returns the SampleTick due now, or None before the next slot."""
+        now = time.monotonic() if now is None else now
+        if now < self.next_deadline:
+            return None
+
+        missed = int((now - self.next_deadline) // self.interval)
+        first_skipped = last_skipped = None
+        if missed:
+            first_skipped = self.next_deadline + self._wall_offset
+            last_skipped = first_skipped + (missed - 1) * self.interval
+        deadline = self.next_deadline + missed * self.interval
+        lateness = now - deadline
+        self.next_deadline = deadline + self.interval
+
+        self.samples += 1
+        self.skipped += missed
+        self.max_lateness = max(self.max_lateness, lateness)
+        if missed:
+            self._report_overrun(missed, now)
+        return SampleTick(deadline + self._wall_offset, lateness, missed,
+                          first_skipped, last_skipped)
+
+    def _report_overrun(self, missed, now):
+        # A stalled job overruns on every slot, so the skipped slots are summed up
+        self._unreported += missed
+        if now - self._reported_at < OVERRUN_REPORT_SECONDS:
+            return
+        print(f"Sampling overrun: skipped {self._unreported} slot(s) of "
+              f"{self.interval * 1000:g} ms")
+        self._unreported = 0
+        self._reported_at = now
+
+    def summary(self):
+        """One-line statistics of the slots scheduled so far."""
+        return (f"{self.samples} samples every {self.interval * 1000:g} ms, "
+                f"{self.skipped} skipped slots, max lateness {self.max_lateness * 1000:.2f} ms")
+
+
+class AcquisitionWorker(threading.Thread):
+    """Dedicated thread that performs every OPC UA request of one connection.
+
+    Jobs are callables taking the client; periodic jobs also get the
+    SampleTick they run for. Their results (or the exception they raised)
+    are queued on `results` together with the callback to hand them to,
+    and `notify` is called so the owner can run `deliver_results` on its
+    own thread.
+    """
+
+    is_async = False
+
+    def __init__(self, client, notify=None):
+        super().__init__(name="opcua-acquisition", daemon=True)
+        self.client = client
+        self.notify = notify
+        self.results = queue.Queue()
+        self._jobs = queue.Queue()
+        self._periodic = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def submit(self, job, callback):
+        """Runs job(client) once on the worker."""
+        self._jobs.put((job, callback))
+
+    def start_periodic(self, key, interval_ms, job, callback):
+        """Runs job(client, tick) on every interval_ms slot until stop_periodic(key)."""
+        with self._lock:
+            self._periodic[key] = (DeadlineScheduler(interval_ms / 1000.0), job, callback)
+        self._jobs.put(None)  # Wake the loop so the new job is scheduled
+
+    def stop_periodic(self, key):
+        """Stops a periodic job; results already queued are still delivered."""
+        with self._lock:
+            entry = self._periodic.pop(key, None)
+        if entry:
+            print(f"Stopped periodic job: {entry[0].summary()}")
+
+    def stop(self):
+        """Asks the worker loop to exit after the job it is running."""
+        self._stopping.set()
+        self._jobs.put(None)
+
+    def close(self, timeout=5):
+        """Stops the worker and disconnects its client."""
+        self.stop()
+        if self.is_alive():
+            self.join(timeout)
+        try:
+            self.client.disconnect()
+        except Exception:
+            pass
+
+    def deliver_results(self):
+        """Hands finished results to their callbacks on the calling thread."""
+        while True:
+            try:
+                callback, result = self.results.get_nowait()
+            except queue.Empty:
+                return
+            callback(result)
+
+    def run(self):
+        while not self._stopping.is_set():
+            for job, callback, tick in self._due_periodic_jobs():
+                self._run_job(job, callback, tick)
+            timeout = self._time_to_next_periodic()
+            if timeout is not None:
+                if timeout < SPIN_THRESHOLD and self._jobs.empty():
+                    time.sleep(0)  # Yield instead of oversleeping the deadline
+                    continue
+                timeout = max(0.0, timeout - SPIN_THRESHOLD)
+            try:
+                item = self._jobs.get(timeout=timeout)
+            except queue.Empty:
+                continue
+            if item is not None and not self._stopping.is_set():
+                self._run_job(*item)
+
+    def _due_periodic_jobs(self):
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            for scheduler, job, callback in self._periodic.values():
+                tick = scheduler.next_tick(now)
+                if tick is not None:
+                    due.append((job, callback, tick))
+        return due
+
+    def _time_to_next_periodic(self):
+        with self._lock:
+            if not self._periodic:
+                return None
+            now = time.monotonic()
+            return min(scheduler.time_remaining(now)
+                       for scheduler, _, _ in self._periodic.values())
+
+    def _run_job(self, job, callback, *args):
+        try:
+            result = job(self.client, *args)
+        except Exception as e:
+            result = e
+        self.results.put((callback, result))
+        if self.notify:
+            self.notify()
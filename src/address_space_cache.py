@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+
+from opcua import ua
+
+from src.acquisition import datetime_to_ns, read_values
+
+# Browsed address spaces are kept here between sessions, one file per endpoint URL
+CACHE_DIRECTORY = os.path.join("Cache", "address_space")
+CACHE_FORMAT_VERSION = 2
+
+# Server nodes whose values change when the server's address space is redeployed
+VERSION_NODE_IDS = [
+    ua.NodeId(ua.ObjectIds.Server_NamespaceArray).to_string(),
+    ua.NodeId(ua.ObjectIds.Server_ServerStatus_BuildInfo).to_string(),
+]
+BUILD_INFO_FIELDS = ("ProductUri", "ManufacturerName", "ProductName", "SoftwareVersion",
+                     "BuildNumber", "BuildDate")
+
+
+def server_version(values):
+    """JSON-able version of an address space, from the values of VERSION_NODE_IDS.
+
+    A value that couldn't be read is None, so such servers are only
+    compared by what they do report. Fields are normalized so that both
+    client backends give the same version for the same server.
+    """
+    namespaces, build_info = [None if isinstance(value, Exception) else value for value in values]
+    return {
+        "namespaces": None if namespaces is None else [str(uri) for uri in namespaces],
+        "build_info": None if build_info is None else [
+            _version_field(getattr(build_info, field, "")) for field in BUILD_INFO_FIELDS],
+    }
+
+
+def _version_field(value):
+    # python-opcua decodes DateTimes as naive UTC, asyncua as aware ones
+    if isinstance(value, datetime):
+        return datetime_to_ns(value)
+    return "" if value is None else str(value)
+
+
+def read_server_version(client):
+    """Reads the NamespaceArray and BuildInfo identifying the server's address space."""
+    return server_version(read_values(client, VERSION_NODE_IDS))
+
+
+def tree_structure(entry):
+    """The nodes of a browse tree without their values, for comparing two trees."""
+    return (entry["name"], entry["node_id"], entry["node_class"], entry["browsed"],
+            tuple(tree_structure(child) for child in entry["children"]))
+
+
+def graft_cached_levels(tree, cached):
+    """Gives the unbrowsed nodes of a fresh tree the children cached for them.
+
+    A lazy revalidation only browses the top levels, so the levels the
+    user opened earlier are kept from the cache instead of being folded up.
+    """
+    cached_children = {child["node_id"]: child for child in cached["children"]}
+    for child in tree["children"]:
+        old = cached_children.get(child["node_id"])
+        if old is None:
+            continue
+        if child["browsed"]:
+            graft_cached_levels(child, old)
+        elif old["browsed"]:
+            child["children"] = old["children"]
+            child["browsed"] = True
+
+
+class AddressSpaceCache:
+    """The browsed address space of one endpoint URL, kept on disk between sessions.
+
+    The tree of browse entries is saved as JSON together with the server's
+    version (NamespaceArray and BuildInfo) and the BrowseScope it covers,
+    and only loaded back for the same version and scope. A model change
+    event reported by the server invalidates it, so the next connection
+    browses afresh.
+    """
+
+    def __init__(self, url, scope, directory=CACHE_DIRECTORY):
+        self.url = url
+        self.scope = scope.as_dict()
+        self.file_path = os.path.join(
+            directory, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".json")
+        self.version = None
+        self.stale = False
+
+    def load(self, version):
+        """The cached tree if it was saved for this server version and scope, else None."""
+        self.version = version
+        try:
+            with open(self.file_path, encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"Error loading address space cache {self.file_path}: {str(e)}")
+            return None
+        if (data.get("format") != CACHE_FORMAT_VERSION or data.get("url") != self.url
+                or data.get("version") != version or data.get("scope") != self.scope):
+            print(f"Address space cache of {self.url} is out of date")
+            return None
+        return data["tree"]
+
+    def save(self, tree):
+        """Writes the tree, unless the address space changed while we were connected."""
+        if self.stale or tree is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+            temp_path = self.file_path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump({"format": CACHE_FORMAT_VERSION, "url": self.url,
+                           "version": self.version, "scope": self.scope,
+                           "saved_at": time.time(), "tree": tree},
+                          file, separators=(",", ":"))
+            # Replaced in one go, so a crash never leaves half a cache behind
+            os.replace(temp_path, self.file_path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Error saving address space cache {self.file_path}: {str(e)}")
+
+    def invalidate(self, node_ids=None):
+        """Drops the cached tree after a model change; see ModelChangeHandler."""
+        self.stale = True
+        try:
+            os.remove(self.file_path)
+        except OSError:
+            pass
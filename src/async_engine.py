@@ -0,0 +1,305 @@
+import asyncio
+import inspect
+from functools import lru_cache
+
+from src.acquisition import (
+    MAX_NODES_PER_READ, SPIN_THRESHOLD, AcquisitionWorker, DeadlineScheduler,
+    history_read_parameters, history_values, values_from_data_values
+)
+from src.address_space_cache import VERSION_NODE_IDS, server_version
+from src.browse import (
+    MAX_CONCURRENT_REQUESTS, MAX_NODES_PER_BROWSE, address_space_steps, browse_steps,
+    children_steps, split_requests
+)
+from src.browse_scope import DEFAULT_SCOPE, HIERARCHICAL
+from src.node_metadata import (
+    ModelChangeHandler, metadata_reads, property_browse_paths, property_node_ids
+)
+
+try:
+    from asyncua import Client as AsyncClient, ua as async_ua
+except ImportError:  # asyncua is optional; only the async backend needs it
+    AsyncClient = None
+    async_ua = None
+
+
+def asyncua_available():
+    """Whether the optional asyncua package is installed."""
+    return AsyncClient is not None
+
+
+class AsyncAcquisitionWorker(AcquisitionWorker):
+    """Acquisition worker running an asyncua client on its own asyncio loop.
+
+    It has the same interface as AcquisitionWorker, but jobs may return
+    awaitables. Jobs run as tasks on the loop, so the requests of every
+    scenario and of concurrent jobs stay in flight together on the one
+    session. Results reach the GUI the same way, through `results` and
+    `notify`, which keeps Qt out of the loop thread.
+    """
+
+    is_async = True
+
+    def __init__(self, url, notify=None):
+        if AsyncClient is None:
+            raise RuntimeError("The async backend requires the asyncua package (pip install asyncua)")
+        super().__init__(AsyncClient(url), notify)
+        self.name = "opcua-async-acquisition"
+        self.loop = asyncio.new_event_loop()
+        self._tasks = {}
+
+    def submit(self, job, callback):
+        """Runs job(client) once on the loop."""
+        if self.loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(self._run_job(job, callback), self.loop)
+
+    def start_periodic(self, key, interval_ms, job, callback):
+        """Runs job(client, tick) on every interval_ms slot until stop_periodic(key)."""
+        def schedule():
+            self._cancel_periodic(key)
+            scheduler = DeadlineScheduler(interval_ms / 1000.0)
+            task = self.loop.create_task(self._run_periodic(scheduler, job, callback))
+            task.scheduler = scheduler
+            self._tasks[key] = task
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(schedule)
+
+    def stop_periodic(self, key):
+        """Stops a periodic job; results already queued are still delivered."""
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._cancel_periodic, key)
+
+    def stop(self):
+        """Stops the event loop without disconnecting."""
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def close(self, timeout=5):
+        """Disconnects the client on the loop, then stops the loop thread."""
+        if not self.is_alive():
+            return
+        future = asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop)
+        try:
+            future.result(timeout)
+        except Exception as e:
+            print(f"Error disconnecting async client: {str(e)}")
+            self.stop()
+        self.join(timeout)
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            for task in asyncio.all_tasks(self.loop):
+                task.cancel()
+            self.loop.run_until_complete(asyncio.sleep(0))
+            self.loop.close()
+
+    def _cancel_periodic(self, key):
+        task = self._tasks.pop(key, None)
+        if task:
+            task.cancel()
+            print(f"Stopped periodic job: {task.scheduler.summary()}")
+
+    async def _shutdown(self):
+        for key in list(self._tasks):
+            self._cancel_periodic(key)
+        try:
+            await self.client.disconnect()
+        except Exception:
+            pass
+        self.loop.call_soon(self.loop.stop)
+
+    async def _run_periodic(self, scheduler, job, callback):
+        while True:
+            remaining = scheduler.time_remaining()
+            if remaining > SPIN_THRESHOLD:
+                await asyncio.sleep(remaining - SPIN_THRESHOLD)
+            tick = scheduler.next_tick()
+            while tick is None:
+                await asyncio.sleep(0)  # Yield instead of oversleeping the deadline
+                tick = scheduler.next_tick()
+            await self._run_job(job, callback, tick)
+
+    async def _run_job(self, job, callback, *args):
+        try:
+            result = job(self.client, *args)
+            if inspect.isawaitable(result):
+                result = await result
+        except Exception as e:
+            result = e
+        self.results.put((callback, result))
+        if self.notify:
+            self.notify()
+
+
+@lru_cache(maxsize=None)
+def parse_node_id_async(node_id):
+    """Parse a NodeId string into an asyncua NodeId once."""
+    return async_ua.NodeId.from_string(node_id)
+
+
+async def read_data_values_async(client, node_ids, attribute=None,
+                                 chunk_size=MAX_NODES_PER_READ):
+    """asyncua counterpart of read_data_values; chunks are read concurrently."""
+    if attribute is None:
+        attribute = async_ua.AttributeIds.Value
+    return await read_node_attributes_async(
+        client, [(node_id, attribute) for node_id in node_ids], chunk_size)
+
+
+async def read_node_attributes_async(client, reads, chunk_size=MAX_NODES_PER_READ):
+    """asyncua counterpart of read_node_attributes; chunks are read concurrently."""
+    chunks = [reads[start:start + chunk_size] for start in range(0, len(reads), chunk_size)]
+    chunk_results = await asyncio.gather(*(_read_chunk(client, chunk) for chunk in chunks))
+    return [result for results in chunk_results for result in results]
+
+
+async def _read_chunk(client, reads):
+    params = async_ua.ReadParameters()
+    params.TimestampsToReturn = async_ua.TimestampsToReturn.Both
+    for node_id, attribute in reads:
+        read_id = async_ua.ReadValueId()
+        read_id.NodeId = parse_node_id_async(node_id) if isinstance(node_id, str) else node_id
+        read_id.AttributeId = attribute
+        params.NodesToRead.append(read_id)
+    try:
+        return await client.uaclient.read(params)
+    except Exception as e:
+        return [e] * len(reads)
+
+
+async def read_values_async(client, node_ids, attribute=None, chunk_size=MAX_NODES_PER_READ):
+    """asyncua counterpart of read_values."""
+    return values_from_data_values(
+        await read_data_values_async(client, node_ids, attribute, chunk_size))
+
+
+async def read_raw_history_async(client, node_ids, start_ns, end_ns,
+                                 chunk_size=MAX_NODES_PER_READ):
+    """asyncua counterpart of read_raw_history; chunks are read concurrently."""
+    chunks = [node_ids[start:start + chunk_size] for start in range(0, len(node_ids), chunk_size)]
+    chunk_results = await asyncio.gather(
+        *(_history_read_chunk(client, chunk, start_ns, end_ns) for chunk in chunks))
+    return [history for histories in chunk_results for history in histories]
+
+
+async def _history_read_chunk(client, node_ids, start_ns, end_ns):
+    try:
+        results = await client.uaclient.history_read(
+            history_read_parameters(async_ua, node_ids, start_ns, end_ns))
+    except Exception as e:
+        results = [e] * len(node_ids)
+    return history_values(results)
+
+
+async def create_data_change_subscription_async(client, node_ids, handler, publishing_interval,
+                                                sampling_interval=-1, queue_size=1):
+    """asyncua counterpart of create_data_change_subscription."""
+    subscription = await client.create_subscription(publishing_interval, handler)
+    if sampling_interval < 0:
+        sampling_interval = publishing_interval
+    nodes = [client.get_node(node_id) for node_id in node_ids]
+    results = []
+    if nodes:
+        results = await subscription.subscribe_data_change(
+            nodes, queuesize=queue_size, sampling_interval=sampling_interval)
+    return subscription, results
+
+
+async def fill_node_metadata_async(cache, client, node_ids, chunk_size=MAX_NODES_PER_READ):
+    """asyncua counterpart of NodeMetadataCache.fill."""
+    node_ids = cache.missing(node_ids)
+    if not node_ids:
+        return
+    paths = property_browse_paths(async_ua, node_ids)
+
+    async def translate(chunk):
+        try:
+            return await client.uaclient.translate_browsepaths_to_nodeids(chunk)
+        except Exception as e:
+            return [e] * len(chunk)
+
+    attributes, *translated = await asyncio.gather(
+        read_node_attributes_async(client, metadata_reads(node_ids), chunk_size),
+        *(translate(paths[start:start + chunk_size])
+          for start in range(0, len(paths), chunk_size)))
+    found = property_node_ids(async_ua, [result for results in translated for result in results])
+    properties = iter(await read_data_values_async(
+        client, [node_id for node_id in found if node_id is not None], chunk_size=chunk_size))
+    cache.store(node_ids, attributes,
+                [next(properties) if node_id is not None else None for node_id in found])
+
+
+async def subscribe_model_changes_async(client, *caches, publishing_interval=1000):
+    """asyncua counterpart of subscribe_model_changes."""
+    subscription = await client.create_subscription(
+        publishing_interval, ModelChangeHandler(*caches))
+    await subscription.subscribe_events(
+        client.nodes.server, async_ua.ObjectIds.GeneralModelChangeEventType)
+    return subscription
+
+
+async def run_steps_async(steps, call):
+    """asyncua counterpart of run_steps; call(service, parameters) returns an awaitable."""
+    try:
+        request = next(steps)
+        while True:
+            try:
+                response = await call(*request)
+            except Exception as e:
+                response = e
+            request = steps.send(response)
+    except StopIteration as stop:
+        return stop.value
+
+
+async def browse_references_async(client, node_ids, chunk_size=MAX_NODES_PER_BROWSE,
+                                  browse_filter=HIERARCHICAL):
+    """asyncua counterpart of browse_references."""
+    return await run_steps_async(browse_steps(async_ua, node_ids, chunk_size, browse_filter),
+                                 lambda service, params: getattr(client.uaclient, service)(params))
+
+
+async def browse_address_space_async(client, scope=DEFAULT_SCOPE, max_depth=None,
+                                     concurrency=MAX_CONCURRENT_REQUESTS):
+    """asyncua counterpart of browse_address_space; the requests share one semaphore."""
+    root = client.nodes.root
+    print(f"Got root node: {root}")
+    services = {
+        "browse": (lambda chunk, browse_filter: browse_references_async(
+            client, chunk, browse_filter=browse_filter), MAX_NODES_PER_BROWSE),
+        "read": (lambda chunk: read_values_async(client, chunk), MAX_NODES_PER_READ),
+    }
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(request, chunk, args):
+        async with semaphore:
+            return await request(chunk, *args)
+
+    async def call(service, node_ids, *args):
+        request, chunk_size = services[service]
+        results = await asyncio.gather(*(run(request, chunk, args) for chunk in
+                                         split_requests(node_ids, chunk_size, concurrency)))
+        return [result for chunk_results in results for result in chunk_results]
+
+    return await run_steps_async(
+        address_space_steps(root.nodeid.to_string(), scope, max_depth), call)
+
+
+async def browse_children_async(client, entry, path, scope=DEFAULT_SCOPE):
+    """asyncua counterpart of browse_children."""
+    services = {
+        "browse": lambda node_ids, browse_filter: browse_references_async(
+            client, node_ids, browse_filter=browse_filter),
+        "read": lambda node_ids: read_values_async(client, node_ids),
+    }
+    return await run_steps_async(children_steps(entry, path, scope),
+                                 lambda service, *args: services[service](*args))
+
+
+async def read_server_version_async(client):
+    """asyncua counterpart of read_server_version."""
+    return server_version(await read_values_async(client, VERSION_NODE_IDS))
@@ -0,0 +1,355 @@
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+from opcua import ua
+
+from src.acquisition import MAX_NODES_PER_READ, read_values
+from src.browse_scope import DEFAULT_SCOPE, HIERARCHICAL
+
+# Upper bound on NodesToBrowse per Browse request, like MAX_NODES_PER_READ
+MAX_NODES_PER_BROWSE = 1000
+# Times a node refused a continuation point (BadNoContinuationPoints) is retried
+BROWSE_RETRIES = 3
+# Levels browsed below the browse roots at connect time in lazy mode: the
+# roots' children are listed and everything below them waits for expansion
+LAZY_BROWSE_DEPTH = 1
+# Browse or Read requests of one tree level kept in flight at once
+MAX_CONCURRENT_REQUESTS = 8
+
+
+def new_browse_entry(name, node_id, node_class=None):
+    """A browsed node: display name, NodeId string, NodeClass, value text and children.
+
+    `browsed` is set once the node's children were browsed, which lazy
+    browsing leaves until the node is expanded; `read_error` when its
+    value couldn't be read.
+    """
+    return {"name": name, "node_id": node_id, "node_class": node_class, "value_text": None,
+            "read_error": False, "browsed": False, "children": []}
+
+
+def may_have_children(entry):
+    """Whether an unbrowsed node is shown as expandable (HasChild hint).
+
+    Objects and Variables are the node classes that hold components and
+    properties; anything else has no children to browse.
+    """
+    return not entry["browsed"] and entry["node_class"] in (ua.NodeClass.Object,
+                                                            ua.NodeClass.Variable)
+
+
+def browse_parameters(ua_module, node_ids, browse_filter=HIERARCHICAL):
+    """Browse request for the children of many nodes, as selected by a BrowseFilter.
+
+    The references come back with their DisplayName, NodeClass and
+    TypeDefinition, so no further reads are needed to sort them.
+    """
+    params = ua_module.BrowseParameters()
+    params.View = ua_module.ViewDescription()
+    params.RequestedMaxReferencesPerNode = 0  # Let the server page with continuation points
+    for node_id in node_ids:
+        description = ua_module.BrowseDescription()
+        description.NodeId = ua_module.NodeId.from_string(node_id)
+        description.BrowseDirection = ua_module.BrowseDirection.Forward
+        description.ReferenceTypeId = ua_module.NodeId(browse_filter.reference_type)
+        description.IncludeSubtypes = True
+        description.NodeClassMask = browse_filter.node_class_mask
+        description.ResultMask = ua_module.BrowseResultMask.All
+        params.NodesToBrowse.append(description)
+    return params
+
+
+def browse_steps(ua_module, node_ids, chunk_size=MAX_NODES_PER_BROWSE, browse_filter=HIERARCHICAL):
+    """Browses the children of many nodes as a sequence of service calls.
+
+    A generator yielding ("browse" or "browse_next", parameters) and
+    receiving the service's results (or the exception it raised), so one
+    algorithm serves both the opcua and asyncua clients; see run_steps.
+    It returns one entry per node: its list of ReferenceDescriptions, or
+    the exception that kept it from being browsed. Continuation points are
+    followed with BrowseNext until every node is complete.
+    """
+    results = [None] * len(node_ids)
+    attempts = [0] * len(node_ids)
+    pending = list(range(len(node_ids)))
+    while pending:
+        batch, pending = pending[:chunk_size], pending[chunk_size:]
+        response = yield "browse", browse_parameters(
+            ua_module, [node_ids[i] for i in batch], browse_filter)
+        if isinstance(response, Exception):
+            for i in batch:
+                results[i] = response
+            continue
+
+        continuations = {}
+        retry = []
+        for i, result in zip(batch, response):
+            # The server ran out of continuation points: browse the node again later
+            if result.StatusCode.value == ua_module.StatusCodes.BadNoContinuationPoints:
+                attempts[i] += 1
+                if attempts[i] < BROWSE_RETRIES:
+                    retry.append(i)
+                    continue
+            try:
+                result.StatusCode.check()
+            except Exception as e:
+                results[i] = e
+                continue
+            results[i] = list(result.References)
+            if result.ContinuationPoint:
+                continuations[result.ContinuationPoint] = i
+
+        while continuations:
+            params = ua_module.BrowseNextParameters()
+            params.ReleaseContinuationPoints = False
+            params.ContinuationPoints = list(continuations)
+            response = yield "browse_next", params
+            if isinstance(response, Exception):
+                for i in continuations.values():
+                    results[i] = response
+                break
+            following = {}
+            for point, result in zip(params.ContinuationPoints, response):
+                i = continuations[point]
+                try:
+                    result.StatusCode.check()
+                except Exception as e:
+                    results[i] = e
+                    continue
+                results[i].extend(result.References)
+                if result.ContinuationPoint:
+                    following[result.ContinuationPoint] = i
+            continuations = following
+
+        # Retried nodes go first, once this batch's continuation points are released
+        pending = retry + pending
+    return results
+
+
+def run_steps(steps, call):
+    """Runs a step generator synchronously; call(service, parameters) performs each step."""
+    try:
+        request = next(steps)
+        while True:
+            try:
+                response = call(*request)
+            except Exception as e:
+                response = e
+            request = steps.send(response)
+    except StopIteration as stop:
+        return stop.value
+
+
+def split_requests(node_ids, chunk_size, concurrency):
+    """Splits a level's nodes into requests, enough of them to keep `concurrency` busy."""
+    size = max(1, min(chunk_size, math.ceil(len(node_ids) / concurrency)))
+    return [node_ids[start:start + size] for start in range(0, len(node_ids), size)]
+
+
+def run_parallel(executor, call, node_ids, chunk_size, concurrency):
+    """Runs call(chunk) for the requests of split_requests on a thread pool.
+
+    The opcua client matches responses to requests by their id, so the
+    requests stay in flight together on the one session. Results are
+    returned in node order.
+    """
+    chunks = split_requests(node_ids, chunk_size, concurrency)
+    if len(chunks) <= 1:
+        return call(node_ids)
+    return [result for results in executor.map(call, chunks) for result in results]
+
+
+def browse_references(client, node_ids, chunk_size=MAX_NODES_PER_BROWSE,
+                      browse_filter=HIERARCHICAL):
+    """Browses the children of many nodes in as few requests as possible; see browse_steps."""
+    return run_steps(browse_steps(ua, node_ids, chunk_size, browse_filter),
+                     lambda service, params: getattr(client.uaclient, service)(params))
+
+
+def reference_node_id(reference):
+    """NodeId string of a browsed reference's target."""
+    return reference.NodeId.to_string()
+
+
+def value_text(value):
+    """Text shown under a variable in the address space tree."""
+    return f"Value: {value}, Type: {type(value).__name__}"
+
+
+def level_steps(level, scope=DEFAULT_SCOPE, seen=None, max_depth=None):
+    """Browses the children of one tree level, a list of (entry, path) pairs.
+
+    A generator yielding ("browse", node_ids, browse_filter) for the nodes
+    of the level and ("read", node_ids) for the values of the variables
+    found below them. Children outside the BrowseScope are dropped, and
+    those at its depth limit (or `max_depth`) are left unbrowsed. It
+    returns the next level and the variables read.
+    With a `seen` set of NodeIds, a node reached through a second
+    reference is listed but neither browsed nor read again; it is left
+    unbrowsed, so it can still be opened on demand. This also stops
+    reference cycles.
+    """
+    # The way to the roots and the nodes below them are browsed with different filters
+    by_filter = {}
+    for position, (_, path) in enumerate(level):
+        by_filter.setdefault(scope.browse_filter(path), []).append(position)
+    references = [None] * len(level)
+    for browse_filter, positions in by_filter.items():
+        results = yield "browse", [level[i][0]["node_id"] for i in positions], browse_filter
+        if isinstance(results, Exception):
+            raise results
+        for position, result in zip(positions, results):
+            references[position] = result
+
+    next_level = []
+    variables = []
+    for (entry, path), children in zip(level, references):
+        current_level = entry["name"]
+        if isinstance(children, Exception):
+            print(f"Error getting children for node {current_level}: {str(children)}")
+            continue
+        child_entries = []
+        for reference in children:
+            browse_name = reference.DisplayName.Text
+            child_path = f"{path}/{browse_name}"
+            # Branches outside the browse scope are never requested
+            if not scope.keeps(child_path):
+                continue
+            child_entry = new_browse_entry(browse_name, reference_node_id(reference),
+                                           reference.NodeClass)
+            child_entries.append(child_entry)
+            if seen is not None:
+                if child_entry["node_id"] in seen:
+                    continue
+                seen.add(child_entry["node_id"])
+            if reference.NodeClass == ua.NodeClass.Variable and scope.in_scope(child_path):
+                variables.append(child_entry)
+            if scope.browses(child_path, max_depth):
+                next_level.append((child_entry, child_path))
+        # Set in one go, as the GUI thread may be indexing the tree meanwhile
+        entry["children"] = child_entries
+        entry["browsed"] = True
+
+    if variables:
+        values = yield "read", [entry["node_id"] for entry in variables]
+        if isinstance(values, Exception):
+            raise values
+        for entry, value in zip(variables, values):
+            if isinstance(value, Exception):
+                print(f"Error reading value for {entry['name']}: {value}")
+                entry["read_error"] = True
+            else:
+                entry["value_text"] = value_text(value)
+    return next_level, variables
+
+
+def address_space_steps(root_node_id, scope=DEFAULT_SCOPE, max_depth=None):
+    """Browses the BrowseScope of the address space, one tree level at a time.
+
+    A generator yielding the steps of level_steps and receiving the
+    results of browse_references and read_values. With `max_depth`, only
+    that many levels below the roots are browsed and the nodes below are
+    left unbrowsed (lazy browsing). Every node is browsed once, however
+    many references lead to it. It returns the tree of browse entries plus
+    the directories (full path -> NodeId) and variables (display name ->
+    NodeId) found at or below the roots.
+    """
+    tree = new_browse_entry("Root", root_node_id, ua.NodeClass.Object)
+    level = [(tree, "Root")]
+    seen = {root_node_id}
+    depth = 0
+    while level:
+        next_level, variables = yield from level_steps(level, scope, seen, max_depth)
+        print(f"Browsed level {depth}: {len(level)} nodes, {len(next_level)} children, "
+              f"{len(variables)} variables")
+        level = next_level
+        depth += 1
+
+    directories, variables = index_tree(tree, scope)
+    return tree, directories, variables
+
+
+def children_steps(entry, path, scope=DEFAULT_SCOPE):
+    """Browses the children of one unbrowsed entry, such as an expanded tree item.
+
+    The steps are those of level_steps; the entry is returned with its
+    children filled in, themselves unbrowsed.
+    """
+    yield from level_steps([(entry, path)], scope)
+    return entry
+
+
+def index_tree(tree, scope=DEFAULT_SCOPE, full_paths=False, path="Root"):
+    """Directories and variables at or below the browse roots, in depth-first order.
+
+    Unbrowsed Objects count as directories, since they usually have
+    children; their contents are browsed when they are opened. Variables
+    are keyed by display name, or by full path with `full_paths`. A subtree
+    is indexed by passing its entry and full path.
+    """
+    directories = {}
+    variables = {}
+
+    def visit(entry, path):
+        for child in entry["children"]:
+            browse_name = child["name"]
+            full_path = f"{path}/{browse_name}"
+            if scope.in_scope(full_path):
+                if child["node_class"] == ua.NodeClass.Variable and not child["read_error"]:
+                    variables[full_path if full_paths else browse_name] = child["node_id"]
+                # Directories are the nodes with children
+                if child["children"] or (not child["browsed"]
+                                         and child["node_class"] == ua.NodeClass.Object):
+                    directories[full_path] = child["node_id"]
+            visit(child, full_path)
+
+    visit(tree, path)
+    return directories, variables
+
+
+def entries_by_node_id(tree, entries=None):
+    """Every entry of a browse tree by NodeId; a node listed twice maps to its browsed entry.
+
+    The entries of a newly browsed subtree are merged into `entries` if given.
+    """
+    entries = {} if entries is None else entries
+    pending = [tree]
+    while pending:
+        entry = pending.pop()
+        if entry["browsed"] or entry["node_id"] not in entries:
+            entries[entry["node_id"]] = entry
+        pending.extend(entry["children"])
+    return entries
+
+
+def browse_address_space(client, scope=DEFAULT_SCOPE, max_depth=None,
+                         concurrency=MAX_CONCURRENT_REQUESTS):
+    """Browses the BrowseScope of the address space; see address_space_steps.
+
+    The Browse and Read requests of each level are spread over up to
+    `concurrency` requests in flight at once.
+    """
+    root = client.get_root_node()
+    print(f"Got root node: {root}")
+    services = {
+        "browse": (lambda chunk, browse_filter: browse_references(
+            client, chunk, browse_filter=browse_filter), MAX_NODES_PER_BROWSE),
+        "read": (lambda chunk: read_values(client, chunk), MAX_NODES_PER_READ),
+    }
+    with ThreadPoolExecutor(concurrency, thread_name_prefix="opcua-browse") as executor:
+        def call(service, node_ids, *args):
+            request, chunk_size = services[service]
+            return run_parallel(executor, lambda chunk: request(chunk, *args), node_ids,
+                                chunk_size, concurrency)
+        return run_steps(address_space_steps(root.nodeid.to_string(), scope, max_depth), call)
+
+
+def browse_children(client, entry, path, scope=DEFAULT_SCOPE):
+    """Browses the children of one unbrowsed entry; see children_steps."""
+    services = {
+        "browse": lambda node_ids, browse_filter: browse_references(
+            client, node_ids, browse_filter=browse_filter),
+        "read": lambda node_ids: read_values(client, node_ids),
+    }
+    return run_steps(children_steps(entry, path, scope),
+                     lambda service, *args: services[service](*args))
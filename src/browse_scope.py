@@ -0,0 +1,114 @@
+from collections import namedtuple
+from fnmatch import fnmatchcase
+
+from opcua import ua
+
+# What a Browse request asks the server for: the ReferenceType followed
+# (with its subtypes) and a mask of the NodeClasses returned (0 = all)
+BrowseFilter = namedtuple("BrowseFilter", ["reference_type", "node_class_mask"])
+HIERARCHICAL = BrowseFilter(ua.ObjectIds.HierarchicalReferences, 0)
+
+# Choices offered for the references and node classes browsed below the roots
+REFERENCE_TYPES = {
+    "All hierarchical references": ua.ObjectIds.HierarchicalReferences,
+    "Organizes (folders)": ua.ObjectIds.Organizes,
+    "Aggregates (components and properties)": ua.ObjectIds.Aggregates,
+    "HasComponent": ua.ObjectIds.HasComponent,
+}
+NODE_CLASS_MASKS = {
+    "All node classes": 0,
+    "Objects and Variables": ua.NodeClass.Object | ua.NodeClass.Variable,
+    "Objects, Variables and Methods":
+        ua.NodeClass.Object | ua.NodeClass.Variable | ua.NodeClass.Method,
+    "Objects only": ua.NodeClass.Object,
+}
+
+DEFAULT_ROOTS = ("Root/Objects/PLC",)
+
+# How a path relates to a set of patterns
+_INSIDE = "inside"  # A pattern matches the path or one of its ancestors
+_ABOVE = "above"  # The path may lead to a match further down
+
+
+def _relation(patterns, segments):
+    relation = None
+    for pattern in patterns:
+        # map() stops at the shorter of the two, comparing the common levels
+        if all(map(fnmatchcase, segments, pattern)):
+            if len(segments) >= len(pattern):
+                return _INSIDE
+            relation = _ABOVE
+    return relation
+
+
+class BrowseScope:
+    """Which part of the address space is browsed.
+
+    Paths are DisplayName paths from the root node, like the directory
+    list (Root/Objects/PLC/...). Patterns match them level by level with
+    shell wildcards, so `Root/Objects/PLC/Line*` stands for every line.
+    Browsing follows the nodes leading to the `roots` and takes the
+    branches below them, down to `max_depth` levels (0 = no limit). Only
+    the branches matching an `include` pattern are kept (all of them when
+    there is none), and branches matching an `exclude` pattern are left
+    out. Below the roots the Browse requests only ask for `reference_type`
+    references and the node classes in `node_class_mask`, so the server
+    does that filtering. Pruned branches are never requested.
+    """
+
+    def __init__(self, roots=DEFAULT_ROOTS, include=(), exclude=(), max_depth=0,
+                 reference_type=ua.ObjectIds.HierarchicalReferences, node_class_mask=0):
+        self.roots = tuple(roots)
+        self.include = tuple(include)
+        self.exclude = tuple(exclude)
+        self.max_depth = max_depth
+        self.reference_type = reference_type
+        # Objects are always returned, as they are what the tree is made of
+        self.node_class_mask = node_class_mask | ua.NodeClass.Object if node_class_mask else 0
+        self._roots = [root.split("/") for root in self.roots]
+        self._include = [pattern.split("/") for pattern in self.include]
+        self._exclude = [pattern.split("/") for pattern in self.exclude]
+        self._filter = BrowseFilter(reference_type, self.node_class_mask)
+
+    def as_dict(self):
+        """JSON-able form of the scope, stored with cached trees."""
+        return {"roots": list(self.roots), "include": list(self.include),
+                "exclude": list(self.exclude), "max_depth": self.max_depth,
+                "reference_type": int(self.reference_type),
+                "node_class_mask": int(self.node_class_mask)}
+
+    def keeps(self, path):
+        """Whether a node is listed: it leads to a root or is in a wanted branch below one."""
+        segments = path.split("/")
+        relation = _relation(self._roots, segments)
+        if relation != _INSIDE:
+            return relation == _ABOVE
+        if self._exclude and _relation(self._exclude, segments) == _INSIDE:
+            return False
+        return not self._include or _relation(self._include, segments) is not None
+
+    def in_scope(self, path):
+        """Whether a node is a root or below one, where directories and variables are listed."""
+        return _relation(self._roots, path.split("/")) == _INSIDE
+
+    def browses(self, path, max_depth=None):
+        """Whether a listed node's children are browsed, given the depth limits.
+
+        `max_depth` is an extra limit, such as lazy browsing's.
+        """
+        segments = path.split("/")
+        if _relation(self._roots, segments) != _INSIDE:
+            return True
+        # Depth below the nearest root matching the path
+        depth = len(segments) - max(len(root) for root in self._roots
+                                    if all(map(fnmatchcase, segments, root))
+                                    and len(root) <= len(segments))
+        limits = [limit for limit in (self.max_depth, max_depth) if limit]
+        return not limits or depth < min(limits)
+
+    def browse_filter(self, path):
+        """The BrowseFilter for a node's children; the way to the roots is browsed unfiltered."""
+        return self._filter if self.in_scope(path) else HIERARCHICAL
+
+
+DEFAULT_SCOPE = BrowseScope()
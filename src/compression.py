@@ -0,0 +1,191 @@
+import math
+from collections import namedtuple
+
+from src.acquisition import STATUS_SUFFIX
+
+# Compression methods, as offered in the recording controls
+NO_COMPRESSION = "None"
+EXACT_CHANGE = "Exact change"
+ABSOLUTE_DEADBAND = "Deadband (absolute)"
+PERCENT_DEADBAND = "Deadband (%)"
+SWINGING_DOOR = "Swinging door"
+COMPRESSION_METHODS = [NO_COMPRESSION, EXACT_CHANGE, ABSOLUTE_DEADBAND, PERCENT_DEADBAND,
+                       SWINGING_DOOR]
+
+# How one tag is compressed. `deviation` is the tolerance of the deadband
+# and swinging door methods, in engineering units or, for the percent
+# deadband, in percent of the tag's EURange span (High - Low). A percent
+# deadband on a tag without a known EURange falls back to exact change.
+# `max_interval` is the heartbeat in seconds (0 = none).
+CompressionSettings = namedtuple("CompressionSettings", ["method", "deviation", "max_interval"])
+
+
+def _is_number(value):
+    return type(value) in (int, float) and not (type(value) is float and math.isnan(value))
+
+
+def eu_range_span(eu_range):
+    """High - Low of an EURange, or None when it is unknown or empty."""
+    try:
+        span = float(eu_range.High) - float(eu_range.Low)
+    except (AttributeError, TypeError, ValueError):
+        return None
+    return span if span > 0 and not math.isinf(span) else None
+
+
+class TagCompressor:
+    """Decides which samples of one tag are worth storing.
+
+    A sample is always stored when its status code differs from the last
+    stored sample's, when the heartbeat interval has passed since then, or
+    when the value is not a number and differs from the stored one. Other
+    samples are dropped when the last stored value (deadbands: held until
+    the next stored sample) or the line between the stored samples around
+    them (swinging door) is within `deviation` of them. The percent
+    deadband is a fixed band of `eu_range` (an EURange), so its tolerance
+    doesn't depend on the value.
+    """
+
+    def __init__(self, settings, eu_range=None):
+        self.method = settings.method
+        self.deviation = settings.deviation
+        if self.method == PERCENT_DEADBAND:
+            span = eu_range_span(eu_range)
+            if span is None:
+                self.method = EXACT_CHANGE
+            else:
+                self.method = ABSOLUTE_DEADBAND
+                self.deviation = span * settings.deviation / 100.0
+        self.max_interval_ns = int(settings.max_interval * 1e9)
+        self.stored = None  # (time_ns, value, status) of the last stored sample
+        self.upper = math.inf  # Swinging door: slopes from the stored sample
+        self.lower = -math.inf
+
+    def keep(self, sample, next_sample=None):
+        """Whether `sample` (time_ns, value, status) is stored; `next_sample` follows it."""
+        if self._must_keep(sample):
+            return self._store(sample)
+        time_ns, value, _ = sample
+        stored_time, stored_value, _ = self.stored
+        if self.method == EXACT_CHANGE or not _is_number(value) or not _is_number(stored_value):
+            return self._store(sample) if value != stored_value else False
+        if self.method == ABSOLUTE_DEADBAND:
+            return self._store(sample) if abs(value - stored_value) > self.deviation else False
+
+        # Swinging door: narrow the door by this sample's tolerance band, then
+        # drop the sample only if the line to the next one stays inside it
+        elapsed = time_ns - stored_time
+        if elapsed <= 0:
+            return self._store(sample)
+        self.upper = min(self.upper, (value + self.deviation - stored_value) / elapsed)
+        self.lower = max(self.lower, (value - self.deviation - stored_value) / elapsed)
+        if next_sample is None or not _is_number(next_sample[1]) or next_sample[2] != self.stored[2]:
+            return self._store(sample)
+        next_elapsed = next_sample[0] - stored_time
+        if next_elapsed <= 0 or (self.max_interval_ns and next_elapsed >= self.max_interval_ns):
+            return self._store(sample)
+        slope = (next_sample[1] - stored_value) / next_elapsed
+        if self.lower <= slope <= self.upper:
+            return False
+        return self._store(sample)
+
+    def _must_keep(self, sample):
+        if self.stored is None or sample[2] != self.stored[2]:
+            return True
+        return bool(self.max_interval_ns) and sample[0] - self.stored[0] >= self.max_interval_ns
+
+    def _store(self, sample):
+        self.stored = sample
+        self.upper = math.inf
+        self.lower = -math.inf
+        return True
+
+
+class RecordCompressor:
+    """Removes the cells of compressed tags from recorded rows.
+
+    A tag's cells (value or structure fields, timestamps, status) are
+    dropped together, leaving them missing in the row, and rows left with
+    no tag at all are dropped entirely. Swinging door only decides about a
+    sample once the next one has arrived, so rows are held back until
+    every tag in them is decided; flush() releases them at the end.
+    Cells without a status column (such as overrun markers) aren't samples
+    and are always kept. `eu_ranges` holds the EURange of the tags, by
+    label, for the percent deadband.
+    """
+
+    def __init__(self, settings_by_label, eu_ranges=None):
+        eu_ranges = eu_ranges or {}
+        self.compressors = {label: TagCompressor(settings, eu_ranges.get(label))
+                            for label, settings in settings_by_label.items()
+                            if settings.method != NO_COMPRESSION}
+        self._label_of_column = {}
+        self._waiting = []  # [row, columns by label, labels undecided] in arrival order
+        self._pending = {}  # label -> (waiting entry, sample) awaiting the next sample
+
+    def push(self, rows):
+        """Takes recorded rows and returns the rows that are final, compressed."""
+        for row in rows:
+            columns = self._columns_by_label(row)
+            entry = [row, columns, 0]
+            for label, names in columns.items():
+                status = row.get(label + STATUS_SUFFIX)
+                if status is None:
+                    continue
+                sample = (row["timestamp"], self._value(row, label, names), status)
+                self._decide(label, sample)
+                self._pending[label] = (entry, sample)
+                entry[2] += 1
+            self._waiting.append(entry)
+        return self._release()
+
+    def flush(self):
+        """Decides the samples still pending and returns the remaining rows."""
+        for label in list(self._pending):
+            self._decide(label, None)
+        return self._release()
+
+    def _decide(self, label, next_sample):
+        pending = self._pending.pop(label, None)
+        if pending is None:
+            return
+        entry, sample = pending
+        if not self.compressors[label].keep(sample, next_sample):
+            row, columns = entry[0], entry[1]
+            for name in columns.pop(label):
+                del row[name]
+        entry[2] -= 1
+
+    def _release(self):
+        released = 0
+        while released < len(self._waiting) and not self._waiting[released][2]:
+            released += 1
+        done, self._waiting = self._waiting[:released], self._waiting[released:]
+        # A row whose every compressed tag was dropped is not worth storing
+        return [row for row, columns, _ in done if columns or len(row) > 1]
+
+    def _columns_by_label(self, row):
+        columns = {}
+        for name in row:
+            label = self._label_of_column.get(name)
+            if label is None:
+                label = self._label_of(name)
+                self._label_of_column[name] = label
+            if label:
+                columns.setdefault(label, []).append(name)
+        return columns
+
+    def _label_of(self, name):
+        """The compressed tag a column belongs to ("" for none)."""
+        if name in self.compressors:
+            return name
+        for index, char in enumerate(name):
+            if char in "#.[" and name[:index] in self.compressors:
+                return name[:index]
+        return ""
+
+    def _value(self, row, label, names):
+        if label in row:
+            return row[label]
+        # A structure: compare all of its fields at once
+        return tuple((name, row[name]) for name in names if "#" not in name[len(label):])
@@ -0,0 +1,287 @@
+import threading
+import time
+
+from opcua import ua
+
+from src.acquisition import read_values
+from src.address_space_cache import read_server_version
+from src.async_engine import (
+    read_server_version_async, read_values_async, subscribe_model_changes_async
+)
+from src.node_metadata import NodeMetadataCache, subscribe_model_changes
+from src.sampling_hub import SamplingHub
+
+# Seconds a session nobody uses stays open, so going back to its endpoint reuses it
+IDLE_TIMEOUT = 120
+# Interval of the reads keeping sessions alive and telling whether the server answers
+KEEPALIVE_INTERVAL_MS = 5000
+KEEPALIVE_NODE_IDS = [ua.NodeId(ua.ObjectIds.Server_ServerStatus_CurrentTime).to_string()]
+# Seconds before the first reconnect attempt after a session was lost; each
+# failed attempt doubles the wait, up to RECONNECT_MAX_DELAY
+RECONNECT_MIN_DELAY = 1.0
+RECONNECT_MAX_DELAY = 60.0
+
+
+def reconnect(client):
+    """Drops what is left of a lost session and opens a new one."""
+    try:
+        client.disconnect()
+    except Exception:
+        pass
+    client.connect()
+
+
+async def reconnect_async(client):
+    """asyncua counterpart of reconnect."""
+    try:
+        await client.disconnect()
+    except Exception:
+        pass
+    await client.connect()
+
+
+class Connection:
+    """A pooled session to one endpoint with one client backend, with the caches that belong to it.
+
+    Everything bound to the endpoint shares its acquisition worker, its
+    NodeMetadataCache and SamplingHub, and the tree entries and
+    directories browsed on it. The browsed entries outlive reconnects of
+    the session; the metadata is read again after one, and the cached
+    address space is dropped if the server's version changed meanwhile.
+    """
+
+    def __init__(self, url, worker, backend=None):
+        self.url = url
+        self.backend = backend  # Client backend of the worker, like "sync" or "async"
+        self.key = (url, backend)  # Key in the ConnectionManager pool
+        self.worker = worker
+        self.client = worker.client
+        self.node_metadata = NodeMetadataCache()
+        self.sampling_hub = SamplingHub(worker)
+        self.address_space_cache = None  # AddressSpaceCache of the tree browsed on it
+        self.browse_entries = {}  # Browsed tree entries by NodeId
+        self.directories = {}  # Browsed directories by full path
+        self.users = set()
+        self.connected = False
+        self.alive = False  # False from a lost session until it is reconnected
+        self.lost_at = None  # ns since the epoch when the request that failed was sent
+        self.restored_at = None  # ns since the epoch when it was last reconnected
+        self.reconnect_attempts = 0
+        self.reconnect_timer = None
+        self.idle_since = None  # time.monotonic() when its last user left
+        self.keepalive_sent_at = None  # ns since the epoch when the last keepalive was sent
+        self._waiting = []  # (user, callback) waiting for the session to connect
+
+    def invalidate(self, node_ids=None):
+        """Passes a model change on to the session's caches; see ModelChangeHandler."""
+        self.node_metadata.invalidate(node_ids)
+        if self.address_space_cache is not None:
+            self.address_space_cache.invalidate(node_ids)
+
+
+class ConnectionManager:
+    """Pool of live sessions, one per endpoint URL and client backend.
+
+    The browser and every scenario acquire() the session of their endpoint
+    as users: the first one opens it and the others share it, so several
+    servers can be recorded at once. Sessions of one endpoint opened with
+    different backends aren't shared, as their workers differ. A session whose last user released it
+    is kept for `idle_timeout` seconds and reused if its endpoint is wanted
+    again; close_idle() closes it after that. Every session reads the
+    server's CurrentTime every KEEPALIVE_INTERVAL_MS, which keeps it from
+    timing out while nothing is read.
+
+    A session whose keepalive or shared read fails is supervised back: its
+    SamplingHub is suspended and it is reconnected with exponential
+    backoff. The server may have restarted meanwhile, so its metadata is
+    forgotten and its version read again before the model change
+    subscription is made again and the hub resumes. `status_changed` is called when a session is lost and
+    when it is back, for users to restore their own subscriptions.
+    """
+
+    def __init__(self, create_worker, status_changed=None, idle_timeout=IDLE_TIMEOUT):
+        self.create_worker = create_worker  # Makes the unstarted worker of a URL and backend
+        self.status_changed = status_changed
+        self.idle_timeout = idle_timeout
+        self.connections = {}
+
+    def acquire(self, url, user, callback, backend=None):
+        """Binds a user to the session of an endpoint with a backend, opening it if needed.
+
+        callback(connection) runs once the session is connected, at once
+        for a live one; it gets the exception instead if connecting failed.
+        """
+        self.release(user)
+        connection = self.connections.get((url, backend))
+        if connection is None:
+            try:
+                connection = Connection(url, self.create_worker(url, backend), backend)
+                connection.worker.start()
+            except Exception as e:
+                callback(e)
+                return
+            print(f"Opening session to {url}")
+            connection.sampling_hub.connection_lost = (
+                lambda error, sent_at: self._connection_lost(connection, error, sent_at))
+            self.connections[connection.key] = connection
+            connection.worker.submit(lambda client: client.connect(),
+                                     lambda result: self._connected(connection, result))
+        elif not connection.users:
+            print(f"Reusing idle session to {url}")
+        connection.users.add(user)
+        connection.idle_since = None
+        if connection.connected:
+            callback(connection)
+        else:
+            connection._waiting.append((user, callback))
+
+    def release(self, user):
+        """Unbinds a user from its session, which is closed once idle long enough."""
+        for connection in self.connections.values():
+            if user in connection.users:
+                connection.users.discard(user)
+                if not connection.users:
+                    connection.idle_since = time.monotonic()
+                    print(f"Session to {connection.url} is idle")
+
+    def close_idle(self, now=None):
+        """Closes the sessions nobody has used for idle_timeout seconds."""
+        now = time.monotonic() if now is None else now
+        for connection in list(self.connections.values()):
+            if connection.idle_since is not None and now - connection.idle_since >= self.idle_timeout:
+                print(f"Closing idle session to {connection.url}")
+                self.close(connection)
+
+    def close(self, connection):
+        """Closes a session at once and drops it from the pool."""
+        if self.connections.get(connection.key) is connection:
+            del self.connections[connection.key]
+        connection.connected = connection.alive = False
+        if connection.reconnect_timer is not None:
+            connection.reconnect_timer.cancel()
+        try:
+            # Stops the acquisition worker and disconnects its client
+            connection.worker.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        """Closes every session."""
+        for connection in list(self.connections.values()):
+            self.close(connection)
+
+    def deliver_results(self):
+        """Hands the results finished by every session's worker to their callbacks."""
+        for connection in list(self.connections.values()):
+            connection.worker.deliver_results()
+
+    def _connected(self, connection, result):
+        waiting, connection._waiting = connection._waiting, []
+        if isinstance(result, Exception):
+            self.close(connection)
+        else:
+            print(f"Session to {connection.url} connected")
+            connection.connected = connection.alive = True
+            self._start_keepalive(connection)
+            self._subscribe_model_changes(connection)
+            result = connection
+        for user, callback in waiting:
+            if user in connection.users:
+                callback(result)
+
+    def _subscribe_model_changes(self, connection):
+        # Keep the session's caches in step with changes to the address space
+        worker = connection.worker
+        subscribe = subscribe_model_changes_async if worker.is_async else subscribe_model_changes
+        worker.submit(lambda client: subscribe(client, connection),
+                      lambda subscribed: self._model_changes_subscribed(connection, subscribed))
+
+    def _model_changes_subscribed(self, connection, result):
+        if isinstance(result, Exception):
+            print(f"Model change events of {connection.url} unavailable, cached nodes are "
+                  f"only revalidated on reconnect: {str(result)}")
+
+    def _start_keepalive(self, connection):
+        read = read_values_async if connection.worker.is_async else read_values
+
+        def keepalive(client, tick):
+            # A lost session is left to the reconnect attempts
+            if not connection.alive:
+                return None
+            connection.keepalive_sent_at = time.time_ns()
+            return read(client, KEEPALIVE_NODE_IDS)
+
+        connection.worker.start_periodic(
+            (self, "keepalive"), KEEPALIVE_INTERVAL_MS, keepalive,
+            lambda result: self._keepalive_answered(connection, result))
+
+    def _keepalive_answered(self, connection, result):
+        if result is None:
+            return
+        error = result if isinstance(result, Exception) else result[0]
+        if isinstance(error, Exception):
+            self._connection_lost(connection, error, connection.keepalive_sent_at)
+
+    def _connection_lost(self, connection, error, sent_at):
+        """Suspends a session's reads and starts reconnecting it.
+
+        The outage is taken to start when the request that failed was sent,
+        in ns since the epoch, as the server may have gone long before the
+        error came back.
+        """
+        if not connection.alive or self.connections.get(connection.key) is not connection:
+            return
+        print(f"Session to {connection.url} lost: {str(error)}")
+        connection.alive = False
+        connection.lost_at = sent_at
+        connection.reconnect_attempts = 0
+        connection.sampling_hub.suspend(connection.lost_at)
+        if self.status_changed:
+            self.status_changed(connection)
+        self._schedule_reconnect(connection)
+
+    def _schedule_reconnect(self, connection):
+        delay = min(RECONNECT_MAX_DELAY, RECONNECT_MIN_DELAY * 2 ** connection.reconnect_attempts)
+        print(f"Reconnecting to {connection.url} in {delay:g} s")
+        worker = connection.worker
+        job = reconnect_async if worker.is_async else reconnect
+        connection.reconnect_timer = threading.Timer(
+            delay, worker.submit, (job, lambda result: self._reconnected(connection, result)))
+        connection.reconnect_timer.daemon = True
+        connection.reconnect_timer.start()
+
+    def _reconnected(self, connection, result):
+        if self.connections.get(connection.key) is not connection:
+            return  # Closed meanwhile
+        if isinstance(result, Exception):
+            connection.reconnect_attempts += 1
+            print(f"Reconnect {connection.reconnect_attempts} to {connection.url} "
+                  f"failed: {str(result)}")
+            self._schedule_reconnect(connection)
+            return
+        # The server may have been restarted or updated while we were away
+        connection.node_metadata.invalidate()
+        worker = connection.worker
+        read_version = read_server_version_async if worker.is_async else read_server_version
+        worker.submit(read_version, lambda version: self._revalidated(connection, version))
+
+    def _revalidated(self, connection, result):
+        if self.connections.get(connection.key) is not connection:
+            return  # Closed meanwhile
+        if isinstance(result, Exception):
+            # The new session doesn't answer either, so it counts as a failed attempt
+            self._reconnected(connection, result)
+            return
+        cache = connection.address_space_cache
+        if cache is not None and cache.version is not None and result != cache.version:
+            print(f"Server version of {connection.url} changed while disconnected, "
+                  f"dropping its cached address space")
+            cache.invalidate()
+        connection.alive = True
+        connection.restored_at = time.time_ns()
+        print(f"Session to {connection.url} reconnected after "
+              f"{(connection.restored_at - connection.lost_at) / 1e9:.1f} s")
+        self._subscribe_model_changes(connection)
+        connection.sampling_hub.resume()
+        if self.status_changed:
+            self.status_changed(connection)
@@ -0,0 +1,284 @@
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from collections import namedtuple
+
+from opcua import Client
+
+from src.acquisition import AcquisitionWorker
+from src.async_engine import AsyncAcquisitionWorker, asyncua_available
+from src.compression import COMPRESSION_METHODS, NO_COMPRESSION, CompressionSettings
+from src.connection_manager import ConnectionManager
+from src.recording_engine import POLLING, SUBSCRIPTION, RecordingEngine, open_stream
+
+BACKENDS = ("sync", "async")
+
+# Seconds between attempts to open the session of a scenario whose endpoint is unreachable
+CONNECT_RETRY_SECONDS = 30
+# Longest wait of the daemon loop, which also drains subscription notifications
+LOOP_SECONDS = 0.1
+
+# Settings of a scenario left out of the config file (and its "defaults")
+SCENARIO_DEFAULTS = {
+    "mode": POLLING,
+    "interval_ms": 1000,
+    "sampling_interval_ms": -1,  # Subscription mode; -1 = the publishing interval
+    "queue_size": 1,
+    "output": None,  # Directory of the CSV files; None = Records/<name>
+    "flush_seconds": 1.0,
+    "flush_rows": 1000,
+    "rotate_mb": 0,
+    "rotate_minutes": 0,
+    "compression": None,
+    "tag_compression": {},
+}
+
+# One scenario of a config file: where it reads, what, how often and where it writes
+ScenarioConfig = namedtuple("ScenarioConfig", [
+    "name", "endpoint", "tags", "mode", "interval_ms", "sampling_interval_ms", "queue_size",
+    "output", "flush_seconds", "flush_rows", "rotate_bytes", "rotate_seconds", "compression",
+])
+
+
+def compression_settings(data):
+    """CompressionSettings from a config entry like {"method": ..., "deviation": ..., "heartbeat": s}."""
+    if data is None:
+        return CompressionSettings(NO_COMPRESSION, 0.0, 0)
+    method = data.get("method", NO_COMPRESSION)
+    if method not in COMPRESSION_METHODS:
+        raise ValueError(f"unknown compression method {method!r}, "
+                         f"expected one of {', '.join(COMPRESSION_METHODS)}")
+    return CompressionSettings(method, float(data.get("deviation", 0.0)),
+                               int(data.get("heartbeat", 0)))
+
+
+def scenario_config(data, defaults=None):
+    """Validates one scenario of a config file; raises ValueError when it is incomplete."""
+    settings = dict(SCENARIO_DEFAULTS)
+    settings.update(defaults or {})
+    settings.update(data)
+    name = settings.get("name")
+    if not name:
+        raise ValueError("every scenario needs a name")
+    if not settings.get("endpoint"):
+        raise ValueError(f"scenario {name!r} has no endpoint")
+    tags = settings.get("tags")
+    if not isinstance(tags, dict) or not tags:
+        raise ValueError(f"scenario {name!r} needs tags, as an object of label to NodeId")
+    if settings["mode"] not in (POLLING, SUBSCRIPTION):
+        raise ValueError(f"scenario {name!r} has mode {settings['mode']!r}, "
+                         f"expected {POLLING!r} or {SUBSCRIPTION!r}")
+    try:
+        default_compression = compression_settings(settings["compression"])
+        compression = {label: default_compression for label in tags}
+        for label, tag_settings in settings["tag_compression"].items():
+            if label not in tags:
+                raise ValueError(f"compression set for unknown tag {label!r}")
+            compression[label] = compression_settings(tag_settings)
+        return ScenarioConfig(
+            name, settings["endpoint"], {str(label): str(node_id) for label, node_id in tags.items()},
+            settings["mode"], int(settings["interval_ms"]),
+            int(settings["sampling_interval_ms"]), int(settings["queue_size"]),
+            settings["output"] or os.path.join("Records", name),
+            float(settings["flush_seconds"]), int(settings["flush_rows"]),
+            int(float(settings["rotate_mb"]) * 1024 * 1024), int(float(settings["rotate_minutes"]) * 60),
+            compression)
+    except (TypeError, ValueError, AttributeError) as e:
+        raise ValueError(f"scenario {name!r}: {str(e)}")
+
+
+def load_config(path):
+    """Reads a JSON config file; returns the client backend and the ScenarioConfigs.
+
+    The file holds {"backend": "sync", "defaults": {...}, "scenarios": [...]},
+    each scenario having at least a name, an endpoint and its tags; see
+    SCENARIO_DEFAULTS for the other settings.
+    """
+    with open(path, encoding="utf-8") as file:
+        data = json.load(file)
+    if not isinstance(data, dict) or not data.get("scenarios"):
+        raise ValueError("the config file defines no scenarios")
+    backend = data.get("backend", "sync")
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+    scenarios = [scenario_config(scenario, data.get("defaults")) for scenario in data["scenarios"]]
+    names = [scenario.name for scenario in scenarios]
+    if len(set(names)) != len(names):
+        raise ValueError("scenario names must be unique")
+    return backend, scenarios
+
+
+class HeadlessScenario:
+    """Records one scenario of a config file to CSV files, without any widgets.
+
+    Like a GUI scenario it is a user of its endpoint's pooled Connection
+    and runs a RecordingEngine on it, so rows are sampled, backfilled,
+    compressed and streamed exactly as the GUI does it. A subscription
+    that fails is retried like an unreachable endpoint.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.connection = None
+        self.engine = None
+        self.retry_at = None  # time.monotonic() of the next connection attempt
+        self.error = None  # Why the last recording could not be written to disk
+
+    def start(self, connection):
+        """Starts recording from the connected session of the scenario's endpoint."""
+        config = self.config
+        self.connection = connection
+        stream_writer = open_stream(config.output, config.flush_seconds, config.flush_rows,
+                                    config.rotate_bytes, config.rotate_seconds)
+        self.engine = RecordingEngine(
+            connection, config.tags, config.mode, config.interval_ms,
+            config.sampling_interval_ms, config.queue_size, config.compression,
+            stream_writer=stream_writer, finished=self.recording_failed)
+        self.engine.start()
+        print(f"[{config.name}] Recording {len(config.tags)} tag(s) from {config.endpoint} "
+              f"({config.mode}, {config.interval_ms} ms) to {config.output}")
+
+    def recording_failed(self, error):
+        """Stops a recording whose subscription failed and retries it later."""
+        print(f"[{self.config.name}] Failed to create subscription: {str(error)}; "
+              f"retrying in {CONNECT_RETRY_SECONDS} s")
+        self.stop()
+        self.retry_at = time.monotonic() + CONNECT_RETRY_SECONDS
+
+    def drain_notifications(self):
+        """Records the data changes queued since the last drain."""
+        if self.engine is not None:
+            self.engine.drain_notifications()
+
+    def connection_restored(self, start_ns, end_ns):
+        """Fills the outage of a subscription recording, then subscribes on the new session."""
+        if self.engine is not None:
+            self.engine.connection_restored(start_ns, end_ns)
+
+    def stop(self):
+        """Stops recording, writes the rows compression held back and closes the files."""
+        if self.engine is None:
+            return
+        engine, self.engine = self.engine, None
+        writer = engine.stop()
+        print(f"[{self.config.name}] Recorded {writer.rows_written} rows "
+              f"to {len(writer.files)} file(s)")
+        if writer.error is not None:
+            self.error = writer.error
+            print(f"[{self.config.name}] Recording could not be written to disk: "
+                  f"{str(writer.error)}")
+
+
+class RecorderDaemon:
+    """Runs the scenarios of a config file until stopped, without Qt.
+
+    Sessions are pooled per endpoint by a ConnectionManager, as in the GUI,
+    so scenarios on one endpoint share its session and reads. Results of
+    the acquisition workers are handed to their callbacks on the thread
+    calling run(), which plays the part of the GUI thread.
+    """
+
+    def __init__(self, configs, backend="sync"):
+        self.backend = backend
+        self.scenarios = [HeadlessScenario(config) for config in configs]
+        self.connections = ConnectionManager(self.create_worker, self.connection_status_changed)
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+
+    def create_worker(self, server_url, backend):
+        """Makes the acquisition worker of a new session with the configured backend."""
+        if backend == "async":
+            return AsyncAcquisitionWorker(server_url, notify=self._wake.set)
+        return AcquisitionWorker(Client(server_url), notify=self._wake.set)
+
+    def connect(self, scenario):
+        """Binds a scenario to the session of its endpoint, opening it if needed."""
+        scenario.retry_at = None
+        self.connections.acquire(scenario.config.endpoint, scenario,
+                                 lambda result: self.scenario_connected(scenario, result),
+                                 self.backend)
+
+    def scenario_connected(self, scenario, result):
+        """Starts a scenario, or schedules another try when its endpoint can't be reached."""
+        if isinstance(result, Exception):
+            print(f"[{scenario.config.name}] Could not connect to {scenario.config.endpoint}: "
+                  f"{str(result)}; retrying in {CONNECT_RETRY_SECONDS} s")
+            scenario.retry_at = time.monotonic() + CONNECT_RETRY_SECONDS
+            return
+        scenario.start(result)
+
+    def connection_status_changed(self, connection):
+        """Restores the subscriptions of the scenarios on a reconnected session."""
+        if not connection.alive:
+            return
+        for scenario in self.scenarios:
+            if scenario.connection is connection:
+                scenario.connection_restored(connection.lost_at, connection.restored_at)
+
+    def stop(self):
+        """Asks run() to stop recording and return; safe to call from a signal handler."""
+        self._stopping.set()
+        self._wake.set()
+
+    def run(self, duration=None):
+        """Records until stop() is called, or for `duration` seconds."""
+        deadline = None if duration is None else time.monotonic() + duration
+        for scenario in self.scenarios:
+            self.connect(scenario)
+        try:
+            while not self._stopping.is_set():
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    break
+                for scenario in self.scenarios:
+                    if scenario.retry_at is not None and now >= scenario.retry_at:
+                        self.connect(scenario)
+                self._wake.wait(LOOP_SECONDS)
+                self._wake.clear()
+                self.connections.deliver_results()
+                for scenario in self.scenarios:
+                    scenario.drain_notifications()
+                self.connections.close_idle()
+        finally:
+            for scenario in self.scenarios:
+                scenario.stop()
+            self.connections.close_all()
+        return all(scenario.error is None for scenario in self.scenarios)
+
+
+def main(argv=None):
+    """Command line entry point: records the scenarios of a config file until interrupted."""
+    parser = argparse.ArgumentParser(
+        description="Record OPC UA scenarios defined in a JSON config file, without the GUI.")
+    parser.add_argument("config", help="JSON file defining the scenarios")
+    parser.add_argument("--backend", choices=BACKENDS, help="client backend, overriding the config")
+    parser.add_argument("--duration", type=float, help="stop after this many seconds")
+    parser.add_argument("--check", action="store_true", help="only validate the config file")
+    args = parser.parse_args(argv)
+
+    try:
+        backend, configs = load_config(args.config)
+    except (OSError, ValueError) as e:
+        print(f"Invalid config {args.config}: {str(e)}", file=sys.stderr)
+        return 2
+    backend = args.backend or backend
+    if backend == "async" and not asyncua_available():
+        print("The async backend requires the asyncua package (pip install asyncua)", file=sys.stderr)
+        return 2
+    if args.check:
+        print(f"{args.config}: {len(configs)} scenario(s) on "
+              f"{len({config.endpoint for config in configs})} endpoint(s)")
+        return 0
+
+    daemon = RecorderDaemon(configs, backend)
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda signum, frame: daemon.stop())
+    return 0 if daemon.run(args.duration) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+from collections import namedtuple
+
+from opcua import ua
+
+from src.acquisition import (
+    MAX_NODES_PER_READ, read_data_values, read_node_attributes, values_from_data_values
+)
+
+# Attributes that describe a variable rather than its current value
+METADATA_ATTRIBUTES = (
+    ua.AttributeIds.AccessLevel,
+    ua.AttributeIds.Description,
+    ua.AttributeIds.DataType,
+    ua.AttributeIds.ValueRank,
+    ua.AttributeIds.ArrayDimensions,
+)
+# Properties of a variable (HasProperty children) kept with its attributes
+METADATA_PROPERTIES = ("EngineeringUnits", "EURange")
+
+# Static description of a variable; a field is None when the server has none
+NodeMetadata = namedtuple("NodeMetadata", [
+    "access_level", "description", "data_type", "value_rank", "array_dimensions",
+    "engineering_units", "eu_range",
+])
+
+
+def data_type_name(data_type):
+    """Name of a DataType NodeId; standard types by their symbolic name."""
+    if data_type is None:
+        return ""
+    if data_type.NamespaceIndex == 0:
+        return ua.ObjectIdNames.get(data_type.Identifier, data_type.to_string())
+    return data_type.to_string()
+
+
+def metadata_reads(node_ids):
+    """The (node_id, attribute) pairs of one batched metadata read."""
+    return [(node_id, attribute) for node_id in node_ids for attribute in METADATA_ATTRIBUTES]
+
+
+def property_browse_paths(ua_module, node_ids):
+    """One BrowsePath per node and property, for TranslateBrowsePathsToNodeIds."""
+    paths = []
+    for node_id in node_ids:
+        for name in METADATA_PROPERTIES:
+            element = ua_module.RelativePathElement()
+            element.ReferenceTypeId = ua_module.NodeId(ua_module.ObjectIds.HasProperty)
+            element.IncludeSubtypes = True
+            element.TargetName = ua_module.QualifiedName(name, 0)
+            path = ua_module.BrowsePath()
+            path.StartingNode = ua_module.NodeId.from_string(node_id)
+            path.RelativePath.Elements.append(element)
+            paths.append(path)
+    return paths
+
+
+def property_node_ids(ua_module, results):
+    """NodeIds of the properties found by TranslateBrowsePathsToNodeIds (None if absent)."""
+    node_ids = []
+    for result in results:
+        if isinstance(result, Exception) or not result.StatusCode.is_good() or not result.Targets:
+            node_ids.append(None)
+            continue
+        target = result.Targets[0].TargetId
+        node_ids.append(ua_module.NodeId(target.Identifier, target.NamespaceIndex))
+    return node_ids
+
+
+class NodeMetadataCache:
+    """Static attributes and properties of variables, read once per connection.
+
+    AccessLevel, Description, DataType, ValueRank, ArrayDimensions,
+    EngineeringUnits and EURange hardly ever change, so they are read for
+    every missing node in one batch and then served from memory. The cache
+    belongs to one pooled connection, which invalidates it when its session
+    is reconnected or the server reports a model change.
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    def get(self, node_id):
+        """The NodeMetadata of a node, or None when it isn't cached."""
+        return self._entries.get(node_id)
+
+    def missing(self, node_ids):
+        """The nodes whose metadata still has to be read."""
+        return [node_id for node_id in dict.fromkeys(node_ids) if node_id not in self._entries]
+
+    def invalidate(self, node_ids=None):
+        """Forgets some nodes, or every node when none are given."""
+        if node_ids is None:
+            self._entries = {}
+            return
+        for node_id in node_ids:
+            self._entries.pop(node_id, None)
+
+    def fill(self, client, node_ids, chunk_size=MAX_NODES_PER_READ):
+        """Reads the metadata of the given nodes in batched requests."""
+        node_ids = self.missing(node_ids)
+        if not node_ids:
+            return
+        attributes = read_node_attributes(client, metadata_reads(node_ids), chunk_size)
+        paths = property_browse_paths(ua, node_ids)
+        translated = []
+        for start in range(0, len(paths), chunk_size):
+            chunk = paths[start:start + chunk_size]
+            try:
+                translated.extend(client.uaclient.translate_browsepaths_to_nodeids(chunk))
+            except Exception as e:
+                translated.extend([e] * len(chunk))
+        found = property_node_ids(ua, translated)
+        properties = iter(read_data_values(
+            client, [node_id for node_id in found if node_id is not None], chunk_size=chunk_size))
+        self.store(node_ids, attributes,
+                   [next(properties) if node_id is not None else None for node_id in found])
+
+    def store(self, node_ids, attributes, properties):
+        """Caches decoded metadata from the batched attribute and property reads.
+
+        Nodes whose Read request failed as a whole are left out, so they are
+        read again next time.
+        """
+        attribute_count = len(METADATA_ATTRIBUTES)
+        property_count = len(METADATA_PROPERTIES)
+        for index, node_id in enumerate(node_ids):
+            results = attributes[index * attribute_count:(index + 1) * attribute_count]
+            if any(isinstance(result, Exception) for result in results):
+                continue
+            access_level, description, data_type, value_rank, array_dimensions = [
+                None if isinstance(value, Exception) else value
+                for value in values_from_data_values(results)]
+            units, eu_range = [
+                _property_value(result)
+                for result in properties[index * property_count:(index + 1) * property_count]]
+            self._entries[node_id] = NodeMetadata(
+                access_level,
+                description.Text if description is not None and description.Text else None,
+                data_type, value_rank, array_dimensions,
+                units.DisplayName.Text if units is not None and units.DisplayName else None,
+                eu_range)
+
+
+def _property_value(result):
+    """Value of a property read result; None when the property is absent or bad."""
+    if result is None:
+        return None
+    value = values_from_data_values([result])[0]
+    return None if isinstance(value, Exception) else value
+
+
+class ModelChangeHandler:
+    """Event handler that invalidates caches of the address space on model changes.
+
+    Each cache has an invalidate(node_ids=None) method. GeneralModelChangeEvents
+    list the affected nodes; any other event (such as a SemanticChangeEvent
+    without details) clears the caches entirely.
+    """
+
+    def __init__(self, *caches):
+        self.caches = caches
+
+    def event_notification(self, event):
+        changes = getattr(event, "Changes", None)
+        if not changes:
+            print("Address space changed, clearing cached nodes")
+            node_ids = None
+        else:
+            node_ids = [change.Affected.to_string() for change in changes]
+            print(f"Address space changed, invalidating {len(node_ids)} cached node(s)")
+        for cache in self.caches:
+            cache.invalidate(node_ids)
+
+    def status_change_notification(self, status):
+        print(f"Model change subscription status changed: {status}")
+
+
+def subscribe_model_changes(client, *caches, publishing_interval=1000):
+    """Subscribes to the Server's model change events to keep `caches` current."""
+    subscription = client.create_subscription(publishing_interval, ModelChangeHandler(*caches))
+    subscription.subscribe_events(
+        client.get_node(ua.ObjectIds.Server), ua.ObjectIds.GeneralModelChangeEventType)
+    return subscription
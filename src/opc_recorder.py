@@ -1,29 +1,224 @@
 import sys
 import csv
 import os
+import threading
+import time
 from datetime import datetime
 from opcua import Client, ua
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
     QLineEdit, QLabel, QTreeWidget, QTreeWidgetItem, QComboBox, QListWidget,
-    QListWidgetItem, QSpinBox, QTableWidget, QTableWidgetItem, QFileDialog, QMessageBox,
-    QFrame, QSplitter, QHeaderView, QCheckBox, QTabWidget, QInputDialog
+    QListWidgetItem, QSpinBox, QFileDialog, QMessageBox,
+    QFrame, QSplitter, QHeaderView, QCheckBox, QTabWidget, QInputDialog, QTableView,
+    QDoubleSpinBox, QMenu
 )
-from PyQt5.QtCore import QTimer, Qt
+from PyQt5.QtCore import QTimer, Qt, QObject, pyqtSignal, QAbstractTableModel, QModelIndex
+from PyQt5.QtGui import QColor
+from src.acquisition import AcquisitionWorker, read_values
+from src.async_engine import (
+    AsyncAcquisitionWorker, browse_address_space_async, browse_children_async,
+    browse_references_async, fill_node_metadata_async, read_server_version_async,
+    read_values_async
+)
+from src.address_space_cache import (
+    AddressSpaceCache, graft_cached_levels, read_server_version, tree_structure
+)
+from src.browse import (
+    LAZY_BROWSE_DEPTH, browse_address_space, browse_children, browse_references,
+    entries_by_node_id, index_tree, may_have_children, reference_node_id
+)
+from src.browse_scope import NODE_CLASS_MASKS, REFERENCE_TYPES, BrowseScope
+from src.node_metadata import data_type_name
+from src.tag_search import KIND_VARIABLE, TagIndex
+from src.connection_manager import ConnectionManager
+from src.compression import (
+    COMPRESSION_METHODS, EXACT_CHANGE, NO_COMPRESSION, PERCENT_DEADBAND, CompressionSettings
+)
+from src.recording_buffer import RecordingBuffer
+from src.recording_engine import POLLING, SUBSCRIPTION, RecordingEngine, open_stream
+from src.recording_file import FILE_EXTENSION, write_recording
+from src.recording_rows import format_recorded, group_headers
+from src.structures import is_structure, structure_flattener
+
+# Rows kept in memory for the table while a recording streams to disk
+STREAM_ROWS_KEPT = 100000
+# Item data role set on variables whose value tooltip has been read
+VALUE_READ_ROLE = Qt.UserRole + 1
+
+class WorkerBridge(QObject):
+    """Relays acquisition worker notifications onto the GUI thread."""
+    results_ready = pyqtSignal()
+
+class RecordingTableModel(QAbstractTableModel):
+    """Table model that shows a RecordingBuffer without copying it.
+
+    Cells are formatted only when the view asks for them, which is only
+    for the visible ones. New rows are announced incrementally, so adding
+    a sample costs the same however long the recording is.
+    """
+
+    def __init__(self, format_cell, parent=None):
+        super().__init__(parent)
+        self.format_cell = format_cell
+        self.buffer = RecordingBuffer()
+        self.headers = []
+        self.row_total = 0
+        self.dropped = 0  # Rows the ring buffer had discarded at the last sync
+
+    def set_buffer(self, buffer, headers):
+        """Shows a new buffer (a new recording) with the given columns."""
+        self.beginResetModel()
+        self.buffer = buffer
+        self.headers = list(headers)
+        self.row_total = len(buffer)
+        self.dropped = buffer.total - len(buffer)
+        self.endResetModel()
+
+    def sync(self, headers):
+        """Announces rows appended to (or dropped from) the buffer since the last sync."""
+        if headers != self.headers:
+            self.set_buffer(self.buffer, headers)
+            return True
+
+        dropped = self.buffer.total - len(self.buffer)
+        removed = dropped - self.dropped
+        if removed >= self.row_total and removed:
+            self.set_buffer(self.buffer, headers)
+            return False
+        if removed:
+            self.beginRemoveRows(QModelIndex(), 0, removed - 1)
+            self.row_total -= removed
+            self.dropped = dropped
+            self.endRemoveRows()
+        if len(self.buffer) > self.row_total:
+            self.beginInsertRows(QModelIndex(), self.row_total, len(self.buffer) - 1)
+            self.row_total = len(self.buffer)
+            self.endInsertRows()
+        return False
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.row_total
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            header = self.headers[index.column()]
+            return self.format_cell(header, self.buffer.cell(index.row(), header))
+        if role == Qt.ForegroundRole:
+            return QColor(Qt.white)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.headers[section] if section < len(self.headers) else None
+        return str(section + 1)
+
+class LiveTableModel(QAbstractTableModel):
+    """Table model of the live values that only repaints what changed.
+
+    Updates are compared with the text already shown; the cells that
+    differ are collected and announced in one dataChanged batch by flush().
+    Column 0 is left empty for the real-time checkbox widgets.
+    """
+
+    HEADERS = ["Real-time", "Variable", "Current Value", "Data Type", "Node ID",
+               "Access Level", "Description"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+        self.dirty = None  # (first row, last row, first column, last column) to announce
+
+    def set_variables(self, variables):
+        """Shows one row per (name, node_id), waiting for its first value."""
+        self.beginResetModel()
+        self.rows = [["", name, "Waiting...", "", node_id, "", ""] for name, node_id in variables]
+        self.dirty = None
+        self.endResetModel()
+
+    def update_row(self, row, name, texts):
+        """Sets the texts of a row by column; returns False if the row shows another variable."""
+        if row >= len(self.rows) or self.rows[row][1] != name:
+            return False
+        cells = self.rows[row]
+        for column, text in texts:
+            if cells[column] != text:
+                cells[column] = text
+                if self.dirty is None:
+                    self.dirty = (row, row, column, column)
+                else:
+                    first_row, last_row, first_column, last_column = self.dirty
+                    self.dirty = (min(first_row, row), max(last_row, row),
+                                  min(first_column, column), max(last_column, column))
+        return True
+
+    def flush(self):
+        """Announces the cells changed since the last flush in one dataChanged."""
+        if self.dirty is None:
+            return
+        first_row, last_row, first_column, last_column = self.dirty
+        self.dirty = None
+        self.dataChanged.emit(self.index(first_row, first_column),
+                              self.index(last_row, last_column), [Qt.DisplayRole])
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return self.rows[index.row()][index.column()]
+        if role == Qt.ForegroundRole:
+            return QColor(Qt.white)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return str(section + 1)
 
 class RecordingScenario(QWidget):
-    def __init__(self, parent=None, name="New Scenario", client=None):
+    def __init__(self, parent=None, name="New Scenario"):
         super().__init__(parent)
         self.name = name
-        self.client = client
+        # Bound to the Connection of its endpoint by bind_connection()
+        self.connection = None
+        self.client = None
+        self.worker = None  # Acquisition worker of the connection; all reads run there
+        self.node_metadata = None  # NodeMetadataCache of the connection
+        self.sampling_hub = None  # SamplingHub sharing periodic reads across tabs
+        # Browsed tree entries by NodeId, so known directories list without a browse
+        self.browse_entries = {}
+        self.tooltip_reads = set()  # NodeIds whose value tooltip is being read
+        self.tooltip_timer = QTimer(self)
+        self.tooltip_timer.setSingleShot(True)
+        self.tooltip_timer.setInterval(100)
+        self.tooltip_timer.timeout.connect(self.read_visible_tooltips)
         self.selected_vars = {}
-        self.record_data_list = []
-        self.record_count = 0
-        self.record_timer = QTimer(self)
-        self.record_timer.timeout.connect(self.record_data)
-        self.live_update_timer = QTimer(self)
-        self.live_update_timer.timeout.connect(self.update_live_values)
-        self.live_update_timer.setInterval(100)  # Update every 100ms
+        self.record_buffer = RecordingBuffer()
+        self.data_column_total = 0
+        self.tag_compression = {}  # Per-variable CompressionSettings overriding the default
+        self.engine = None  # RecordingEngine of the running recording
+        self.live_interval_ms = 100  # Update every 100ms
+        self.live_targets = ()
+        self.live_updating = False
+        self.live_update_checkboxes = {}
+        # Subscription mode: notifications arrive on the client's thread and
+        # are drained into the recording on the GUI thread
+        self.notification_timer = QTimer(self)
+        self.notification_timer.timeout.connect(self.drain_notifications)
         
         # Set the application-wide stylesheet for dialogs
         app = QApplication.instance()
@@ -79,6 +274,11 @@ class RecordingScenario(QWidget):
         layout = QVBoxLayout(self)
         layout.setSpacing(15)
 
+        # Endpoint the scenario reads from
+        self.endpoint_label = QLabel("Endpoint: not connected")
+        self.endpoint_label.setStyleSheet("color: #e0e0e0;")
+        layout.addWidget(self.endpoint_label)
+
         # Directory selection
         dir_frame = QFrame()
         dir_frame.setStyleSheet("""
@@ -158,15 +358,46 @@ class RecordingScenario(QWidget):
             }
         """)
         self.var_list.itemChanged.connect(self.on_variable_checked)
+        self.var_list.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.var_list.customContextMenuRequested.connect(self.show_variable_menu)
+        # Value tooltips are read for the rows scrolled into view or hovered
+        self.var_list.setMouseTracking(True)
+        self.var_list.itemEntered.connect(self.schedule_tooltips)
+        self.var_list.verticalScrollBar().valueChanged.connect(self.schedule_tooltips)
         layout.addWidget(self.var_list)
 
+        # Default compression of recorded variables; right-click a variable to override it
+        compression_layout = QHBoxLayout()
+        self.compression_combo = QComboBox()
+        self.compression_combo.addItems(COMPRESSION_METHODS)
+        self.compression_combo.setToolTip(
+            "Default compression of recorded variables (right-click a variable to set its own)")
+        self.deviation_spin = QDoubleSpinBox()
+        self.deviation_spin.setRange(0, 1e9)
+        self.deviation_spin.setDecimals(4)
+        self.deviation_spin.setValue(0.1)
+        self.heartbeat_spin = QSpinBox()
+        self.heartbeat_spin.setRange(0, 86400)
+        self.heartbeat_spin.setSpecialValueText("Off")
+        self.heartbeat_spin.setValue(60)
+        compression_layout.addWidget(QLabel("Compression:"))
+        compression_layout.addWidget(self.compression_combo)
+        compression_layout.addWidget(QLabel("Deviation:"))
+        compression_layout.addWidget(self.deviation_spin)
+        compression_layout.addWidget(QLabel("Heartbeat (s):"))
+        compression_layout.addWidget(self.heartbeat_spin)
+        compression_layout.addStretch()
+        layout.addLayout(compression_layout)
+
         # Live Values table
         live_label = QLabel("Live Values:")
         live_label.setStyleSheet("font-weight: bold; font-size: 12pt; color: #e0e0e0;")
         layout.addWidget(live_label)
-        self.live_table = QTableWidget()
+        self.live_table = QTableView()
+        self.live_model = LiveTableModel(self)
+        self.live_table.setModel(self.live_model)
         self.live_table.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 background-color: #333333;
                 border: 1px solid #4a4a4a;
                 border-radius: 8px;
@@ -174,13 +405,13 @@ class RecordingScenario(QWidget):
                 gridline-color: #4a4a4a;
                 alternate-background-color: #383838;
             }
-            QTableWidget::item {
+            QTableView::item {
                 background-color: transparent;
                 color: #f0f0f0;
                 padding: 4px;
                 border: none;
             }
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #505050;
                 color: #ffffff;
             }
@@ -199,13 +430,24 @@ class RecordingScenario(QWidget):
             QHeaderView {
                 background-color: #333333;
             }
-            QTableWidget QWidget {
+            QTableView QWidget {
                 background-color: transparent;
             }
         """)
         self.live_table.setAlternatingRowColors(True)
         layout.addWidget(self.live_table)
 
+        # Live updates are coalesced and repainted at most once per display frame
+        screen = QApplication.primaryScreen()
+        refresh_rate = screen.refreshRate() if screen else 0
+        self.live_frame_ms = int(1000 / refresh_rate) if refresh_rate > 0 else 16
+        self.live_flush_timer = QTimer(self)
+        self.live_flush_timer.setSingleShot(True)
+        self.live_flush_timer.timeout.connect(self.flush_live_table)
+        self.live_flushed_at = 0.0
+        self.live_shown = {}  # node_id -> (comparison key, row texts) last sent by the worker
+        self.live_shown_targets = ()
+
         # Recording controls in a frame
         controls_frame = QFrame()
         controls_frame.setStyleSheet("""
@@ -259,18 +501,44 @@ class RecordingScenario(QWidget):
         self.interval_spin.setRange(1, 10000)
         self.interval_spin.setValue(100)
         self.records_spin = QSpinBox()
-        self.records_spin.setRange(1, 10000)
+        self.records_spin.setRange(1, 100000000)
         self.records_spin.setValue(5)
+        self.ring_checkbox = QCheckBox("Keep last N (continuous)")
+        self.ring_checkbox.setToolTip(
+            "Record until stopped, keeping only the newest records in memory")
+        self.mode_combo = QComboBox()
+        self.mode_combo.addItems(["Polling", "Subscription"])
+        self.mode_combo.currentIndexChanged.connect(self.recording_mode_changed)
+        self.sampling_spin = QSpinBox()
+        self.sampling_spin.setRange(-1, 10000)
+        self.sampling_spin.setSpecialValueText("Interval")  # -1: sample at the publishing interval
+        self.sampling_spin.setValue(-1)
+        self.queue_spin = QSpinBox()
+        self.queue_spin.setRange(1, 10000)
+        self.queue_spin.setValue(10)
         
+        mode_label = QLabel("Mode:")
         interval_label = QLabel("Interval (ms):")
+        sampling_label = QLabel("Sampling (ms):")
+        queue_label = QLabel("Queue Size:")
         records_label = QLabel("Number of Records:")
         
+        controls_layout.addWidget(mode_label)
+        controls_layout.addWidget(self.mode_combo)
+        controls_layout.addSpacing(20)
         controls_layout.addWidget(interval_label)
         controls_layout.addWidget(self.interval_spin)
         controls_layout.addSpacing(20)
+        controls_layout.addWidget(sampling_label)
+        controls_layout.addWidget(self.sampling_spin)
+        controls_layout.addWidget(queue_label)
+        controls_layout.addWidget(self.queue_spin)
+        controls_layout.addSpacing(20)
         controls_layout.addWidget(records_label)
         controls_layout.addWidget(self.records_spin)
+        controls_layout.addWidget(self.ring_checkbox)
         controls_layout.addStretch()
+        self.recording_mode_changed()
         
         # Record control buttons
         self.start_button = QPushButton("Start Record")
@@ -317,9 +585,11 @@ class RecordingScenario(QWidget):
         data_label = QLabel("Recorded Data:")
         data_label.setStyleSheet("font-weight: bold; font-size: 12pt; color: #e0e0e0;")
         layout.addWidget(data_label)
-        self.data_table = QTableWidget()
+        self.data_table = QTableView()
+        self.data_model = RecordingTableModel(self.format_cell, self)
+        self.data_table.setModel(self.data_model)
         self.data_table.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 background: #333333;
                 border: 1px solid #4a4a4a;
                 border-radius: 8px;
@@ -327,12 +597,12 @@ class RecordingScenario(QWidget):
                 gridline-color: #4a4a4a;
                 alternate-background-color: #404040;
             }
-            QTableWidget::item {
+            QTableView::item {
                 color: #f0f0f0;
                 padding: 4px;
                 border: none;
             }
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background: #505050;
                 color: #ffffff;
             }
@@ -353,6 +623,8 @@ class RecordingScenario(QWidget):
             }
         """)
         self.data_table.setAlternatingRowColors(True)
+        # Size columns from a sample of rows rather than the whole recording
+        self.data_table.horizontalHeader().setResizeContentsPrecision(100)
         layout.addWidget(self.data_table)
 
         # Save controls
@@ -383,6 +655,43 @@ class RecordingScenario(QWidget):
             }
         """)
         save_controls.addWidget(self.auto_save_checkbox)
+        self.save_format_combo = QComboBox()
+        self.save_format_combo.addItem("CSV", "csv")
+        self.save_format_combo.addItem("Binary (.opcrec)", "binary")
+        self.save_format_combo.setToolTip("Format of auto-saved recordings")
+        save_controls.addWidget(self.save_format_combo)
+
+        # Streaming to disk while recording
+        self.stream_checkbox = QCheckBox("Stream to disk while recording")
+        self.stream_checkbox.setToolTip(
+            "Append rows to Records/<scenario> as they are recorded instead of saving at the end")
+        self.stream_checkbox.setStyleSheet(self.auto_save_checkbox.styleSheet())
+        self.flush_seconds_spin = QSpinBox()
+        self.flush_seconds_spin.setRange(1, 3600)
+        self.flush_seconds_spin.setValue(1)
+        self.flush_rows_spin = QSpinBox()
+        self.flush_rows_spin.setRange(1, 1000000)
+        self.flush_rows_spin.setValue(1000)
+        self.rotate_mb_spin = QSpinBox()
+        self.rotate_mb_spin.setRange(0, 100000)
+        self.rotate_mb_spin.setSpecialValueText("Off")
+        self.rotate_mb_spin.setValue(100)
+        self.rotate_minutes_spin = QSpinBox()
+        self.rotate_minutes_spin.setRange(0, 100000)
+        self.rotate_minutes_spin.setSpecialValueText("Off")
+        self.rotate_minutes_spin.setValue(60)
+
+        save_controls.addSpacing(20)
+        save_controls.addWidget(self.stream_checkbox)
+        save_controls.addWidget(QLabel("Flush every (s):"))
+        save_controls.addWidget(self.flush_seconds_spin)
+        save_controls.addWidget(QLabel("or rows:"))
+        save_controls.addWidget(self.flush_rows_spin)
+        save_controls.addWidget(QLabel("Rotate at (MB):"))
+        save_controls.addWidget(self.rotate_mb_spin)
+        save_controls.addWidget(QLabel("or (min):"))
+        save_controls.addWidget(self.rotate_minutes_spin)
+        save_controls.addStretch()
         
         self.save_button = QPushButton("Save CSV")
         self.save_button.setStyleSheet("""
@@ -405,58 +714,141 @@ class RecordingScenario(QWidget):
         layout.addLayout(save_controls)
 
     def directory_changed(self):
-        """When directory selection changes, update the variable list."""
+        """When directory selection changes, browse the new directory on the worker."""
         self.var_list.clear()
         index = self.dir_combo.currentIndex()
-        if index < 0 or not self.client:
+        if index < 0 or not self.worker:
             return
-            
+
+        node_id = self.dir_combo.itemData(index)
+        current_dir = self.dir_combo.currentText()
+        entry = self.browse_entries.get(node_id)
+        if entry is not None and entry["browsed"]:
+            # Already browsed with the address space: list it straight away
+            self.show_directory_variables((node_id, [
+                (f"{current_dir}/{child['name']}", child["node_id"])
+                for child in entry["children"] if child["node_class"] == ua.NodeClass.Variable]))
+            return
+        browse = self.browse_directory_async if self.worker.is_async else self.browse_directory
+        self.worker.submit(
+            lambda client: browse(client, node_id, current_dir),
+            self.show_directory_variables)
+
+    def browse_directory(self, client, node_id, current_dir):
+        """Lists the variables of a directory; runs on the acquisition worker."""
+        # One Browse returns every child with its name and node class
+        children = browse_references(client, [node_id])[0]
+        if isinstance(children, Exception):
+            raise children
+        return node_id, self._directory_variables(current_dir, children)
+
+    async def browse_directory_async(self, client, node_id, current_dir):
+        """asyncua counterpart of browse_directory."""
+        children = (await browse_references_async(client, [node_id]))[0]
+        if isinstance(children, Exception):
+            raise children
+        return node_id, self._directory_variables(current_dir, children)
+
+    def _directory_variables(self, current_dir, children):
+        """(full path, NodeId) of each variable among a directory's browsed references."""
+        # Create full path by combining directory path and variable name
+        return [(f"{current_dir}/{child.DisplayName.Text}", reference_node_id(child))
+                for child in children if child.NodeClass == ua.NodeClass.Variable]
+
+    def schedule_tooltips(self, *args):
+        """Reads the value tooltips of the visible rows once scrolling settles."""
+        self.tooltip_timer.start()
+
+    def visible_variable_items(self):
+        """The variable list items currently scrolled into view."""
+        viewport = self.var_list.viewport().rect()
+        first = self.var_list.indexAt(viewport.topLeft()).row()
+        if first < 0:
+            return []
+        last = self.var_list.indexAt(viewport.bottomLeft()).row()
+        if last < 0:
+            last = self.var_list.count() - 1
+        return [self.var_list.item(row) for row in range(first, last + 1)]
+
+    def read_visible_tooltips(self):
+        """Reads the values of the visible variables without a tooltip in one batch."""
+        if not self.worker:
+            return
+        node_ids = list(dict.fromkeys(
+            item.data(Qt.UserRole) for item in self.visible_variable_items()
+            if not item.data(VALUE_READ_ROLE) and item.data(Qt.UserRole) not in self.tooltip_reads))
+        if not node_ids:
+            return
+        self.tooltip_reads.update(node_ids)
+        read = read_values_async if self.worker.is_async else read_values
+        self.worker.submit(lambda client: read(client, node_ids),
+                           lambda result: self.show_value_tooltips(node_ids, result))
+
+    def show_value_tooltips(self, node_ids, result):
+        """Puts values read by read_visible_tooltips into the items' tooltips."""
+        self.tooltip_reads.difference_update(node_ids)
+        if isinstance(result, Exception):
+            print(f"Error reading values for tooltips: {str(result)}")
+            return
+        tooltips = {}
+        for node_id, value in zip(node_ids, result):
+            if isinstance(value, Exception):
+                tooltips[node_id] = "Could not read initial value"
+            else:
+                tooltips[node_id] = self._value_tooltip(value)
+        # The list may have changed directory meanwhile; match items by NodeId.
+        # Tooltips aren't check state changes, so itemChanged is kept quiet.
+        self.var_list.blockSignals(True)
         try:
-            node_id = self.dir_combo.itemData(index)
-            node = self.client.get_node(node_id)
-            children = node.get_children()
-            
-            # Get the current directory path
-            current_dir = self.dir_combo.currentText()
-            
-            for child in children:
-                try:
-                    if child.get_node_class() == ua.NodeClass.Variable:
-                        item = QListWidgetItem()
-                        display_name = child.get_display_name().Text
-                        # Create full path by combining directory path and variable name
-                        full_path = f"{current_dir}/{display_name}"
-                        item.setText(full_path)
-                        item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
-                        item.setCheckState(Qt.Unchecked)
-                        item.setData(Qt.UserRole, child.nodeid.to_string())
-                        
-                        # Try to get initial value and type
-                        try:
-                            value = child.get_value()
-                            value_type = type(value).__name__
-                            item.setToolTip(f"Current Value: {value}\nType: {value_type}")
-                        except Exception:
-                            item.setToolTip("Could not read initial value")
-                            
-                        self.var_list.addItem(item)
-                except Exception as e:
-                    print(f"Error processing variable {child.nodeid}: {str(e)}")
-                    
-            # Start live updates if there are any checked items
-            any_checked = False
             for i in range(self.var_list.count()):
-                if self.var_list.item(i).checkState() == Qt.Checked:
-                    any_checked = True
-                    break
-            
-            if any_checked:
-                self.start_live_updates()
-            else:
-                self.stop_live_updates()
-                
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to update variable list: {str(e)}")
+                item = self.var_list.item(i)
+                tooltip = tooltips.get(item.data(Qt.UserRole))
+                if tooltip is not None:
+                    item.setToolTip(tooltip)
+                    item.setData(VALUE_READ_ROLE, True)
+                    self.show_compression(item)
+        finally:
+            self.var_list.blockSignals(False)
+
+    def _value_tooltip(self, value):
+        """Tooltip shown for a variable in the variable list."""
+        return f"Current Value: {value}\nType: {type(value).__name__}"
+
+    def show_directory_variables(self, result):
+        """Fills the variable list with a directory browsed by the worker."""
+        if isinstance(result, Exception):
+            QMessageBox.critical(self, "Error", f"Failed to update variable list: {str(result)}")
+            return
+
+        node_id, variables = result
+        # Ignore results for a directory that is no longer selected
+        if node_id != self.dir_combo.itemData(self.dir_combo.currentIndex()):
+            return
+
+        self.var_list.clear()
+        for full_path, child_id in variables:
+            item = QListWidgetItem()
+            item.setText(full_path)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Unchecked)
+            item.setData(Qt.UserRole, child_id)
+            item.setToolTip(f"NodeId: {child_id}")
+            self.var_list.addItem(item)
+            if full_path in self.tag_compression:
+                self.show_compression(item)
+        self.schedule_tooltips()
+
+        # Start live updates if there are any checked items
+        any_checked = False
+        for i in range(self.var_list.count()):
+            if self.var_list.item(i).checkState() == Qt.Checked:
+                any_checked = True
+                break
+
+        if any_checked:
+            self.start_live_updates()
+        else:
+            self.stop_live_updates()
 
     def start_recording(self):
         """Starts recording data from selected OPC UA variables."""
@@ -471,128 +863,196 @@ class RecordingScenario(QWidget):
             QMessageBox.warning(self, "Warning", "Please select at least one variable to record.")
             return
 
+        if not self.worker:
+            QMessageBox.warning(self, "Warning", "Please connect to an OPC UA server first.")
+            return
+
         # Reset recording state
-        self.record_count = 0
-        self.record_data_list = []
+        if self.engine is not None:
+            self.engine.stop()  # Replaced by the new recording
+        continuous = self.ring_checkbox.isChecked()
+        capacity = self.records_spin.value() if continuous else None
+        if self.stream_checkbox.isChecked():
+            # The files hold the full recording; memory only keeps the newest rows
+            capacity = min(capacity or STREAM_ROWS_KEPT, STREAM_ROWS_KEPT)
+        self.record_buffer = RecordingBuffer(capacity)
         
         # Setup data table headers
         headers = ["timestamp"] + list(self.selected_vars.keys())
-        self.data_table.setColumnCount(len(headers))
-        self.data_table.setHorizontalHeaderLabels(headers)
+        self.data_model.set_buffer(self.record_buffer, headers)
+        self.data_column_total = 0
         
         # Setup live values table
         self.setup_live_table()
 
-        # Start the timer for recording
+        stream_writer = None
+        if self.stream_checkbox.isChecked():
+            # Appends recorded rows to Records/<scenario> in the background
+            stream_writer = open_stream(
+                os.path.join("Records", self.name),
+                flush_seconds=self.flush_seconds_spin.value(),
+                flush_rows=self.flush_rows_spin.value(),
+                rotate_bytes=self.rotate_mb_spin.value() * 1024 * 1024,
+                rotate_seconds=self.rotate_minutes_spin.value() * 60)
+
         interval_ms = self.interval_spin.value()
-        self.record_timer.start(interval_ms)
+        subscription_mode = self.mode_combo.currentText() == "Subscription"
+        self.engine = RecordingEngine(
+            self.connection, self.selected_vars,
+            mode=SUBSCRIPTION if subscription_mode else POLLING, interval_ms=interval_ms,
+            sampling_interval_ms=self.sampling_spin.value(), queue_size=self.queue_spin.value(),
+            compression={label: self.compression_settings(label) for label in self.selected_vars},
+            buffer=self.record_buffer, limit=None if continuous else self.records_spin.value(),
+            stream_writer=stream_writer,
+            rows_added=self.records_added, finished=self.recording_finished)
+        self.engine.start()
+        if subscription_mode:
+            self.notification_timer.start(interval_ms)
         QMessageBox.information(self, "Recording", "Recording started.")
 
-    def record_data(self):
-        """Records selected variables' values and updates the live table."""
-        if self.record_count >= self.records_spin.value():
-            self.stop_recording()
+    def compression_settings(self, label):
+        """The compression of a variable: its own settings, or the default ones."""
+        if label in self.tag_compression:
+            return self.tag_compression[label]
+        return CompressionSettings(self.compression_combo.currentText(),
+                                   self.deviation_spin.value(), self.heartbeat_spin.value())
+
+    def show_variable_menu(self, position):
+        """Context menu of the variable list, for per-variable compression."""
+        item = self.var_list.itemAt(position)
+        if item is None:
             return
+        menu = QMenu(self)
+        set_action = menu.addAction("Set Compression...")
+        default_action = menu.addAction("Use Default Compression")
+        default_action.setEnabled(item.text() in self.tag_compression)
+        action = menu.exec_(self.var_list.mapToGlobal(position))
+        if action == set_action:
+            self.edit_compression(item)
+        elif action == default_action:
+            del self.tag_compression[item.text()]
+            self.show_compression(item)
 
-        current_time = datetime.now()
-        row = {"timestamp": current_time.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]}
-        
-        for label, node_id in self.selected_vars.items():
-            try:
-                node = self.client.get_node(node_id)
-                value = node.get_value()
-                
-                # Handle structured data for recording
-                if isinstance(value, (list, tuple)) and value and hasattr(value[0], '_fields_'):
-                    # For array of structures, create separate columns for each field
-                    for i, item in enumerate(value):
-                        self._record_structure(row, item, f"{label}[{i}]")
-                elif hasattr(value, '_fields_'):
-                    # For single structure, create separate columns for each field
-                    self._record_structure(row, value, label)
-                else:
-                    row[label] = value
-                    
-            except Exception as e:
-                row[label] = f"Error: {e}"
+    def edit_compression(self, item):
+        """Asks for the compression settings of one variable."""
+        label = item.text()
+        current = self.compression_settings(label)
+        method, ok = QInputDialog.getItem(
+            self, "Compression", f"Compression of {label}:", COMPRESSION_METHODS,
+            COMPRESSION_METHODS.index(current.method), False)
+        if not ok:
+            return
+        deviation, max_interval = current.deviation, current.max_interval
+        if method != NO_COMPRESSION:
+            if method != EXACT_CHANGE:  # Exact change has no tolerance
+                deviation, ok = QInputDialog.getDouble(
+                    self, "Compression",
+                    "Deviation (% of the EURange span):" if method == PERCENT_DEADBAND
+                    else "Deviation (engineering units):",
+                    current.deviation, 0, 1e9, 4)
+                if not ok:
+                    return
+            max_interval, ok = QInputDialog.getInt(
+                self, "Compression", "Heartbeat, store at least every (s, 0 = off):",
+                current.max_interval, 0, 86400)
+            if not ok:
+                return
+        self.tag_compression[label] = CompressionSettings(method, deviation, max_interval)
+        self.show_compression(item)
 
-        self.record_data_list.append(row)
-        self.record_count += 1
+    def show_compression(self, item):
+        """Notes a variable's own compression settings in its tooltip."""
+        tooltip = item.toolTip().split("\nCompression:")[0]
+        settings = self.tag_compression.get(item.text())
+        if settings is not None:
+            tooltip += (f"\nCompression: {settings.method}, deviation {settings.deviation:g}, "
+                        f"heartbeat {settings.max_interval} s")
+        item.setToolTip(tooltip)
+
+    def recording_mode_changed(self):
+        """Enable the subscription settings only in subscription mode."""
+        subscription_mode = self.mode_combo.currentText() == "Subscription"
+        self.sampling_spin.setEnabled(subscription_mode)
+        self.queue_spin.setEnabled(subscription_mode)
+
+    def is_recording(self):
+        """Returns True while either recording mode is active."""
+        return self.engine is not None and self.engine.is_recording()
+
+    def connection_restored(self, start_ns, end_ns):
+        """Fills the outage of a subscription recording, then subscribes on the new session."""
+        if self.engine is not None:
+            self.engine.connection_restored(start_ns, end_ns)
+
+    def drain_notifications(self):
+        """Records the data changes queued since the last drain."""
+        if self.engine is not None:
+            self.engine.drain_notifications()
+
+    def records_added(self, rows):
+        """Shows rows the engine recorded."""
         self.update_data_table()
 
-    def _record_structure(self, row, struct, prefix):
-        """Helper method to record structure fields recursively."""
-        try:
-            for field in struct._fields_:
-                field_value = getattr(struct, field)
-                if hasattr(field_value, '_fields_'):
-                    # Handle nested structures
-                    self._record_structure(row, field_value, f"{prefix}.{field}")
-                else:
-                    row[f"{prefix}.{field}"] = field_value
-        except Exception as e:
-            row[prefix] = f"Error recording structure: {str(e)}"
+    def recording_finished(self, error):
+        """Stops a recording that reached its record limit or failed."""
+        if error is not None:
+            QMessageBox.critical(self, "Error", f"Failed to create subscription: {str(error)}")
+        self.stop_recording()
+
+    def ordered_headers(self):
+        """Returns the recorded column headers, grouped by variable."""
+        return group_headers(self.record_buffer.column_names())
+
+    def format_cell(self, header, value):
+        """Formats one recorded cell for the data table."""
+        value = format_recorded(header, value)
+        # Format the value if it's not already a string
+        if not isinstance(value, str):
+            value = self.format_value(value)
+        return str(value)
 
     def update_data_table(self):
-        """Updates the data table with the recorded values."""
-        if not self.record_data_list:
+        """Shows rows added to the recording since the last update."""
+        if not len(self.record_buffer):
             return
 
-        # Get all unique column headers from all records
-        headers = set()
-        for record in self.record_data_list:
-            headers.update(record.keys())
-        
-        # Sort headers to group related fields together
-        sorted_headers = ["timestamp"]
-        remaining_headers = sorted(list(headers - {"timestamp"}))
-        
-        # Group fields by their base variable name
-        header_groups = {}
-        for header in remaining_headers:
-            base_name = header.split('[')[0].split('.')[0]
-            if base_name not in header_groups:
-                header_groups[base_name] = []
-            header_groups[base_name].append(header)
-        
-        # Add grouped headers to final list
-        for base_name in sorted(header_groups.keys()):
-            sorted_headers.extend(sorted(header_groups[base_name]))
+        # Headers are only regrouped when the recording gained columns
+        column_total = len(self.record_buffer.columns)
+        headers = self.data_model.headers
+        if column_total != self.data_column_total:
+            self.data_column_total = column_total
+            headers = self.ordered_headers()
 
-        self.data_table.setColumnCount(len(sorted_headers))
-        self.data_table.setHorizontalHeaderLabels(sorted_headers)
-        self.data_table.setRowCount(len(self.record_data_list))
-        
-        # Set alternating row colors
-        self.data_table.setAlternatingRowColors(True)
-        
-        # Populate table with data
-        for row_idx, data_row in enumerate(self.record_data_list):
-            for col_idx, header in enumerate(sorted_headers):
-                value = data_row.get(header, "")
-                # Format the value if it's not already a string
-                if not isinstance(value, str):
-                    value = self.format_value(value)
-                item = QTableWidgetItem(str(value))
-                item.setForeground(Qt.white)
-                self.data_table.setItem(row_idx, col_idx, item)
-
-        # Optimize column widths
-        self.data_table.resizeColumnsToContents()
-        # Set a maximum column width to prevent very wide columns
-        for i in range(self.data_table.columnCount()):
-            if self.data_table.columnWidth(i) > 300:
-                self.data_table.setColumnWidth(i, 300)
+        if self.data_model.sync(headers):
+            # Optimize column widths
+            self.data_table.resizeColumnsToContents()
+            # Set a maximum column width to prevent very wide columns
+            for i in range(self.data_model.columnCount()):
+                if self.data_table.columnWidth(i) > 300:
+                    self.data_table.setColumnWidth(i, 300)
 
     def stop_recording(self):
         """Stops the recording process."""
-        self.record_timer.stop()
+        self.notification_timer.stop()
+        writer = None
+        if self.engine is not None:
+            # Stores the samples compression was still holding back
+            writer = self.engine.stop()
+            self.engine = None
+            self.update_data_table()
+        streamed = writer is not None
+        if streamed and writer.error is not None:
+            QMessageBox.warning(self, "Streaming Warning",
+                                f"Recording could not be written to disk: {str(writer.error)}")
         
         # Auto-save if checkbox is checked and we have data
         print(f"Auto-save checkbox state: {self.auto_save_checkbox.isChecked()}")
-        print(f"Record data list length: {len(self.record_data_list)}")
+        print(f"Recorded rows in memory: {len(self.record_buffer)} "
+              f"({self.record_buffer.nbytes() / 1e6:.1f} MB)")
         
-        if self.auto_save_checkbox.isChecked() and self.record_data_list:
+        if streamed:
+            print("Recording was streamed to disk, skipping auto-save")
+        elif self.auto_save_checkbox.isChecked() and len(self.record_buffer):
             print("Attempting auto-save...")
             self.auto_save_recording()
         else:
@@ -602,21 +1062,45 @@ class RecordingScenario(QWidget):
 
     def save_csv(self):
         """Saves the recorded data as a CSV file."""
-        if not self.record_data_list:
+        if not len(self.record_buffer):
             QMessageBox.warning(self, "Warning", "No recorded data to save.")
             return
 
-        file_path, _ = QFileDialog.getSaveFileName(self, "Save CSV", "", "CSV Files (*.csv)")
+        file_path, selected_filter = QFileDialog.getSaveFileName(
+            self, "Save Recording", "",
+            f"CSV Files (*.csv);;Binary Recordings (*{FILE_EXTENSION})")
         if file_path:
             try:
-                with open(file_path, "w", newline="") as csvfile:
-                    writer = csv.DictWriter(csvfile, fieldnames=self.record_data_list[0].keys())
-                    writer.writeheader()
-                    writer.writerows(self.record_data_list)
+                if file_path.endswith(FILE_EXTENSION) or selected_filter.startswith("Binary"):
+                    if not file_path.endswith(FILE_EXTENSION):
+                        file_path += FILE_EXTENSION
+                    self.write_binary(file_path)
+                else:
+                    self.write_csv(file_path)
                 QMessageBox.information(self, "Saved", f"Data saved to {file_path}")
             except Exception as e:
                 QMessageBox.critical(self, "Error", str(e))
 
+    def write_csv(self, file_path):
+        """Writes the recording as CSV, formatting timestamps and status codes as text."""
+        headers = self.ordered_headers()
+        with open(file_path, "w", newline="") as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=headers)
+            writer.writeheader()
+            for row in self.record_buffer.rows():
+                writer.writerow({header: format_recorded(header, value)
+                                 for header, value in row.items()})
+
+    def write_binary(self, file_path):
+        """Writes the recording in the binary columnar format, with the tags in its header."""
+        write_recording(file_path, self.record_buffer, self.ordered_headers(), metadata={
+            "scenario": self.name,
+            "tags": dict(self.selected_vars),
+            "mode": self.mode_combo.currentText(),
+            "interval_ms": self.interval_spin.value(),
+            "dropped_rows": self.record_buffer.total - len(self.record_buffer),
+        })
+
     def auto_save_recording(self):
         """Automatically saves the recording to the Records directory."""
         try:
@@ -628,14 +1112,15 @@ class RecordingScenario(QWidget):
                 print(f"Created directory: {records_dir}")
             
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"record_{timestamp}.csv"
+            binary = self.save_format_combo.currentData() == "binary"
+            filename = f"record_{timestamp}{FILE_EXTENSION if binary else '.csv'}"
             file_path = os.path.join(records_dir, filename)
             print(f"Saving to file: {file_path}")
             
-            with open(file_path, "w", newline="") as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=self.record_data_list[0].keys())
-                writer.writeheader()
-                writer.writerows(self.record_data_list)
+            if binary:
+                self.write_binary(file_path)
+            else:
+                self.write_csv(file_path)
             print(f"Successfully auto-saved recording to: {file_path}")
             
         except Exception as e:
@@ -665,12 +1150,7 @@ class RecordingScenario(QWidget):
 
     def setup_live_table(self):
         """Set up the live values table with current selected variables."""
-        self.live_table.setRowCount(len(self.selected_vars))
-        self.live_table.setColumnCount(7)  # Added one column for update checkbox
-        self.live_table.setHorizontalHeaderLabels([
-            "Real-time", "Variable", "Current Value", "Data Type", "Node ID", 
-            "Access Level", "Description"
-        ])
+        self.live_model.set_variables(self.selected_vars.items())
         
         # Store checkboxes in a dictionary
         self.live_update_checkboxes = {}
@@ -703,6 +1183,7 @@ class RecordingScenario(QWidget):
                     border-color: #b3b1b5;
                 }
             """)
+            checkbox.toggled.connect(self.update_live_targets)
             self.live_update_checkboxes[var_name] = checkbox
             
             # Create checkbox cell widget with transparent background
@@ -740,18 +1221,11 @@ class RecordingScenario(QWidget):
             checkbox_layout.setContentsMargins(0, 0, 0, 0)
             checkbox_widget.setLayout(checkbox_layout)
             
-            self.live_table.setCellWidget(i, 0, checkbox_widget)
-            
-            # Create table items with proper styling
-            for col, text in enumerate([var_name, "Waiting...", "", node_id, "", ""], start=1):
-                item = QTableWidgetItem(text)
-                item.setForeground(Qt.white)  # Set text color to white
-                item.setBackground(Qt.transparent)  # Set transparent background
-                self.live_table.setItem(i, col, item)
+            self.live_table.setIndexWidget(self.live_model.index(i, 0), checkbox_widget)
         
         # Set all columns to be interactively resizable
         header = self.live_table.horizontalHeader()
-        for i in range(self.live_table.columnCount()):
+        for i in range(self.live_model.columnCount()):
             header.setSectionResizeMode(i, QHeaderView.Interactive)
         
         # Set initial column widths
@@ -763,175 +1237,244 @@ class RecordingScenario(QWidget):
         self.live_table.setColumnWidth(5, 100)  # Access Level
         self.live_table.setColumnWidth(6, 200)  # Description
 
+        self.update_live_targets()
+
+    def update_live_targets(self):
+        """Snapshots the rows the worker should refresh in the live table."""
+        targets = []
+        for i, (var_name, node_id) in enumerate(self.selected_vars.items()):
+            # Skip update if checkbox is unchecked
+            checkbox = self.live_update_checkboxes.get(var_name)
+            if checkbox and checkbox.isChecked():
+                targets.append((i, var_name, node_id))
+        self.live_targets = tuple(targets)
+        if self.live_updating:
+            self.start_live_updates()  # Subscribes again for the new targets
+
     def start_live_updates(self):
         """Start live updates for selected variables."""
-        if self.client:
-            self.live_update_timer.start()
-            print("Started live updates")
+        if self.sampling_hub:
+            read = self.read_live_values_async if self.worker.is_async else self.read_live_values
+            cache = self.node_metadata
+            targets = self.live_targets
+            self.sampling_hub.subscribe(
+                (self, "live"), [node_id for _, _, node_id in targets], self.live_interval_ms,
+                lambda client, tick, read_time, samples: read(client, targets, samples, cache),
+                self.update_live_values)
+            if not self.live_updating:
+                print("Started live updates")
+            self.live_updating = True
 
     def stop_live_updates(self):
         """Stop live updates."""
-        self.live_update_timer.stop()
+        if self.sampling_hub:
+            self.sampling_hub.unsubscribe((self, "live"))
+        self.live_updating = False
         print("Stopped live updates")
 
-    def update_live_values(self):
-        """Update the live values table with current values."""
-        if not self.client:
+    def read_live_values(self, client, targets, samples, cache):
+        """Formats the live table rows from the hub's samples; runs on the acquisition worker."""
+        node_ids = [node_id for _, _, node_id in targets]
+        # Static attributes are only read for variables not cached yet
+        cache.fill(client, node_ids)
+        values = [samples[node_id][0] for node_id in node_ids]
+        return self._live_rows(targets, values, cache)
+
+    async def read_live_values_async(self, client, targets, samples, cache):
+        """asyncua counterpart of read_live_values."""
+        node_ids = [node_id for _, _, node_id in targets]
+        await fill_node_metadata_async(cache, client, node_ids)
+        values = [samples[node_id][0] for node_id in node_ids]
+        return self._live_rows(targets, values, cache)
+
+    def _live_rows(self, targets, values, cache):
+        """Formats the live table rows whose value or metadata changed since they were last sent."""
+        # A new set of targets means a freshly set up table: send every row again
+        if targets is not self.live_shown_targets:
+            self.live_shown_targets = targets
+            self.live_shown = {}
+        rows = []
+        for (i, var_name, node_id), value in zip(targets, values):
+            metadata = cache.get(node_id)
+            key = (type(value), self._live_key(value), metadata)
+            shown = self.live_shown.get(node_id)
+            if shown is not None and shown[0] == key:
+                continue  # Unchanged: skip formatting it again
+            row = self._live_row(i, var_name, value, metadata)
+            self.live_shown[node_id] = (key, row)
+            rows.append(row)
+        return rows
+
+    def _live_key(self, value):
+        """What a live value is compared by; structures by their field values."""
+        if isinstance(value, Exception):
+            return str(value)
+        if is_structure(value):
+            return structure_flattener(value).values(value)
+        if isinstance(value, (list, tuple)) and value and is_structure(value[0]):
+            flattener = structure_flattener(value[0])
+            return tuple(flattener.values(item) for item in value)
+        return value
+
+    def _live_row(self, i, var_name, value, metadata):
+        """Formats the text of one live table row."""
+        if isinstance(value, Exception):
+            return (i, var_name, f"Error: {str(value)}", "Error", "Unknown", "Error")
+        access_level = metadata.access_level if metadata else None
+
+        # Get access level
+        if access_level is None:
+            access_text = "Unknown"
+        else:
+            access_str = []
+            if access_level & ua.AccessLevel.CurrentRead:
+                access_str.append("Read")
+            if access_level & ua.AccessLevel.CurrentWrite:
+                access_str.append("Write")
+            access_text = " & ".join(access_str)
+
+        # Get description
+        desc_text = (metadata.description if metadata else None) or "No description"
+
+        # Format the value and detailed type information for display
+        value_text = self.format_value(value)
+        if metadata and metadata.engineering_units and type(value) in (int, float):
+            value_text = f"{value_text} {metadata.engineering_units}"
+        type_text = self.get_type_info(value, metadata.data_type if metadata else None)
+        return (i, var_name, value_text, type_text, access_text, desc_text)
+
+    def update_live_values(self, rows):
+        """Update the live values table with rows read by the worker."""
+        if isinstance(rows, Exception):
+            print(f"Error reading live values: {str(rows)}")
             return
-            
-        for i, (var_name, node_id) in enumerate(self.selected_vars.items()):
-            # Skip update if checkbox is unchecked
-            checkbox = self.live_update_checkboxes.get(var_name)
-            if not checkbox or not checkbox.isChecked():
-                continue
-                
-            try:
-                node = self.client.get_node(node_id)
-                value = node.get_value()
-                
-                # Format the value for display
-                formatted_value = self.format_value(value)
-                value_item = QTableWidgetItem(formatted_value)
-                value_item.setForeground(Qt.white)
-                self.live_table.setItem(i, 2, value_item)
-                
-                # Show detailed type information
-                type_info = self.get_type_info(value)
-                type_item = QTableWidgetItem(type_info)
-                type_item.setForeground(Qt.white)
-                self.live_table.setItem(i, 3, type_item)
-                
-                # Get access level
-                try:
-                    access_level = node.get_attribute(ua.AttributeIds.AccessLevel).Value.Value
-                    access_str = []
-                    if access_level & ua.AccessLevel.CurrentRead:
-                        access_str.append("Read")
-                    if access_level & ua.AccessLevel.CurrentWrite:
-                        access_str.append("Write")
-                    access_item = QTableWidgetItem(" & ".join(access_str))
-                    access_item.setForeground(Qt.white)
-                    self.live_table.setItem(i, 5, access_item)
-                except Exception:
-                    access_item = QTableWidgetItem("Unknown")
-                    access_item.setForeground(Qt.white)
-                    self.live_table.setItem(i, 5, access_item)
-                
-                # Get description
-                try:
-                    desc = node.get_description().Text
-                    desc_item = QTableWidgetItem(desc if desc else "No description")
-                    desc_item.setForeground(Qt.white)
-                    self.live_table.setItem(i, 6, desc_item)
-                except Exception:
-                    desc_item = QTableWidgetItem("No description")
-                    desc_item.setForeground(Qt.white)
-                    self.live_table.setItem(i, 6, desc_item)
-                    
-            except Exception as e:
-                if checkbox.isChecked():  # Only update error message if checkbox is checked
-                    error_item = QTableWidgetItem(f"Error: {str(e)}")
-                    error_item.setForeground(Qt.white)
-                    self.live_table.setItem(i, 2, error_item)
-                    
-                    type_item = QTableWidgetItem("Error")
-                    type_item.setForeground(Qt.white)
-                    self.live_table.setItem(i, 3, type_item)
-                    
-                    access_item = QTableWidgetItem("Unknown")
-                    access_item.setForeground(Qt.white)
-                    self.live_table.setItem(i, 5, access_item)
-                    
-                    desc_item = QTableWidgetItem("Error")
-                    desc_item.setForeground(Qt.white)
-                    self.live_table.setItem(i, 6, desc_item)
+
+        for i, var_name, value_text, type_text, access_text, desc_text in rows:
+            # Rows whose variable moved since the worker read them are skipped
+            self.live_model.update_row(
+                i, var_name, ((2, value_text), (3, type_text), (5, access_text), (6, desc_text)))
+
+        # Repaint at most once per display frame, however often rows arrive
+        if self.live_model.dirty is not None and not self.live_flush_timer.isActive():
+            since_flush = (time.monotonic() - self.live_flushed_at) * 1000
+            self.live_flush_timer.start(max(0, int(self.live_frame_ms - since_flush)))
+
+    def flush_live_table(self):
+        """Repaints the live table cells changed since the last frame."""
+        self.live_flushed_at = time.monotonic()
+        self.live_model.flush()
 
     def format_value(self, value):
         """Format a value for display, handling arrays and structures."""
         try:
             if isinstance(value, (list, tuple)):
                 # Handle array of structures or simple array
-                if value and hasattr(value[0], '_fields_'):  # Check if it's a structure
-                    formatted_items = []
-                    for idx, item in enumerate(value):
-                        struct_items = []
-                        for field in item._fields_:
-                            field_value = getattr(item, field)
-                            # Format nested structures recursively
-                            if hasattr(field_value, '_fields_'):
-                                nested_value = self.format_value(field_value)
-                                struct_items.append(f"{field}: {nested_value}")
-                            else:
-                                struct_items.append(f"{field}: {field_value}")
-                        formatted_items.append(f"[{idx}] {{{', '.join(struct_items)}}}")
+                if value and is_structure(value[0]):  # Check if it's a structure
+                    flattener = structure_flattener(value[0])
+                    formatted_items = [f"[{idx}] {flattener.format(item, self.format_value)}"
+                                       for idx, item in enumerate(value)]
                     return f"Array[{len(value)}]:\n" + '\n'.join(formatted_items)
                 else:
                     # Format simple array with index numbers
                     formatted_items = [f"[{i}] {self.format_value(item)}" for i, item in enumerate(value)]
                     return f"Array[{len(value)}]:\n" + '\n'.join(formatted_items)
-            elif hasattr(value, '_fields_'):  # Single structure
-                struct_items = []
-                for field in value._fields_:
-                    field_value = getattr(value, field)
-                    # Format nested structures recursively
-                    if hasattr(field_value, '_fields_'):
-                        nested_value = self.format_value(field_value)
-                        struct_items.append(f"{field}: {nested_value}")
-                    else:
-                        struct_items.append(f"{field}: {field_value}")
-                return f"{{{', '.join(struct_items)}}}"
+            elif is_structure(value):  # Single structure
+                return structure_flattener(value).format(value, self.format_value)
             else:
                 return str(value)
         except Exception as e:
             return f"Error formatting value: {str(e)}"
 
-    def get_type_info(self, value):
-        """Get detailed type information for a value."""
+    def get_type_info(self, value, data_type=None):
+        """Get detailed type information for a value, named after the node's DataType if known."""
         try:
+            type_name = data_type_name(data_type)
             if isinstance(value, (list, tuple)):
-                if value and hasattr(value[0], '_fields_'):
-                    struct_name = value[0].__class__.__name__
-                    field_types = []
-                    for field in value[0]._fields_:
-                        field_value = getattr(value[0], field)
-                        if hasattr(field_value, '_fields_'):
-                            field_type = f"{field}: {field_value.__class__.__name__}"
-                        else:
-                            field_type = f"{field}: {type(field_value).__name__}"
-                        field_types.append(field_type)
-                    return f"Array[{len(value)}] of {struct_name}{{{', '.join(field_types)}}}"
+                if value and is_structure(value[0]):
+                    return f"Array[{len(value)}] of {structure_flattener(value[0]).type_info}"
                 else:
-                    base_type = type(value[0]).__name__ if value else "Empty"
+                    base_type = type_name or (type(value[0]).__name__ if value else "Empty")
                     return f"Array[{len(value)}] of {base_type}"
-            elif hasattr(value, '_fields_'):
-                struct_name = value.__class__.__name__
-                field_types = []
-                for field in value._fields_:
-                    field_value = getattr(value, field)
-                    if hasattr(field_value, '_fields_'):
-                        field_type = f"{field}: {field_value.__class__.__name__}"
-                    else:
-                        field_type = f"{field}: {type(field_value).__name__}"
-                    field_types.append(field_type)
-                return f"{struct_name}{{{', '.join(field_types)}}}"
+            elif is_structure(value):
+                return structure_flattener(value).type_info
             else:
-                return type(value).__name__
+                return type_name or type(value).__name__
         except Exception as e:
             return f"Error getting type info: {str(e)}"
 
+    def bind_connection(self, connection):
+        """Makes the scenario read from another endpoint's pooled session."""
+        if connection is self.connection:
+            return
+        if self.live_updating:
+            self.stop_live_updates()  # Unsubscribes from the old session's hub
+        self.connection = connection
+        self.client = connection.client
+        self.worker = connection.worker
+        self.node_metadata = connection.node_metadata
+        self.sampling_hub = connection.sampling_hub
+        self.browse_entries = connection.browse_entries
+        self.endpoint_label.setText(f"Endpoint: {connection.url}")
+        self.update_directory_list(connection.directories)
+
     def update_directory_list(self, directories):
         """Update the directory combo box with new directories."""
         self.dir_combo.clear()
         for path, node_id in directories.items():
             self.dir_combo.addItem(path, node_id)
 
+    def select_directory(self, path):
+        """Shows the variables of a directory, as if picked in the combo box."""
+        index = self.dir_combo.findText(path)
+        if index >= 0:
+            self.dir_combo.setCurrentIndex(index)
+
+    def add_variable(self, full_path, node_id):
+        """Adds a variable from another directory (such as a search result), checked."""
+        items = self.var_list.findItems(full_path, Qt.MatchExactly)
+        if items:
+            item = items[0]
+        else:
+            item = QListWidgetItem()
+            item.setText(full_path)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Unchecked)
+            item.setData(Qt.UserRole, node_id)
+            item.setToolTip(f"NodeId: {node_id}")
+            self.var_list.addItem(item)
+            if full_path in self.tag_compression:
+                self.show_compression(item)
+        self.var_list.scrollToItem(item)
+        # Checking it selects it for recording, like a click on its box
+        item.setCheckState(Qt.Checked)
+
+    def add_directories(self, directories):
+        """Adds newly found directories to the combo box, keeping the current selection."""
+        for path, node_id in directories.items():
+            if self.dir_combo.findText(path) < 0:
+                self.dir_combo.addItem(path, node_id)
+
 class OPCUARecorder(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("OPC UA Variable Recorder")
-        self.client = None  # Client for browsing and recording
+        self.worker_bridge = WorkerBridge(self)
+        self.worker_bridge.results_ready.connect(self.deliver_worker_results)
+        # Pooled sessions of every endpoint in use; scenarios each bind to one
+        self.connections = ConnectionManager(self.create_worker, self.connection_status_changed)
+        self.connection = None  # Connection whose address space the tree shows
+        self.idle_timer = QTimer(self)
+        self.idle_timer.timeout.connect(self.connections.close_idle)
+        self.idle_timer.start(10000)
         self.browsed_variables = {}
         self.browsed_directories = {}
+        self.browse_scope = BrowseScope()  # Scope of the next connection's browse
+        self.browsed_scope = self.browse_scope  # Scope of the tree shown
+        self.browsed_tree = None  # Browse entries shown in the tree
+        self.unbrowsed_items = {}  # id(item) -> (item, entry, path) of tree items not browsed yet
+        self.browsing_items = {}  # id(item) -> (item, entry, path, placeholder) being browsed
+        self.tag_index = None  # TagIndex of the browsed directories and variables
+        self.browse_entries = {}  # Browsed tree entries by NodeId, shared with the scenarios
         self.init_ui()
 
     def init_ui(self):
@@ -1012,7 +1555,7 @@ class OPCUARecorder(QMainWindow):
             QTabBar::tab:hover {
                 background: #404040;
             }
-            QListWidget, QTableWidget, QTreeWidget {
+            QListWidget, QTableView, QTreeWidget {
                 background: #333333;
                 border: 1px solid #4a4a4a;
                 border-radius: 4px;
@@ -1033,10 +1576,10 @@ class OPCUARecorder(QMainWindow):
                 border-bottom: 1px solid #4a4a4a;
                 padding: 4px;
             }
-            QTableWidget {
+            QTableView {
                 gridline-color: #4a4a4a;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 4px;
             }
             QComboBox {
@@ -1225,6 +1768,27 @@ class OPCUARecorder(QMainWindow):
         """)
         connection_layout.addWidget(self.url_combo)
 
+        # Client backend used for this connection
+        backend_label = QLabel("Client Backend:")
+        backend_label.setStyleSheet("font-weight: bold;")
+        connection_layout.addWidget(backend_label)
+        self.backend_combo = QComboBox()
+        self.backend_combo.addItem("opcua (synchronous)", "sync")
+        self.backend_combo.addItem("asyncua (asyncio)", "async")
+        connection_layout.addWidget(self.backend_combo)
+
+        self.lazy_browse_checkbox = QCheckBox("Lazy browse")
+        self.lazy_browse_checkbox.setToolTip(
+            "Only browse the top levels when connecting; nodes below are browsed "
+            "when they are expanded in the tree")
+        self.lazy_browse_checkbox.setStyleSheet("QCheckBox { color: #f0f0f0; }")
+        connection_layout.addWidget(self.lazy_browse_checkbox)
+
+        self.scope_button = QPushButton("Browse Scope...")
+        self.scope_button.setToolTip("Which part of the address space is browsed on connect")
+        self.scope_button.clicked.connect(self.edit_browse_scope)
+        connection_layout.addWidget(self.scope_button)
+
         # Connect button
         self.connect_button = QPushButton("Connect and Browse")
         self.connect_button.clicked.connect(self.connect_and_browse)
@@ -1238,6 +1802,31 @@ class OPCUARecorder(QMainWindow):
         tree_label = QLabel("OPC UA Address Space")
         tree_label.setStyleSheet("font-weight: bold; font-size: 12pt;")
         tree_layout.addWidget(tree_label)
+
+        # Tag search; activating a result adds it to the current scenario
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("Search tags by name, path or NodeId...")
+        self.search_edit.setClearButtonEnabled(True)
+        self.search_edit.setStyleSheet("""
+            QLineEdit {
+                background-color: #2d2d2d;
+                color: #f0f0f0;
+                border: 1px solid #3d3d3d;
+                border-radius: 4px;
+                padding: 4px;
+            }
+            QLineEdit:focus {
+                border: 1px solid #5a5a5a;
+            }
+        """)
+        self.search_edit.textChanged.connect(self.search_tags)
+        tree_layout.addWidget(self.search_edit)
+        self.search_results = QListWidget()
+        self.search_results.setMaximumHeight(220)
+        self.search_results.setToolTip("Double-click or press Enter to add to the current scenario")
+        self.search_results.itemActivated.connect(self.search_result_activated)
+        self.search_results.hide()
+        tree_layout.addWidget(self.search_results)
         
         self.tree_widget = QTreeWidget()
         self.tree_widget.setHeaderLabel("")
@@ -1245,6 +1834,7 @@ class OPCUARecorder(QMainWindow):
         self.tree_widget.setHorizontalScrollBarPolicy(Qt.ScrollBarAsNeeded)
         self.tree_widget.header().setStretchLastSection(False)
         self.tree_widget.header().setSectionResizeMode(0, QHeaderView.ResizeToContents)
+        self.tree_widget.itemExpanded.connect(self.tree_item_expanded)
         self.tree_widget.setStyleSheet("""
             QTreeWidget {
                 background-color: #2d2d2d;
@@ -1331,23 +1921,28 @@ class OPCUARecorder(QMainWindow):
     def add_new_scenario(self, name):
         """Add a new recording scenario tab."""
         # Create new scenario
-        scenario = RecordingScenario(self, name, self.client)
+        scenario = RecordingScenario(self, name)
         
         # Insert the new tab before the '+' tab
         index = self.tab_widget.count() - 1
         self.tab_widget.insertTab(index, scenario, name)
         self.tab_widget.setCurrentIndex(index)
         
-        # If we have browsed variables and directories, update the new scenario
-        if self.browsed_variables:
-            scenario.update_directory_list(self.browsed_directories)
+        # New scenarios record from the endpoint being browsed
+        if self.connection:
+            self.bind_scenario(scenario, self.connection)
+
+    def bind_scenario(self, scenario, connection):
+        """Binds a scenario to a live connection, as one of its users in the pool."""
+        self.connections.acquire(connection.url, scenario, scenario.bind_connection,
+                                 connection.backend)
 
     def close_scenario_tab(self, index):
         """Close a scenario tab."""
         if index != self.tab_widget.count() - 1:  # Don't close the '+' tab
             # Get the widget and check if it's recording
             widget = self.tab_widget.widget(index)
-            if isinstance(widget, RecordingScenario) and widget.record_timer.isActive():
+            if isinstance(widget, RecordingScenario) and widget.is_recording():
                 reply = QMessageBox.question(self, "Close Scenario", 
                     "This scenario is currently recording. Are you sure you want to close it?",
                     QMessageBox.Yes | QMessageBox.No)
@@ -1356,148 +1951,308 @@ class OPCUARecorder(QMainWindow):
                 widget.stop_recording()
             
             self.tab_widget.removeTab(index)
+            if isinstance(widget, RecordingScenario):
+                widget.stop_live_updates()
+                self.connections.release(widget)
+
+    def create_worker(self, server_url, backend):
+        """Makes the acquisition worker of a new session with the chosen backend."""
+        notify = self.worker_bridge.results_ready.emit
+        if backend == "async":
+            return AsyncAcquisitionWorker(server_url, notify=notify)
+        return AcquisitionWorker(Client(server_url), notify=notify)
 
     def connect_and_browse(self):
-        """Connects to the OPC UA server and browses the address space."""
-        # Disconnect existing client if any
+        """Connects to the OPC UA server and browses the address space on the worker."""
+        # Release the endpoint browsed so far; scenarios recording from it keep it open
         self.disconnect_client()
         
         # Clear existing items
         self.tree_widget.clear()
         self.browsed_variables = {}
         self.browsed_directories = {}
+        self.browsed_tree = None
+        self.browsed_scope = self.browse_scope
+        self.unbrowsed_items = {}
+        self.browsing_items = {}
+        self.tag_index = None
+        # A new dictionary: scenarios on the previous endpoint keep theirs
+        self.browse_entries = {}
+        self.search_tags()
         
         server_url = self.url_combo.currentText().strip()
-        try:
-            print(f"Attempting to connect to: {server_url}")
-            self.client = Client(server_url)
-            
-            # Simple connection without any special configuration
-            self.client.connect()
-            print("Successfully connected to server")
-            self.update_connection_status(True)
-            
-            # Get root node and start browsing from there
-            root = self.client.get_root_node()
-            print(f"Got root node: {root}")
-            
-            # Create root item
-            root_item = QTreeWidgetItem(["Root"])
-            root_item.setData(0, 1, root.nodeid.to_string())
-            self.tree_widget.addTopLevelItem(root_item)
-            
-            # Browse from root node
-            self.browse_nodes(root, root_item)
-            
-            # Update all existing scenarios with the new client and directories
-            for i in range(self.tab_widget.count() - 1):  # Exclude '+' tab
-                scenario = self.tab_widget.widget(i)
-                if isinstance(scenario, RecordingScenario):
-                    scenario.client = self.client
-                    scenario.update_directory_list(self.browsed_directories)
-            
+        print(f"Attempting to connect to: {server_url}")
+        self.connect_button.setEnabled(False)
+        # Opens a session to the endpoint, or reuses the pooled one with the same backend
+        self.connections.acquire(server_url, self, self.client_connected,
+                                 self.backend_combo.currentData())
+
+    def client_connected(self, result):
+        """Starts browsing once the session of the endpoint is connected."""
+        if isinstance(result, Exception):
+            self.connection_failed(result)
+            return
+
+        print("Successfully connected to server")
+        connection = self.connection = result
+        self.browse_entries = connection.browse_entries
+        connection.address_space_cache = AddressSpaceCache(connection.url, self.browsed_scope)
+        self.update_connection_status(connection.alive)
+
+        # The current scenario and those without an endpoint record from this one
+        for i in range(self.tab_widget.count() - 1):  # Exclude '+' tab
+            scenario = self.tab_widget.widget(i)
+            if (isinstance(scenario, RecordingScenario) and not scenario.is_recording()
+                    and (scenario.connection is None or i == self.tab_widget.currentIndex())):
+                self.bind_scenario(scenario, connection)
+
+        # The server's version tells whether the cached address space still applies
+        read_version = read_server_version_async if connection.worker.is_async else read_server_version
+        connection.worker.submit(read_version,
+                                 lambda version: self.server_version_read(connection, version))
+
+    def server_version_read(self, connection, result):
+        """Shows the cached address space of a known server, then browses it."""
+        if connection is not self.connection:
+            return  # Another endpoint was connected meanwhile
+        if isinstance(result, Exception):
+            print(f"Error reading server version: {str(result)}")
+            result = None
+        cached = connection.address_space_cache.load(result)
+        if cached is not None:
+            print(f"Showing cached address space of {connection.url}, "
+                  f"revalidating in the background")
+            self.show_address_space(cached)
             QMessageBox.information(self, "Success", "Connected to OPC UA server successfully!")
-            
-        except Exception as e:
-            error_msg = f"Connection Error: {str(e)}\nType: {type(e)}"
-            print(error_msg)
-            QMessageBox.critical(self, "Connection Error", error_msg)
-            self.update_connection_status(False)
-            self.disconnect_client()
-
-    def browse_nodes(self, node, parent_item):
-        """Recursively browse nodes and add them to the tree."""
-        try:
-            display_name = node.get_display_name().Text
-            node_id = node.nodeid.to_string()
-            print(f"\nBrowsing node: {display_name} (ID: {node_id})")
-            
-            # Define the path we want to follow
-            target_path = ['Root', 'Objects', 'PLC']
-            current_level = parent_item.text(0)  # Get the current node name
-            
-            try:
-                children = node.get_children()
-                print(f"Found {len(children)} children for node {display_name}")
-            except Exception as ce:
-                print(f"Error getting children for node {display_name}: {str(ce)}")
+
+        browse = browse_address_space_async if connection.worker.is_async else browse_address_space
+        scope = self.browsed_scope
+        max_depth = LAZY_BROWSE_DEPTH if self.lazy_browse_checkbox.isChecked() else None
+        connection.worker.submit(lambda client: browse(client, scope, max_depth),
+                                 lambda result: self.address_space_browsed(connection, result))
+
+    def address_space_browsed(self, connection, result):
+        """Fills the tree and the scenarios with the browsed address space."""
+        if connection is not self.connection:
+            return
+        if isinstance(result, Exception):
+            self.connection_failed(result)
+            return
+
+        tree = result[0]
+        cached = self.browsed_tree
+        if cached is not None:
+            # The cached tree is already shown; only replace it if the server changed
+            graft_cached_levels(tree, cached)
+            if tree_structure(tree) == tree_structure(cached):
+                print("Cached address space is up to date")
+                connection.address_space_cache.save(tree)
                 return
-                
-            for child in children:
-                try:
-                    # Get node name and class
-                    browse_name = child.get_display_name().Text
-                    child_id = child.nodeid.to_string()
-                    
-                    # If we haven't reached PLC yet, only follow the target path
-                    if current_level in target_path and current_level != 'PLC':
-                        current_index = target_path.index(current_level)
-                        if current_index + 1 < len(target_path):
-                            # If we're not at PLC level, only process next item in path
-                            if browse_name != target_path[current_index + 1]:
-                                continue
-                    
-                    # Get node class
-                    node_class = None
-                    try:
-                        node_class = child.get_node_class()
-                    except Exception:
-                        print(f"Could not get node class for {browse_name}")
-                    
-                    print(f"Processing child: {browse_name} (Class: {node_class}, ID: {child_id})")
-                    
-                    # Create tree item
-                    child_item = QTreeWidgetItem([browse_name])
-                    child_item.setData(0, 1, child_id)
-                    parent_item.addChild(child_item)
-                    
-                    # Build the full path for this node
-                    path_parts = []
-                    temp_item = child_item
-                    while temp_item is not None:
-                        path_parts.insert(0, temp_item.text(0))
-                        temp_item = temp_item.parent()
-                    full_path = '/'.join(path_parts)
-                    
-                    # If we're at or below PLC level, show all variables and directories
-                    if current_level == 'PLC' or browse_name == 'PLC' or not current_level in target_path:
-                        # Try to read value if it might be a variable
-                        try:
-                            if node_class == ua.NodeClass.Variable:
-                                value = child.get_value()
-                                value_type = type(value).__name__
-                                print(f"Variable {browse_name} value: {value} (Type: {value_type})")
-                                
-                                # Add value info to tree
-                                value_str = f"Value: {value}, Type: {value_type}"
-                                value_item = QTreeWidgetItem([value_str])
-                                child_item.addChild(value_item)
-                                
-                                # Add to variables dict
-                                self.browsed_variables[browse_name] = child_id
-                        except Exception as ve:
-                            print(f"Error reading value for {browse_name}: {ve}")
-                        
-                        # Add to directories if it has children
-                        try:
-                            if len(child.get_children()) > 0:
-                                self.browsed_directories[full_path] = child_id
-                        except Exception:
-                            pass
-                        
-                        # Continue browsing all nodes under PLC
-                        self.browse_nodes(child, child_item)
-                    else:
-                        # If we're still in the path to PLC, continue browsing
-                        if current_level in target_path:
-                            self.browse_nodes(child, child_item)
-                        
-                except Exception as ce:
-                    print(f"Error processing child node {getattr(child, 'nodeid', 'unknown')}: {str(ce)}")
-                    continue
-                
-        except Exception as e:
-            print(f"Error browsing node {getattr(node, 'nodeid', 'unknown')}: {str(e)}")
+            print("Address space changed since it was cached, updating the tree")
+        self.show_address_space(tree)
+        connection.address_space_cache.save(tree)
+        if cached is None:
+            QMessageBox.information(self, "Success", "Connected to OPC UA server successfully!")
+
+    def show_address_space(self, tree):
+        """Fills the tree and the scenarios with a browse tree, fresh or cached."""
+        self.tree_widget.clear()
+        self.unbrowsed_items = {}
+        self.browsing_items = {}
+        self.browsed_tree = tree
+        self.index_address_space()
+        root_item = QTreeWidgetItem([tree["name"]])
+        root_item.setData(0, 1, tree["node_id"])
+        self.tree_widget.addTopLevelItem(root_item)
+        self.add_tree_items(root_item, tree["children"], tree["name"])
+
+        # Update the scenarios recording from this endpoint with its directories
+        for i in range(self.tab_widget.count() - 1):  # Exclude '+' tab
+            scenario = self.tab_widget.widget(i)
+            if isinstance(scenario, RecordingScenario) and scenario.connection is self.connection:
+                scenario.update_directory_list(self.browsed_directories)
+
+        self.connect_button.setEnabled(True)
+
+    def connection_failed(self, error):
+        """Reports a failed connection and releases the client."""
+        error_msg = f"Connection Error: {str(error)}\nType: {type(error)}"
+        print(error_msg)
+        self.connect_button.setEnabled(True)
+        QMessageBox.critical(self, "Connection Error", error_msg)
+        self.update_connection_status(False)
+        self.disconnect_client()
+
+    def add_tree_items(self, parent_item, entries, parent_path):
+        """Recursively add browsed nodes to the tree."""
+        for entry in entries:
+            path = f"{parent_path}/{entry['name']}"
+            child_item = QTreeWidgetItem([entry["name"]])
+            child_item.setData(0, 1, entry["node_id"])
+            parent_item.addChild(child_item)
+            if may_have_children(entry):
+                # Browsed when expanded (lazy browsing)
+                child_item.setChildIndicatorPolicy(QTreeWidgetItem.ShowIndicator)
+                self.unbrowsed_items[id(child_item)] = (child_item, entry, path)
+            if entry["value_text"] is not None:
+                # Add value info to tree
+                child_item.addChild(QTreeWidgetItem([entry["value_text"]]))
+            self.add_tree_items(child_item, entry["children"], path)
+
+    def index_address_space(self):
+        """Lists the directories and variables of the browsed tree and indexes them for search."""
+        self.browsed_directories, variables = index_tree(
+            self.browsed_tree, self.browsed_scope, full_paths=True)
+        self.browsed_variables = {path.rsplit("/", 1)[-1]: node_id
+                                  for path, node_id in variables.items()}
+        # Listed by scenarios bound to the endpoint later on
+        self.connection.directories = self.browsed_directories
+        # Updated in place, as the scenarios hold the same dictionary
+        self.browse_entries.clear()
+        self.browse_entries.update(entries_by_node_id(self.browsed_tree))
+        started = time.perf_counter()
+        self.tag_index = TagIndex(self.browsed_directories, variables)
+        print(f"Indexed {len(self.tag_index)} tags for search in "
+              f"{(time.perf_counter() - started) * 1000:.0f} ms")
+        # Substring search gets fast once the trigrams are built
+        threading.Thread(target=self.tag_index.build_trigrams, name="tag-index",
+                         daemon=True).start()
+        self.search_tags()
+
+    def index_browsed_entry(self, entry, path):
+        """Lists and indexes what was found below a lazily browsed entry; returns its directories."""
+        directories, variables = index_tree(entry, self.browsed_scope, full_paths=True, path=path)
+        directories = {dir_path: node_id for dir_path, node_id in directories.items()
+                       if dir_path not in self.browsed_directories}
+        self.browsed_directories.update(directories)
+        self.browsed_variables.update((var_path.rsplit("/", 1)[-1], node_id)
+                                      for var_path, node_id in variables.items())
+        entries_by_node_id(entry, self.browse_entries)
+        self.tag_index.add(directories, variables)
+        self.search_tags()
+        return directories
+
+    def search_tags(self):
+        """Lists the tags matching the search text."""
+        self.search_results.clear()
+        query = self.search_edit.text()
+        if not query.strip() or self.tag_index is None:
+            self.search_results.hide()
+            return
+        for path, node_id, kind in self.tag_index.search(query):
+            item = QListWidgetItem(path if kind == KIND_VARIABLE else f"{path}/")
+            item.setData(Qt.UserRole, (path, node_id, kind))
+            item.setToolTip(f"{kind.capitalize()}\nNodeId: {node_id}")
+            self.search_results.addItem(item)
+        if not self.search_results.count():
+            self.search_results.addItem("No matching tags")
+        self.search_results.show()
+
+    def search_result_activated(self, item):
+        """Adds a found variable to the current scenario, or opens a found directory there."""
+        result = item.data(Qt.UserRole)
+        scenario = self.tab_widget.currentWidget()
+        if result is None or not isinstance(scenario, RecordingScenario):
+            return
+        path, node_id, kind = result
+        if scenario.connection is not self.connection:
+            QMessageBox.warning(self, "Warning",
+                                "The current scenario records from another endpoint.")
+            return
+        if kind == KIND_VARIABLE:
+            scenario.add_variable(path, node_id)
+        else:
+            scenario.select_directory(path)
+
+    def edit_browse_scope(self):
+        """Asks for the browse scope used from the next connection on."""
+        scope = self.browse_scope
+        roots, ok = QInputDialog.getMultiLineText(
+            self, "Browse Scope", "Browse roots, one path per line (wildcards allowed):",
+            "\n".join(scope.roots))
+        if not ok:
+            return
+        roots = [line.strip().strip("/") for line in roots.splitlines() if line.strip()]
+        if not roots:
+            QMessageBox.warning(self, "Browse Scope", "At least one browse root is needed.")
+            return
+        include, ok = QInputDialog.getMultiLineText(
+            self, "Browse Scope",
+            "Only browse branches matching these paths (one per line, empty = all):",
+            "\n".join(scope.include))
+        if not ok:
+            return
+        exclude, ok = QInputDialog.getMultiLineText(
+            self, "Browse Scope", "Never browse branches matching these paths (one per line):",
+            "\n".join(scope.exclude))
+        if not ok:
+            return
+        max_depth, ok = QInputDialog.getInt(
+            self, "Browse Scope", "Levels browsed below the roots (0 = no limit):",
+            scope.max_depth, 0, 1000)
+        if not ok:
+            return
+        reference_names = list(REFERENCE_TYPES)
+        reference_values = list(REFERENCE_TYPES.values())
+        reference_name, ok = QInputDialog.getItem(
+            self, "Browse Scope", "References followed below the roots:", reference_names,
+            reference_values.index(scope.reference_type)
+            if scope.reference_type in reference_values else 0, False)
+        if not ok:
+            return
+        class_names = list(NODE_CLASS_MASKS)
+        class_values = list(NODE_CLASS_MASKS.values())
+        class_name, ok = QInputDialog.getItem(
+            self, "Browse Scope", "Node classes listed below the roots:", class_names,
+            class_values.index(scope.node_class_mask)
+            if scope.node_class_mask in class_values else 0, False)
+        if not ok:
+            return
+
+        def patterns(text):
+            return [line.strip().strip("/") for line in text.splitlines() if line.strip()]
+
+        self.browse_scope = BrowseScope(
+            roots, patterns(include), patterns(exclude), max_depth,
+            REFERENCE_TYPES[reference_name], NODE_CLASS_MASKS[class_name])
+        print(f"Browse scope set: {self.browse_scope.as_dict()}")
+
+    def tree_item_expanded(self, item):
+        """Browses the children of an unbrowsed tree item on the worker."""
+        if id(item) not in self.unbrowsed_items or not self.connection:
+            return
+        item, entry, path = self.unbrowsed_items.pop(id(item))
+        placeholder = QTreeWidgetItem(["Browsing..."])
+        item.addChild(placeholder)
+        self.browsing_items[id(item)] = (item, entry, path, placeholder)
+        worker = self.connection.worker
+        browse = browse_children_async if worker.is_async else browse_children
+        scope = self.browsed_scope
+        worker.submit(lambda client: browse(client, entry, path, scope),
+                      lambda result: self.tree_item_browsed(item, result))
+
+    def tree_item_browsed(self, item, result):
+        """Adds the children browsed for an expanded tree item."""
+        if id(item) not in self.browsing_items:
+            return  # The tree was rebuilt by a reconnect meanwhile
+        item, entry, path, placeholder = self.browsing_items.pop(id(item))
+        item.removeChild(placeholder)
+        if isinstance(result, Exception):
+            print(f"Error browsing {path}: {str(result)}")
+            # Try again on the next expansion
+            self.unbrowsed_items[id(item)] = (item, entry, path)
+            item.setExpanded(False)
+            return
+
+        self.add_tree_items(item, entry["children"], path)
+        item.setChildIndicatorPolicy(QTreeWidgetItem.DontShowIndicatorWhenChildless)
+
+        # Directories and variables found below the item become selectable
+        directories = self.index_browsed_entry(entry, path)
+        for i in range(self.tab_widget.count() - 1):  # Exclude '+' tab
+            scenario = self.tab_widget.widget(i)
+            if isinstance(scenario, RecordingScenario) and scenario.connection is self.connection:
+                scenario.add_directories(directories)
 
     def update_connection_status(self, connected=False):
         """Update the connection status LED."""
@@ -1510,26 +2265,41 @@ class OPCUARecorder(QMainWindow):
                 "QLabel { background-color: #e74c3c; border-radius: 8px; }"
             )
 
+    def connection_status_changed(self, connection):
+        """Shows a lost or reconnected session and restores the subscriptions made on it."""
+        if connection is self.connection:
+            self.update_connection_status(connection.alive)
+        if not connection.alive:
+            return
+        for i in range(self.tab_widget.count() - 1):  # Exclude '+' tab
+            scenario = self.tab_widget.widget(i)
+            if isinstance(scenario, RecordingScenario) and scenario.connection is connection:
+                scenario.connection_restored(connection.lost_at, connection.restored_at)
+
+    def deliver_worker_results(self):
+        """Hands results finished by the sessions' workers to their callbacks."""
+        self.connections.deliver_results()
+
     def disconnect_client(self):
-        """Safely disconnects the OPC UA client."""
-        if self.client:
-            try:
-                self.client.disconnect()
-            except Exception:
-                pass
-            finally:
-                self.client = None
-                self.update_connection_status(False)
+        """Releases the browsed endpoint's session; it stays pooled while scenarios use it."""
+        self.connections.release(self)
+        if self.connection:
+            if self.connection.address_space_cache:
+                # Keeps the nodes browsed on expansion for the next connection
+                self.connection.address_space_cache.save(self.browsed_tree)
+            self.connection = None
+        self.update_connection_status(False)
 
     def closeEvent(self, event):
         """Ensures all clients are disconnected when the application closes."""
         # Stop all active recordings
         for i in range(self.tab_widget.count() - 1):  # Exclude '+' tab
             scenario = self.tab_widget.widget(i)
-            if isinstance(scenario, RecordingScenario) and scenario.record_timer.isActive():
+            if isinstance(scenario, RecordingScenario) and scenario.is_recording():
                 scenario.stop_recording()
         
         self.disconnect_client()
+        self.connections.close_all()
         event.accept()
 
 if __name__ == "__main__":
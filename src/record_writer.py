@@ -0,0 +1,124 @@
+import csv
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+
+class StreamingCsvWriter(threading.Thread):
+    """Appends recorded rows to CSV files while a recording runs.
+
+    Batches of rows are handed over with `write` and written on this
+    thread, so the GUI never waits on the disk. The file is flushed to disk
+    every `flush_seconds` or `flush_rows` rows, whichever comes first, so a
+    crash loses at most that much. A new file is started when the current
+    one reaches `rotate_bytes` or has been open `rotate_seconds` (0 turns
+    either off), and when rows bring columns the header doesn't have yet.
+    """
+
+    def __init__(self, directory, order_headers, format_cell, flush_seconds=1.0,
+                 flush_rows=1000, rotate_bytes=0, rotate_seconds=0, prefix="record"):
+        super().__init__(name="record-writer", daemon=True)
+        self.directory = directory
+        self.order_headers = order_headers
+        self.format_cell = format_cell
+        self.flush_seconds = flush_seconds
+        self.flush_rows = flush_rows
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.prefix = prefix
+        self.files = []  # Paths written so far, oldest first
+        self.rows_written = 0
+        self.error = None
+        self._batches = queue.Queue()
+        self._file = None
+        self._writer = None
+        self._headers = set()
+        self._opened_at = 0.0
+        self._flushed_at = 0.0
+        self._unflushed = 0
+
+    def write(self, rows):
+        """Queues rows (dicts of raw recorded values) to be appended."""
+        if rows and self.error is None:
+            self._batches.put(rows)
+
+    def close(self, timeout=30):
+        """Writes the rows still queued, flushes and closes the file."""
+        self._batches.put(None)
+        if self.is_alive():
+            self.join(timeout)
+
+    def run(self):
+        try:
+            while True:
+                timeout = None
+                if self._unflushed:
+                    timeout = max(0.0, self._flushed_at + self.flush_seconds - time.monotonic())
+                try:
+                    rows = self._batches.get(timeout=timeout)
+                except queue.Empty:
+                    self._flush()
+                    continue
+                if rows is None:
+                    break
+                self._write_rows(rows)
+        except Exception as e:
+            self.error = e
+            print(f"Error streaming recording to disk: {str(e)}")
+        finally:
+            self._close_file()
+
+    def _write_rows(self, rows):
+        for row in rows:
+            if self._file is None or self._needs_rotation(row):
+                self._open_file(row)
+            self._writer.writerow({header: self.format_cell(header, value)
+                                   for header, value in row.items()})
+            self._unflushed += 1
+            self.rows_written += 1
+            if self._unflushed >= self.flush_rows:
+                self._flush()
+        if self._unflushed and time.monotonic() - self._flushed_at >= self.flush_seconds:
+            self._flush()
+
+    def _needs_rotation(self, row):
+        if not self._headers.issuperset(row):
+            return True  # The header can't hold the new columns
+        if self.rotate_bytes and self._file.tell() >= self.rotate_bytes:
+            return True
+        return bool(self.rotate_seconds) and time.monotonic() - self._opened_at >= self.rotate_seconds
+
+    def _open_file(self, row):
+        self._headers |= set(row)
+        self._close_file()
+        os.makedirs(self.directory, exist_ok=True)
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        file_path = os.path.join(self.directory, f"{self.prefix}_{timestamp}.csv")
+        part = 1
+        while os.path.exists(file_path):
+            part += 1
+            file_path = os.path.join(self.directory, f"{self.prefix}_{timestamp}_{part}.csv")
+
+        self._file = open(file_path, "w", newline="")
+        self._writer = csv.DictWriter(self._file, fieldnames=self.order_headers(self._headers))
+        self._writer.writeheader()
+        self._opened_at = time.monotonic()
+        self._flushed_at = self._opened_at
+        self.files.append(file_path)
+        print(f"Streaming recording to: {file_path}")
+
+    def _flush(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._flushed_at = time.monotonic()
+        self._unflushed = 0
+
+    def _close_file(self):
+        if self._file is not None:
+            self._flush()
+            self._file.close()
+            self._file = None
@@ -0,0 +1,243 @@
+from array import array
+
+from src.acquisition import SERVER_TIME_SUFFIX, SOURCE_TIME_SUFFIX, STATUS_SUFFIX
+
+# Value of a cell that has no data (column added later, or key absent from the row)
+MISSING = ""
+
+
+def column_typecode(name, value=None):
+    """Pick the array typecode of a column from its name or first value."""
+    if name == "timestamp" or name.endswith((SOURCE_TIME_SUFFIX, SERVER_TIME_SUFFIX)):
+        return 'q'  # int64 epoch nanoseconds
+    if name.endswith(STATUS_SUFFIX):
+        return 'I'  # 32-bit StatusCode
+    if type(value) is bool:
+        return 'b'
+    if type(value) is int:
+        return 'q'
+    if type(value) is float:
+        return 'd'
+    return None  # Anything else is kept in a plain list
+
+
+class Column:
+    """One recorded column stored in a typed array.
+
+    Cells that don't fit the column's type (error texts, skipped-slot
+    markers, missing values, a value of another type) are kept in the
+    sparse `overrides` dict keyed by slot, so a column of floats with a
+    few errors still costs 8 bytes per row. Missing cells (such as samples
+    dropped by compression) are flagged in the `present` byte mask, created
+    the first time one occurs. Until the first non-text value arrives the
+    type is undecided and cells are kept in a plain list.
+    """
+
+    def __init__(self, name, missing_before):
+        self.name = name
+        self.typecode = column_typecode(name)
+        self.decided = self.typecode is not None
+        self.python_type = {'b': bool, 'q': int, 'I': int, 'd': float}.get(self.typecode)
+        self.data = array(self.typecode) if self.typecode else []
+        self.overrides = {}
+        self.present = None
+        # Rows recorded before the column existed (absolute row numbers) are missing
+        self.missing_before = missing_before
+
+    def decide(self, value):
+        """Fixes the column type from its first non-text value."""
+        self.decided = True
+        self.typecode = column_typecode(self.name, value)
+        if self.typecode is None:
+            return
+        self.python_type = {'b': bool, 'q': int, 'I': int, 'd': float}[self.typecode]
+        # Text cells stored so far become overrides of the new typed array
+        for slot, cell in enumerate(self.data):
+            if cell == MISSING:
+                self.mark_missing(slot)
+            elif cell is not None:
+                self.overrides[slot] = cell
+        self.data = array(self.typecode, bytes(len(self.data) * array(self.typecode).itemsize))
+
+    def fits(self, value):
+        """Whether the value can be stored in the typed array itself."""
+        if self.python_type is None:
+            return True
+        if type(value) is not self.python_type:
+            return False
+        if self.typecode == 'I':
+            return 0 <= value <= 0xFFFFFFFF
+        if self.typecode == 'q':
+            return -(1 << 63) <= value < (1 << 63)
+        return True
+
+    def mark_missing(self, slot):
+        """Flags a slot as holding no value."""
+        if self.present is None:
+            self.present = bytearray(b"\x01") * len(self.data)
+        if slot == len(self.present):
+            self.present.append(0)
+        else:
+            self.present[slot] = 0
+
+    def placeholder(self):
+        """Filler stored in the typed array under an override."""
+        return 0.0 if self.typecode == 'd' else (None if self.typecode is None else 0)
+
+    def grow(self, count):
+        """Appends `count` placeholder slots."""
+        if self.present is not None:
+            self.present.extend(b"\x01" * count)
+        if self.typecode:
+            self.data.extend(array(self.typecode, bytes(count * self.data.itemsize)))
+        else:
+            self.data.extend([None] * count)
+
+    def put(self, slot, value, append):
+        """Stores a cell, appending a slot or overwriting an existing one."""
+        if not self.decided and not isinstance(value, str):
+            self.decide(value)
+        self.overrides.pop(slot, None)
+        if self.python_type is not None and isinstance(value, str) and value == MISSING:
+            self.mark_missing(slot)
+            value = self.placeholder()
+        else:
+            if self.present is not None:
+                if append:
+                    self.present.append(1)
+                else:
+                    self.present[slot] = 1
+            if not self.fits(value):
+                self.overrides[slot] = value
+                value = self.placeholder()
+            elif self.typecode == 'b':
+                value = int(value)
+        if append:
+            self.data.append(value)
+        else:
+            self.data[slot] = value
+
+    def get(self, slot):
+        """Returns a cell as the Python value that was stored."""
+        if slot in self.overrides:
+            return self.overrides[slot]
+        if self.present is not None and not self.present[slot]:
+            return MISSING
+        value = self.data[slot]
+        return bool(value) if self.typecode == 'b' else value
+
+    def nbytes(self):
+        """Approximate memory held by the column's array and mask."""
+        mask = len(self.present) if self.present is not None else 0
+        if self.typecode:
+            return self.data.itemsize * len(self.data) + mask
+        return 8 * len(self.data) + mask
+
+
+class RecordingBuffer:
+    """Columnar, array-backed store for the rows of one recording.
+
+    Each column (timestamp, variable values, their timestamps and status
+    codes, structure fields) is a typed array, so a row costs a few bytes
+    per cell instead of a dict of boxed objects. Appends are amortized O(1).
+    With a `capacity` the buffer is a ring that keeps only the newest rows.
+    """
+
+    def __init__(self, capacity=None):
+        self.capacity = capacity
+        self.columns = {}
+        self.start = 0  # Slot of the oldest row once the ring has wrapped
+        self.size = 0
+        self.total = 0  # Rows appended over the buffer's lifetime
+
+    def __len__(self):
+        return self.size
+
+    def column_names(self):
+        """Column names in the order they first appeared."""
+        return list(self.columns)
+
+    def append(self, row):
+        """Appends a row dict; unknown keys become new columns."""
+        wrapping = self.capacity is not None and self.size == self.capacity
+        slot = self.start if wrapping else self.size
+
+        for name, value in row.items():
+            if name not in self.columns:
+                column = Column(name, self.total)
+                column.grow(self.size)
+                self.columns[name] = column
+        for name, column in self.columns.items():
+            column.put(slot, row.get(name, MISSING), append=not wrapping)
+
+        if wrapping:
+            self.start = (self.start + 1) % self.capacity
+        else:
+            self.size += 1
+        self.total += 1
+
+    def _index(self, index):
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError("recording buffer index out of range")
+        return index
+
+    def _slot(self, index):
+        if self.capacity is None:
+            return index
+        return (self.start + index) % self.capacity
+
+    def cell(self, index, name):
+        """Value of one cell; index 0 is the oldest row kept."""
+        index = self._index(index)
+        column = self.columns.get(name)
+        if column is None:
+            return MISSING
+        if self.total - self.size + index < column.missing_before:
+            return MISSING
+        return column.get(self._slot(index))
+
+    def column_data(self, name):
+        """A column in row order: (values, overrides by row index, leading missing rows, mask).
+
+        Values is the column's typed array (or list) for the rows kept,
+        oldest first; cells listed in the overrides, before the missing
+        rows or cleared in the present mask (None when no cell is missing)
+        only hold a placeholder there.
+        """
+        column = self.columns[name]
+        present = column.present
+        if self.capacity is not None and self.start:
+            data = column.data[self.start:] + column.data[:self.start]
+            if present is not None:
+                present = present[self.start:] + present[:self.start]
+        else:
+            data = column.data[:self.size]
+            if present is not None:
+                present = present[:self.size]
+        overrides = {}
+        for slot, value in column.overrides.items():
+            overrides[slot if self.capacity is None else (slot - self.start) % self.capacity] = value
+        missing_rows = min(self.size, max(0, column.missing_before - (self.total - self.size)))
+        return data, overrides, missing_rows, present
+
+    def row(self, index):
+        """One row as a dict, like the rows that were appended."""
+        return {name: self.cell(index, name) for name in self.columns}
+
+    def rows(self):
+        """Iterates over the rows kept, oldest first."""
+        for index in range(self.size):
+            yield self.row(index)
+
+    def clear(self):
+        """Drops every row and column."""
+        self.columns = {}
+        self.start = 0
+        self.size = 0
+        self.total = 0
+
+    def nbytes(self):
+        """Approximate memory used by the column arrays."""
+        return sum(column.nbytes() for column in self.columns.values())
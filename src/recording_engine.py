@@ -0,0 +1,302 @@
+import queue
+import time
+
+from opcua import ua
+
+from src.acquisition import DataChangeCollector, create_data_change_subscription
+from src.async_engine import create_data_change_subscription_async, fill_node_metadata_async
+from src.compression import NO_COMPRESSION, PERCENT_DEADBAND, RecordCompressor, eu_range_span
+from src.node_metadata import NodeMetadataCache
+from src.record_writer import StreamingCsvWriter
+from src.recording_rows import (
+    build_rows, fill_gap, fill_gap_async, format_recorded, group_headers, is_sample_row,
+    record_sample
+)
+
+# Recording modes: sampled on a fixed interval, or pushed by the server as data changes
+POLLING = "polling"
+SUBSCRIPTION = "subscription"
+
+
+def open_stream(directory, flush_seconds=1.0, flush_rows=1000, rotate_bytes=0, rotate_seconds=0):
+    """Starts a StreamingCsvWriter appending recorded rows to CSV files in `directory`."""
+    writer = StreamingCsvWriter(directory, group_headers, format_recorded,
+                                flush_seconds=flush_seconds, flush_rows=flush_rows,
+                                rotate_bytes=rotate_bytes, rotate_seconds=rotate_seconds)
+    writer.start()
+    return writer
+
+
+class RecordingEngine:
+    """Records a set of variables from a pooled Connection, without any widgets.
+
+    The GUI scenarios and the headless recorder each drive one per
+    recording. Polling goes through the connection's SamplingHub,
+    subscription mode through a data change subscription on its worker;
+    after an outage the gap is backfilled before new rows are taken.
+    Rows are compressed, then appended to an optional RecordingBuffer and
+    StreamingCsvWriter, up to an optional record limit.
+
+    Everything runs on the thread delivering the worker's results, except
+    data change notifications, which queue up until drain_notifications().
+    rows_added(rows) is called after rows were recorded, and finished(error)
+    when the recording should end: with None once the record limit is
+    reached, or with the exception the subscription failed with. The owner
+    then calls stop().
+    """
+
+    def __init__(self, connection, tags, mode=POLLING, interval_ms=1000, sampling_interval_ms=-1,
+                 queue_size=1, compression=None, buffer=None, limit=None, stream_writer=None,
+                 rows_added=None, finished=None):
+        self.connection = connection
+        self.worker = connection.worker
+        self.tags = dict(tags)  # Label -> NodeId, fixed for the whole recording
+        self.mode = mode
+        self.interval_ms = interval_ms
+        self.sampling_interval_ms = sampling_interval_ms  # Negative: the publishing interval
+        self.queue_size = queue_size
+        self.compression = compression or {}  # CompressionSettings by label
+        self.compressor = None
+        self.buffer = buffer
+        self.limit = limit  # Samples recorded before finishing; None records until stopped
+        self.stream_writer = stream_writer
+        self.rows_added = rows_added
+        self.finished = finished
+        self.record_count = 0  # Sample rows recorded; markers aren't counted
+        self.preparing = False  # Reading the EURanges percent deadbands need
+        self.polling = False
+        self.stopped = False
+        # Subscription mode: notifications arrive on the client's thread
+        self.subscription = None
+        self.subscribing = False
+        self.notification_queue = queue.Queue()
+        self.held_row = {}
+
+    def is_recording(self):
+        """Returns True while either recording mode is active."""
+        return (self.preparing or self.polling or self.subscribing
+                or self.subscription is not None)
+
+    def start(self):
+        """Starts sampling, or subscribing to data changes.
+
+        Percent deadbands are relative to the tags' EURange, which is read
+        into the connection's NodeMetadataCache first.
+        """
+        if not any(setting.method == PERCENT_DEADBAND for setting in self.compression.values()):
+            self._start()
+            return
+        cache = self.connection.node_metadata
+        node_ids = list(self.tags.values())
+        fill = fill_node_metadata_async if self.worker.is_async else NodeMetadataCache.fill
+        self.preparing = True
+        self.worker.submit(lambda client: fill(cache, client, node_ids), self.metadata_read)
+
+    def metadata_read(self, result):
+        """Starts recording once the EURanges were read."""
+        self.preparing = False
+        if self.stopped:
+            return
+        if isinstance(result, Exception):
+            print(f"Error reading EURanges: {str(result)}")
+        self._start()
+
+    def _start(self):
+        eu_ranges = {}
+        for label, setting in self.compression.items():
+            if setting.method != PERCENT_DEADBAND:
+                continue
+            metadata = self.connection.node_metadata.get(self.tags[label])
+            eu_ranges[label] = metadata.eu_range if metadata else None
+            if eu_range_span(eu_ranges[label]) is None:
+                print(f"{label} has no EURange, its percent deadband falls back to exact change")
+        if any(setting.method != NO_COMPRESSION for setting in self.compression.values()):
+            self.compressor = RecordCompressor(self.compression, eu_ranges)
+
+        if self.mode == SUBSCRIPTION:
+            self.subscribe()
+            return
+        # Sample through the connection's hub with the tags fixed at start
+        labels = list(self.tags)
+        node_ids = list(self.tags.values())
+        fill = fill_gap_async if self.worker.is_async else fill_gap
+        self.polling = True
+        self.connection.sampling_hub.subscribe(
+            (self, "record"), node_ids, self.interval_ms,
+            lambda client, tick, read_time, samples: build_rows(
+                tick, read_time, labels, [samples[node_id] for node_id in node_ids]),
+            self.record_sampled,
+            lambda client, start_ns, end_ns: fill(client, start_ns, end_ns, labels, node_ids))
+
+    def subscribe(self):
+        """Creates a subscription with one monitored item per tag on the worker."""
+        self.notification_queue = queue.Queue()
+        self.held_row = {}
+        labels_by_node_id = {node_id: label for label, node_id in self.tags.items()}
+        handler = DataChangeCollector(labels_by_node_id, self.notification_queue)
+        node_ids = list(self.tags.values())
+        create = (create_data_change_subscription_async if self.worker.is_async
+                  else create_data_change_subscription)
+        interval_ms, sampling_interval_ms, queue_size = (
+            self.interval_ms, self.sampling_interval_ms, self.queue_size)
+        self.subscribing = True
+        self.worker.submit(
+            lambda client: create(client, node_ids, handler, interval_ms,
+                                  sampling_interval_ms, queue_size),
+            self.subscription_created)
+
+    def subscription_created(self, result):
+        """Takes notifications once the worker created the subscription."""
+        if isinstance(result, Exception):
+            if self.subscribing:
+                self.subscribing = False
+                self._finish(result)
+            return
+
+        subscription, results = result
+        if not self.subscribing:
+            # Recording was stopped while the subscription was being created
+            self.delete_subscription(subscription)
+            return
+        self.subscribing = False
+        self.subscription = subscription
+
+        # Monitored items the server refused are recorded as errors
+        for label, item_result in zip(self.tags, results):
+            if isinstance(item_result, ua.StatusCode):
+                try:
+                    item_result.check()
+                except Exception as e:
+                    self.notification_queue.put((label, (e, 0, 0, item_result.value)))
+
+    def connection_restored(self, start_ns, end_ns):
+        """Fills the outage of a subscription recording, then subscribes on the new session."""
+        if self.subscription is None:
+            return  # Polling outages are filled by the SamplingHub
+        self.drain_notifications()  # Changes received before the session was lost
+        if self.subscription is None:
+            return  # The record limit was reached
+        self.subscription = None  # Went with the old session
+        self.subscribing = True
+        labels = list(self.tags)
+        node_ids = list(self.tags.values())
+        fill = fill_gap_async if self.worker.is_async else fill_gap
+        self.worker.submit(lambda client: fill(client, start_ns, end_ns, labels, node_ids),
+                           self.subscription_gap_filled)
+
+    def subscription_gap_filled(self, rows):
+        """Records the outage of a subscription recording and subscribes again."""
+        if not self.subscribing:
+            return  # Recording was stopped meanwhile
+        if isinstance(rows, Exception):
+            print(f"Error filling connection gap: {str(rows)}")
+        else:
+            self.record(rows)
+            if self.stopped:
+                return
+        self.subscribe()
+
+    def delete_subscription(self, subscription):
+        """Deletes a subscription on the worker."""
+        self.worker.submit(lambda client: subscription.delete(), self.subscription_deleted)
+
+    def subscription_deleted(self, result):
+        """Reports a subscription that could not be deleted."""
+        if isinstance(result, Exception):
+            print(f"Error deleting subscription: {str(result)}")
+
+    def drain_notifications(self):
+        """Records one row per queued data change, holding the last value of other tags."""
+        rows = []
+        while True:
+            try:
+                label, sample = self.notification_queue.get_nowait()
+            except queue.Empty:
+                break
+
+            record_sample(self.held_row, label, sample)
+            # Stamp the row with the change's source timestamp when the server sent one
+            row = {"timestamp": sample[1] or time.time_ns()}
+            row.update(self.held_row)
+            rows.append(row)
+
+        if rows:
+            self.record(rows)
+
+    def record_sampled(self, rows):
+        """Records the rows of a polling slot sampled by the acquisition worker."""
+        # Rows still in flight when recording stopped are dropped
+        if not self.polling:
+            return
+        if isinstance(rows, Exception):
+            print(f"Error sampling row: {str(rows)}")
+            return
+        self.record(rows)
+
+    def record(self, rows):
+        """Compresses and stores rows; finishes the recording once the record limit is reached."""
+        if self.compressor is not None:
+            rows = self.compressor.push(rows)
+        if self._store(rows):
+            self._finish(None)
+
+    def stop(self):
+        """Stops recording and stores the rows compression held back.
+
+        Returns the stream writer, closed, or None when not streaming.
+        """
+        if self.stopped:
+            return None
+        self.stopped = True
+        self.preparing = False
+        if self.polling:
+            self.polling = False
+            self.connection.sampling_hub.unsubscribe((self, "record"))
+        self.subscribing = False
+        if self.subscription is not None:
+            self.drain_notifications()
+            self.delete_subscription(self.subscription)
+            self.subscription = None
+        if self.compressor is not None:
+            compressor, self.compressor = self.compressor, None
+            self._store(compressor.flush())
+
+        writer, self.stream_writer = self.stream_writer, None
+        if writer is not None:
+            # Writes the rows still queued and closes the stream's file
+            writer.close()
+            print(f"Streamed {writer.rows_written} rows to {len(writer.files)} file(s)")
+        return writer
+
+    def _store(self, rows):
+        """Appends rows to the buffer and the stream; returns True once the record limit is reached.
+
+        Only sample rows count toward the limit, so skipped slot and gap
+        markers don't shorten a recording; backfilled values are samples.
+        """
+        if self.limit is None:
+            self.record_count += sum(map(is_sample_row, rows))
+        else:
+            kept = []
+            for row in rows:
+                if self.record_count >= self.limit:
+                    break
+                kept.append(row)
+                self.record_count += is_sample_row(row)
+            rows = kept
+        if self.buffer is not None:
+            for row in rows:
+                self.buffer.append(row)
+        if self.stream_writer is not None:
+            self.stream_writer.write(rows)
+        if rows and self.rows_added:
+            self.rows_added(rows)
+        return self.limit is not None and self.record_count >= self.limit
+
+    def _finish(self, error):
+        if self.stopped:
+            return
+        if self.finished:
+            self.finished(error)
+        else:
+            self.stop()
@@ -0,0 +1,236 @@
+import json
+import mmap
+import struct
+import sys
+from array import array
+from itertools import compress
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the reader then returns memoryviews
+    np = None
+
+# File layout: MAGIC, one 8-byte aligned block per column (and per sparse
+# table), the JSON header, then a trailer with the header's offset and
+# length followed by MAGIC again. Blocks are written first, so the header
+# can list where they ended up.
+MAGIC = b"OPCREC1\0"
+TRAILER = struct.Struct("<QQ8s")
+FILE_EXTENSION = ".opcrec"
+FORMAT_VERSION = 1
+
+_ALIGNMENT = 8
+
+
+def _jsonable(value):
+    """Cells that aren't JSON types (exceptions, structures) are stored as text."""
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(item) for item in value]
+    return str(value)
+
+
+def _delta_encode(values):
+    """First value, then the differences between consecutive values."""
+    if np is not None:
+        data = np.frombuffer(values, dtype=np.int64)
+        return np.diff(data, prepend=np.int64(0)).astype(np.int64).tobytes()
+    deltas = array('q', values)
+    for i in range(len(deltas) - 1, 0, -1):
+        deltas[i] -= deltas[i - 1]
+    return deltas.tobytes()
+
+
+def _delta_decode(deltas):
+    """Undoes _delta_encode into a new int64 array."""
+    if np is not None:
+        return np.cumsum(deltas, dtype=np.int64)
+    values = array('q', deltas)
+    for i in range(1, len(values)):
+        values[i] += values[i - 1]
+    return values
+
+
+class _BlockWriter:
+    """Writes 8-byte aligned blocks and remembers where each one went."""
+
+    def __init__(self, file):
+        self.file = file
+        self.offset = 0
+
+    def write(self, data):
+        padding = -self.offset % _ALIGNMENT
+        if padding:
+            self.file.write(b"\0" * padding)
+            self.offset += padding
+        start = self.offset
+        self.file.write(data)
+        self.offset += len(data)
+        return {"offset": start, "nbytes": len(data)}
+
+
+def write_recording(file_path, buffer, headers=None, metadata=None):
+    """Writes a RecordingBuffer as a binary columnar recording file.
+
+    Typed columns are stored as their raw arrays, with the timestamp
+    column delta-encoded. Columns with missing cells (compressed tags) are
+    stored sparse: only the values present, plus their row indexes. Cells
+    that don't fit a column's type (errors, skipped-slot markers) and
+    untyped columns go to small JSON blocks.
+    `metadata` (tag NodeIds, interval, ...) is kept in the header.
+    """
+    headers = list(headers or buffer.column_names())
+    columns = []
+    with open(file_path, "wb") as file:
+        file.write(MAGIC)
+        blocks = _BlockWriter(file)
+        blocks.offset = len(MAGIC)
+
+        for name in headers:
+            data, overrides, missing_rows, present = buffer.column_data(name)
+            column = {"name": name, "missing_rows": missing_rows}
+            typecode = buffer.columns[name].typecode
+            if typecode is None:
+                column["encoding"] = "json"
+                column["typecode"] = None
+                column.update(blocks.write(json.dumps(
+                    [_jsonable(value) for value in data]).encode("utf-8")))
+            else:
+                column["typecode"] = typecode
+                column["bool"] = buffer.columns[name].python_type is bool
+                if name == "timestamp" and typecode == 'q':
+                    column["encoding"] = "delta"
+                    column.update(blocks.write(_delta_encode(data)))
+                elif present is not None:
+                    column["encoding"] = "sparse"
+                    rows = array('q', compress(range(len(data)), present))
+                    column["rows"] = blocks.write(_delta_encode(rows))
+                    column.update(blocks.write(array(typecode, compress(data, present)).tobytes()))
+                    overrides = {row: value for row, value in overrides.items() if present[row]}
+                else:
+                    column["encoding"] = "plain"
+                    column.update(blocks.write(data.tobytes()))
+            if overrides:
+                column["overrides"] = blocks.write(json.dumps(
+                    {str(row): _jsonable(value) for row, value in overrides.items()}).encode("utf-8"))
+            columns.append(column)
+
+        header = json.dumps({
+            "version": FORMAT_VERSION,
+            "rows": len(buffer),
+            "byteorder": sys.byteorder,
+            "metadata": metadata or {},
+            "columns": columns,
+        }).encode("utf-8")
+        header_offset = blocks.write(header)["offset"]
+        file.write(TRAILER.pack(header_offset, len(header), MAGIC))
+
+
+class RecordingReader:
+    """Memory-mapped reader of a binary recording file.
+
+    Columns are returned as NumPy arrays viewing the mapped file, so
+    opening a recording and slicing a column is instant whatever its size.
+    Without NumPy they are memoryviews of the same bytes. Only the
+    delta-encoded timestamp column has to be decoded into a new array.
+    Use as a context manager, or call close(), once the arrays are no
+    longer needed.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._file = open(file_path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        if len(self._map) < len(MAGIC) + TRAILER.size or self._map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{file_path} is not a recording file")
+        header_offset, header_length, magic = TRAILER.unpack(self._map[-TRAILER.size:])
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{file_path} is incomplete (no trailer)")
+        self.header = json.loads(self._map[header_offset:header_offset + header_length])
+        if self.header["version"] > FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"{file_path} uses a newer format version")
+        self.metadata = self.header["metadata"]
+        self._columns = {column["name"]: column for column in self.header["columns"]}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.header["rows"]
+
+    def column_names(self):
+        """Column names in the order they were written."""
+        return list(self._columns)
+
+    def column(self, name):
+        """The stored values of a column, without copying them out of the file.
+
+        Cells listed by overrides() or before missing_rows() only hold a
+        placeholder here. Sparse columns only hold the values present, at
+        the rows given by row_indexes().
+        """
+        column = self._columns[name]
+        if column["encoding"] == "json":
+            return json.loads(bytes(self._block(column)))
+        values = self._typed(column)
+        if column["encoding"] == "delta":
+            return _delta_decode(values)
+        return values
+
+    def row_indexes(self, name):
+        """Rows of a sparse column's values; None when the column has a value per row."""
+        column = self._columns[name]
+        if column["encoding"] != "sparse":
+            return None
+        return _delta_decode(self._typed(dict(column["rows"], typecode='q', bool=False)))
+
+    def timestamps(self):
+        """The client timestamps (epoch nanoseconds) of every row."""
+        return self.column("timestamp")
+
+    def overrides(self, name):
+        """Cells of a column that don't fit its type, by row index."""
+        column = self._columns[name]
+        if "overrides" not in column:
+            return {}
+        overrides = json.loads(bytes(self._block(column["overrides"])))
+        return {int(row): value for row, value in overrides.items()}
+
+    def missing_rows(self, name):
+        """Number of leading rows recorded before the column existed."""
+        return self._columns[name]["missing_rows"]
+
+    def close(self):
+        """Unmaps the file; arrays returned earlier must not be used afterwards."""
+        try:
+            self._map.close()
+        except (BufferError, AttributeError):
+            pass  # Arrays still viewing the map keep it alive
+        self._file.close()
+
+    def _block(self, block):
+        return memoryview(self._map)[block["offset"]:block["offset"] + block["nbytes"]]
+
+    def _typed(self, column):
+        typecode = column["typecode"]
+        native = self.header["byteorder"] == sys.byteorder
+        if np is not None:
+            dtype = np.dtype(np.bool_) if column["bool"] else np.dtype(typecode)
+            if not native:
+                dtype = dtype.newbyteorder()
+            return np.frombuffer(self._map, dtype=dtype,
+                                 count=column["nbytes"] // dtype.itemsize, offset=column["offset"])
+        if not native:
+            raise ValueError("Reading a recording of the other byte order requires NumPy")
+        return self._block(column).cast(typecode)
@@ -0,0 +1,159 @@
+from src.acquisition import (
+    SERVER_TIME_SUFFIX, SOURCE_TIME_SUFFIX, STATUS_SUFFIX, format_status, format_timestamp_ns,
+    read_raw_history, sample_from_data_value
+)
+from src.async_engine import read_raw_history_async
+from src.structures import is_structure, structure_flattener
+
+# Recorded rows are dicts of column name -> raw value, with a "timestamp"
+# column in epoch ns. They are built the same way by the GUI scenarios
+# and the headless recorder, so their files look the same.
+
+SKIPPED_MARKER = "Skipped (overrun)"
+
+
+def record_value(row, label, value):
+    """Stores a read result in the row, one column per structure field."""
+    try:
+        if isinstance(value, Exception):
+            raise value
+
+        # Handle structured data for recording
+        if isinstance(value, (list, tuple)) and value and is_structure(value[0]):
+            # For array of structures, create separate columns for each field
+            _record_structure(row, value[0], label, value)
+        elif is_structure(value):
+            # For single structure, create separate columns for each field
+            _record_structure(row, value, label, value)
+        else:
+            row[label] = value
+
+    except Exception as e:
+        row[label] = f"Error: {e}"
+
+
+def _record_structure(row, sample, label, value):
+    """Stores structure fields with the flattener compiled for the structure's type."""
+    try:
+        structure_flattener(sample).flatten_into(row, label, value)
+    except Exception as e:
+        row[label] = f"Error recording structure: {str(e)}"
+
+
+def record_sample(row, label, sample):
+    """Stores a sample's value, timestamps and status code in the row."""
+    value, source_time, server_time, status = sample
+    record_value(row, label, value)
+    row[label + SOURCE_TIME_SUFFIX] = source_time
+    row[label + SERVER_TIME_SUFFIX] = server_time
+    row[label + STATUS_SUFFIX] = status
+
+
+def is_sample_row(row):
+    """True for rows holding a sample; skipped slot and gap markers have no status column."""
+    return any(column.endswith(STATUS_SUFFIX) for column in row)
+
+
+def build_rows(tick, current_time, labels, samples):
+    """Builds the rows of one slot: one marker for the slots skipped before it, then the sample."""
+    rows = []
+    if tick.skipped:
+        # A single row at the first skipped slot, however long the stall was
+        skipped = {"timestamp": int(tick.first_skipped * 1e9)}
+        skipped.update(dict.fromkeys(labels, f"{SKIPPED_MARKER}: {tick.skipped} slot(s) until "
+                                             f"{format_timestamp_ns(int(tick.last_skipped * 1e9))}"))
+        rows.append(skipped)
+
+    row = {"timestamp": current_time}
+    for label, sample in zip(labels, samples):
+        record_sample(row, label, sample)
+    rows.append(row)
+    return rows
+
+
+def fill_gap(client, start_ns, end_ns, labels, node_ids):
+    """Rows of a connection outage, backfilled from server history; runs on the worker."""
+    try:
+        histories = read_raw_history(client, node_ids, start_ns, end_ns)
+    except Exception as e:
+        histories = [e] * len(node_ids)  # The gap is still marked
+    return gap_rows(start_ns, end_ns, labels, histories)
+
+
+async def fill_gap_async(client, start_ns, end_ns, labels, node_ids):
+    """asyncua counterpart of fill_gap."""
+    try:
+        histories = await read_raw_history_async(client, node_ids, start_ns, end_ns)
+    except Exception as e:
+        histories = [e] * len(node_ids)
+    return gap_rows(start_ns, end_ns, labels, histories)
+
+
+def gap_rows(start_ns, end_ns, labels, histories):
+    """The values historized during an outage, and a gap marker for variables without any.
+
+    Servers answer for nodes they don't historize either with an error or
+    with an empty history, so a variable gets the marker whenever no value
+    of the outage came back for it.
+    """
+    changes = []
+    missing = []
+    for label, history in zip(labels, histories):
+        found = 0
+        if not isinstance(history, Exception):
+            for data_value in history:
+                sample = sample_from_data_value(data_value)
+                timestamp = sample[1] or sample[2]
+                if start_ns <= timestamp < end_ns:
+                    changes.append((timestamp, label, sample))
+                    found += 1
+        if not found:
+            missing.append(label)
+
+    rows = []
+    if missing:
+        gap = {"timestamp": start_ns}
+        gap.update(dict.fromkeys(
+            missing, f"Gap (connection lost until {format_timestamp_ns(end_ns)})"))
+        rows.append(gap)
+    changes.sort(key=lambda change: change[0])
+    for timestamp, label, sample in changes:
+        row = {"timestamp": timestamp}
+        record_sample(row, label, sample)
+        rows.append(row)
+    print(f"Connection gap of {(end_ns - start_ns) / 1e9:.1f} s: {len(changes)} "
+          f"value(s) backfilled from history, {len(missing)} variable(s) without history")
+    return rows
+
+
+def group_headers(names):
+    """Orders column headers: timestamp first, then grouped by variable."""
+    headers = set(names)
+
+    # Sort headers to group related fields together
+    sorted_headers = ["timestamp"]
+    remaining_headers = sorted(list(headers - {"timestamp"}))
+
+    # Group fields by their base variable name
+    header_groups = {}
+    for header in remaining_headers:
+        base_name = header.split('#')[0].split('[')[0].split('.')[0]
+        if base_name not in header_groups:
+            header_groups[base_name] = []
+        header_groups[base_name].append(header)
+
+    # Add grouped headers to final list
+    for base_name in sorted(header_groups.keys()):
+        sorted_headers.extend(sorted(header_groups[base_name]))
+    return sorted_headers
+
+
+def format_recorded(header, value):
+    """Turns raw timestamp and status code columns into text; other values pass through."""
+    if not isinstance(value, int):
+        return value
+    if header == "timestamp" or header.endswith((SOURCE_TIME_SUFFIX, SERVER_TIME_SUFFIX)):
+        return format_timestamp_ns(value)
+    if header.endswith(STATUS_SUFFIX):
+        return format_status(value)
+    return value
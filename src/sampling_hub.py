@@ -0,0 +1,163 @@
+import asyncio
+import inspect
+import time
+
+from src.acquisition import read_data_values, request_error, sample_from_data_value
+from src.async_engine import read_data_values_async
+
+
+class SamplingHub:
+    """Shares the periodic reads of one connection between all their consumers.
+
+    Recording scenarios and live tables subscribe with the NodeIds they
+    need and an interval. Consumers with the same interval form a group
+    that runs as one periodic job on the acquisition worker: each slot,
+    the union of their nodes is read once, in one batched Read. Every
+    consumer's job is then handed the same dict of samples by NodeId,
+    without copying, and its result goes to its callback on the GUI
+    thread. The server load grows with the unique nodes of each interval,
+    not with the number of tabs reading them.
+
+    A read that fails as a whole means the connection was lost: it is
+    reported to `connection_lost` and nothing is handed to the consumers
+    until reads succeed again, so an outage leaves a gap instead of a row
+    of errors per slot.
+    """
+
+    def __init__(self, worker, connection_lost=None):
+        self.worker = worker
+        self.connection_lost = connection_lost  # Called with a failed read's error and send time
+        self.suspended = False  # Set while the connection is down; no reads are sent
+        self._groups = {}  # interval_ms -> {key: (node_ids, job, callback, gap_job)}
+        self._intervals = {}  # key -> interval_ms of its group
+        self._reads = {}  # interval_ms -> (node_ids, consumers) read by the worker
+        self._gaps = {}  # interval_ms -> ns since the epoch when its reads stopped
+
+    def subscribe(self, key, node_ids, interval_ms, job, callback, gap_job=None):
+        """Runs job(client, tick, read_time, samples) every interval_ms until unsubscribe(key).
+
+        `samples` maps each NodeId read in the slot to its (value, source_ns,
+        server_ns, status) tuple and is shared, so jobs must not change it.
+        `read_time` is when the Read was sent, in ns since the epoch.
+        After an outage, gap_job(client, start_ns, end_ns) runs right before
+        the first job, with its result going to callback as well.
+        Subscribing again with the same key replaces the consumer.
+        """
+        if self._intervals.get(key, interval_ms) != interval_ms:
+            self.unsubscribe(key)
+        group = self._groups.setdefault(interval_ms, {})
+        group[key] = (tuple(node_ids), job, callback, gap_job)
+        self._intervals[key] = interval_ms
+        self._publish(interval_ms)
+        if len(group) == 1:
+            read = self._read_group_async if self.worker.is_async else self._read_group
+            self.worker.start_periodic(
+                (self, interval_ms), interval_ms,
+                lambda client, tick: read(client, tick, interval_ms), self._deliver)
+
+    def unsubscribe(self, key):
+        """Stops handing samples to a consumer; the group stops with its last one."""
+        interval_ms = self._intervals.pop(key, None)
+        if interval_ms is None:
+            return
+        group = self._groups[interval_ms]
+        del group[key]
+        if group:
+            self._publish(interval_ms)
+            return
+        del self._groups[interval_ms]
+        del self._reads[interval_ms]
+        self._gaps.pop(interval_ms, None)
+        self.worker.stop_periodic((self, interval_ms))
+
+    def suspend(self, since_ns):
+        """Stops reading while the connection is down; the gap began at since_ns at the latest."""
+        for interval_ms in self._groups:
+            self._gaps.setdefault(interval_ms, since_ns)
+        self.suspended = True
+
+    def resume(self):
+        """Reads again once the connection is back."""
+        self.suspended = False
+
+    def _publish(self, interval_ms):
+        consumers = tuple(self._groups[interval_ms].values())
+        node_ids = list(dict.fromkeys(
+            node_id for consumer in consumers for node_id in consumer[0]))
+        requested = sum(len(consumer[0]) for consumer in consumers)
+        print(f"Sampling {len(node_ids)} unique node(s) every {interval_ms} ms "
+              f"for {len(consumers)} consumer(s) requesting {requested}")
+        # Replaced in one assignment so the worker always sees a consistent pair
+        self._reads[interval_ms] = (node_ids, consumers)
+
+    def _read_group(self, client, tick, interval_ms):
+        """Reads a group's nodes and runs its consumers; runs on the acquisition worker."""
+        if self.suspended:
+            return []
+        node_ids, consumers = self._reads.get(interval_ms, ((), ()))
+        read_time = time.time_ns()
+        data_values = read_data_values(client, node_ids)
+        error = request_error(data_values)
+        if error is not None:
+            return self._read_failed(interval_ms, read_time, error)
+        samples = dict(zip(node_ids, map(sample_from_data_value, data_values)))
+        gap_start = self._gaps.pop(interval_ms, None)
+        results = []
+        for _, job, callback, gap_job in consumers:
+            if gap_start is not None and gap_job is not None:
+                results.append((callback, _run_job(gap_job, client, gap_start, read_time)))
+            results.append((callback, _run_job(job, client, tick, read_time, samples)))
+        return results
+
+    async def _read_group_async(self, client, tick, interval_ms):
+        """asyncua counterpart of _read_group; the consumers' jobs run concurrently."""
+        if self.suspended:
+            return []
+        node_ids, consumers = self._reads.get(interval_ms, ((), ()))
+        read_time = time.time_ns()
+        data_values = await read_data_values_async(client, node_ids)
+        error = request_error(data_values)
+        if error is not None:
+            return self._read_failed(interval_ms, read_time, error)
+        samples = dict(zip(node_ids, map(sample_from_data_value, data_values)))
+        gap_start = self._gaps.pop(interval_ms, None)
+        jobs = []
+        for _, job, callback, gap_job in consumers:
+            if gap_start is not None and gap_job is not None:
+                jobs.append((callback, _run_job_async(gap_job, client, gap_start, read_time)))
+            jobs.append((callback, _run_job_async(job, client, tick, read_time, samples)))
+        results = await asyncio.gather(*(job for _, job in jobs))
+        return [(callback, result) for (callback, _), result in zip(jobs, results)]
+
+    def _read_failed(self, interval_ms, read_time, error):
+        """Starts the group's gap and reports the lost connection as of the failed read."""
+        self._gaps.setdefault(interval_ms, read_time)
+        if self.connection_lost is None:
+            return []
+        connection_lost = self.connection_lost
+        return [(lambda error: connection_lost(error, read_time), error)]
+
+    def _deliver(self, results):
+        """Hands each consumer its result of a slot on the GUI thread."""
+        if isinstance(results, Exception):
+            print(f"Error sampling shared nodes: {str(results)}")
+            return
+        for callback, result in results:
+            callback(result)
+
+
+def _run_job(job, *args):
+    try:
+        return job(*args)
+    except Exception as e:
+        return e
+
+
+async def _run_job_async(job, *args):
+    try:
+        result = job(*args)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+    except Exception as e:
+        return e
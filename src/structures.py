@@ -0,0 +1,100 @@
+from itertools import chain
+from operator import attrgetter
+
+
+def is_structure(value):
+    """Whether a value is a decoded OPC UA structure (ExtensionObject)."""
+    return hasattr(value, '_fields_')
+
+
+class StructureFlattener:
+    """Field layout of one structure type, worked out once and reused.
+
+    The leaf fields (nested structures are expanded into `outer.inner`)
+    are read with a single attrgetter call, and the column names of each
+    label and array length are built once, so recording a structure costs
+    about the same as recording its fields as scalars. The layout is taken
+    from the first value seen: a field is treated as nested when it held a
+    structure then.
+    """
+
+    def __init__(self, sample):
+        self.type_name = sample.__class__.__name__
+        self.fields = tuple(sample._fields_)
+        self.leaf_paths = []
+        nested = []
+        field_types = []
+        for field in self.fields:
+            field_value = getattr(sample, field)
+            if is_structure(field_value):
+                inner = structure_flattener(field_value)
+                nested.append(True)
+                field_types.append(f"{field}: {inner.type_name}")
+                self.leaf_paths.extend(f"{field}.{path}" for path in inner.leaf_paths)
+            else:
+                nested.append(False)
+                field_types.append(f"{field}: {type(field_value).__name__}")
+                self.leaf_paths.append(field)
+        self.nested = tuple(nested)
+        self.type_info = f"{self.type_name}{{{', '.join(field_types)}}}"
+        self._leaf_getter = _tuple_getter(self.leaf_paths)
+        self._field_getter = _tuple_getter(self.fields)
+        self._columns = {}
+
+    def values(self, struct):
+        """The leaf field values of a structure, in leaf_paths order."""
+        return self._leaf_getter(struct)
+
+    def columns(self, prefix):
+        """Column names of the leaf fields under a prefix such as `label` or `label[2]`."""
+        columns = self._columns.get(prefix)
+        if columns is None:
+            columns = [f"{prefix}.{path}" for path in self.leaf_paths]
+            self._columns[prefix] = columns
+        return columns
+
+    def array_columns(self, label, length):
+        """Column names of every element of an array of `length` structures."""
+        key = (label, length)
+        columns = self._columns.get(key)
+        if columns is None:
+            columns = [column for i in range(length) for column in self.columns(f"{label}[{i}]")]
+            self._columns[key] = columns
+        return columns
+
+    def flatten_into(self, row, label, value):
+        """Stores a structure, or an array of them, in the row as one column per leaf field."""
+        if isinstance(value, (list, tuple)):
+            values = chain.from_iterable(map(self._leaf_getter, value))
+            row.update(zip(self.array_columns(label, len(value)), values))
+        else:
+            row.update(zip(self.columns(label), self._leaf_getter(value)))
+
+    def format(self, struct, format_nested):
+        """`{field: value, ...}` text of a structure; nested ones go through format_nested."""
+        items = []
+        for field, nested, field_value in zip(self.fields, self.nested, self._field_getter(struct)):
+            items.append(f"{field}: {format_nested(field_value) if nested else field_value}")
+        return f"{{{', '.join(items)}}}"
+
+
+def _tuple_getter(paths):
+    """attrgetter that always returns a tuple, even for zero or one path."""
+    if not paths:
+        return lambda struct: ()
+    if len(paths) == 1:
+        getter = attrgetter(paths[0])
+        return lambda struct: (getter(struct),)
+    return attrgetter(*paths)
+
+
+_flatteners = {}
+
+
+def structure_flattener(value):
+    """The cached StructureFlattener of a structure's type."""
+    flattener = _flatteners.get(type(value))
+    if flattener is None:
+        flattener = StructureFlattener(value)
+        _flatteners[type(value)] = flattener
+    return flattener
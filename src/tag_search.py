@@ -0,0 +1,114 @@
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+
+# Results returned by one search
+MAX_RESULTS = 200
+
+# One search result: a directory or variable with its full path and NodeId
+KIND_DIRECTORY = "directory"
+KIND_VARIABLE = "variable"
+
+
+class TagIndex:
+    """In-memory search index over the browsed directories and variables.
+
+    A tag is found by part of its full path or NodeId, case-insensitively.
+    Tag names (the last level of the path) are kept sorted, so names
+    starting with the query are found by binary search, as a prefix trie
+    would without one object per character. Every trigram of a tag's path
+    and NodeId points back to the tags containing it, so a substring query
+    only checks the tags sharing its rarest trigram. Name prefix matches
+    are returned first, then the other matches in tree order.
+    Building the trigrams takes a few seconds per 100k tags, so it is left
+    to build_trigrams(), meant for a background thread; until it is done,
+    substring queries check every tag. Tags browsed later are add()ed,
+    which only costs as much as the new tags.
+    """
+
+    def __init__(self, directories, variables):
+        """`directories` and `variables` map full paths to NodeIds."""
+        self.paths = []
+        self.node_ids = []
+        self.kinds = []
+        self._keys = []
+        self._append(directories, variables)
+
+        names = sorted((path.rsplit("/", 1)[-1].lower(), tag)
+                       for tag, path in enumerate(self.paths))
+        self._names = [name for name, _ in names]
+        self._name_tags = array('i', [tag for _, tag in names])
+        self._trigrams = None
+        self._lock = threading.Lock()  # Keeps add() and build_trigrams() from missing tags
+
+    def __len__(self):
+        return len(self.paths)
+
+    def add(self, directories, variables):
+        """Indexes newly browsed directories and variables, found after the ones already indexed."""
+        with self._lock:
+            first = len(self.paths)
+            self._append(directories, variables)
+            for tag in range(first, len(self.paths)):
+                name = self.paths[tag].rsplit("/", 1)[-1].lower()
+                index = bisect_right(self._names, name)
+                self._names.insert(index, name)
+                self._name_tags.insert(index, tag)
+            if self._trigrams is not None:
+                self._index_trigrams(self._trigrams, first, len(self._keys))
+
+    def build_trigrams(self):
+        """Indexes the trigrams of every tag's path and NodeId."""
+        trigrams = {}
+        count = len(self._keys)
+        self._index_trigrams(trigrams, 0, count)
+        with self._lock:
+            # Tags added meanwhile, then published in one go, as searches may run meanwhile
+            self._index_trigrams(trigrams, count, len(self._keys))
+            self._trigrams = trigrams
+
+    def _append(self, directories, variables):
+        for kind, tags in ((KIND_DIRECTORY, directories), (KIND_VARIABLE, variables)):
+            for path, node_id in tags.items():
+                self.paths.append(path)
+                self.node_ids.append(node_id)
+                self.kinds.append(kind)
+                self._keys.append(f"{path}\n{node_id}".lower())
+
+    def _index_trigrams(self, trigrams, first, last):
+        for tag in range(first, last):
+            key = self._keys[tag]
+            for trigram in {key[i:i + 3] for i in range(len(key) - 2)}:
+                postings = trigrams.get(trigram)
+                if postings is None:
+                    postings = trigrams[trigram] = array('i')
+                postings.append(tag)
+
+    def search(self, query, limit=MAX_RESULTS):
+        """(path, node_id, kind) of up to `limit` tags matching the query."""
+        query = query.strip().lower()
+        if not query:
+            return []
+        found = []
+        seen = set()
+
+        # Names starting with the query come first
+        for i in range(bisect_left(self._names, query), len(self._names)):
+            if len(found) >= limit or not self._names[i].startswith(query):
+                break
+            found.append(self._name_tags[i])
+            seen.add(self._name_tags[i])
+
+        if len(found) < limit:
+            trigrams = self._trigrams
+            if trigrams is not None and len(query) >= 3:
+                candidates = min((trigrams.get(query[i:i + 3], ())
+                                  for i in range(len(query) - 2)), key=len)
+            else:
+                candidates = range(len(self._keys))  # Scan until the limit is reached
+            for tag in candidates:
+                if tag not in seen and query in self._keys[tag]:
+                    found.append(tag)
+                    if len(found) >= limit:
+                        break
+        return [(self.paths[tag], self.node_ids[tag], self.kinds[tag]) for tag in found]
@@ -0,0 +1,42 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from src.address_space_cache import server_version
+
+NAMESPACES = ["http://opcfoundation.org/UA/", "urn:example:server"]
+
+
+def build_info(build_date):
+    return SimpleNamespace(
+        ProductUri="urn:example:product", ManufacturerName="Example", ProductName="Server",
+        SoftwareVersion="1.2.3", BuildNumber="42", BuildDate=build_date)
+
+
+class ServerVersionTest(unittest.TestCase):
+
+    def test_same_version_from_both_backends(self):
+        # python-opcua decodes BuildDate as naive UTC, asyncua as timezone-aware
+        naive = datetime(2026, 10, 17, 6, 57, 21, 562070)
+        aware = naive.replace(tzinfo=timezone.utc)
+        self.assertEqual(server_version([NAMESPACES, build_info(naive)]),
+                         server_version([NAMESPACES, build_info(aware)]))
+
+    def test_build_date_in_other_timezone(self):
+        naive = datetime(2026, 10, 17, 6, 57, 21)
+        local = datetime(2026, 10, 17, 8, 57, 21, tzinfo=timezone(timedelta(hours=2)))
+        self.assertEqual(server_version([NAMESPACES, build_info(naive)]),
+                         server_version([NAMESPACES, build_info(local)]))
+
+    def test_new_build_changes_version(self):
+        old = server_version([NAMESPACES, build_info(datetime(2026, 10, 17))])
+        new = server_version([NAMESPACES, build_info(datetime(2026, 10, 18))])
+        self.assertNotEqual(old, new)
+
+    def test_unreadable_values(self):
+        version = server_version([Exception("BadNodeIdUnknown"), None])
+        self.assertEqual(version, {"namespaces": None, "build_info": None})
+
+
+if __name__ == "__main__":
+    unittest.main()